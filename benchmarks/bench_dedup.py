@@ -0,0 +1,176 @@
+"""Benchmark the single-pass indexed 'remove_duplicate' against the previous quadratic implementation
+
+Both used to deduplicate jobs.csv after the crawl in list_jobs.py; the jobs are now deduplicated during the
+crawl (``pipelines.CrossSourceDeDuplicatesPipeline``) and jobs.csv is exported from ``job_store.JOB_STORE``,
+so the two implementations only live here, as the record of that optimization.
+
+Usage:
+    python benchmarks/bench_dedup.py [--rows 100000]
+"""
+import argparse
+import random
+import re
+import time
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, List, Tuple
+from urllib.parse import urlsplit, urlunsplit
+
+from furl import furl
+
+SOURCES = ['HigherEdJobs', 'C&ENJobs', 'Chronicle of Higher Education Jobs', 'ChemPostingCanada']
+HOSTS = ['https://{school}.wd1.myworkdayjobs.com/en-US/External/job/{code}?source=HigherEdJobs',
+         'http://{school}.peopleadmin.com/postings/{code}/',
+         'https://apply.interfolio.com/{code}',
+         'https://sjobs.brassring.com/TGnewUI/Search/home/HomeWithPreLoad?partnerid=25240&jobid={code}']
+
+# The 'school' column is '=hyperlink("url","school name")'
+HYPERLINK_ARGS_PATTERN = re.compile(r'\"(.*?)\"')
+SCHEME_PATTERN = re.compile(r'https?://')
+
+
+@lru_cache(maxsize=None)
+def canonical_application_url(url: str) -> str:
+    """Normalize an application url so the same job posted on different boards gives the same string
+
+    Remove query 'source' since some url is like this:
+    'https://embryriddle.wd1.myworkdayjobs.com/en-US/External/job/Daytona-Beach-FL/Non-Tenure-Track-Faculty-Position-in-Chemistry--Daytona-Beach-Campus-_R300364?source=HigherEdJobs'
+    as well as the scheme (e.g. 'http' or 'https') and the trailing '/'.
+    The host is lowercased, the rest of the url is kept as is.
+
+    Parameters
+    ----------
+    url : str
+        The application url, as embedded in the 'school' hyperlink
+
+    Returns
+    -------
+    str
+        The normalized url
+    """
+    scheme, netloc, path, query, fragment = urlsplit(url)
+    query = '&'.join(param for param in query.split('&') if param.partition('=')[0] != 'source')
+    url = urlunsplit((scheme, netloc.lower(), path, query, fragment)).rstrip('/')
+    # Need to remove scheme ('http' or 'https'):
+    return SCHEME_PATTERN.sub('', url)
+
+
+def dedup_key(row: Dict[str, str]) -> Tuple[str, str]:
+    """Key used to tell apart rows with the same 'ads_title': (normalized application url, school name)"""
+    url, school_name = HYPERLINK_ARGS_PATTERN.findall(row['school'])
+    return canonical_application_url(url), school_name
+
+
+def remove_duplicate(data: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    """Remove duplicated row based on 'ads_title' and then the application url
+
+    Duplicated is first considered based on the 'ads_title' then the url in the 'school' key.
+    url is first processed to remove query 'source' as well as scheme (e.g. 'http' or 'https')
+
+    The rows are indexed by title in a single pass; the url key is only computed for titles seen more than once.
+    Rows with a unique title come first (in their original order),
+    followed by the kept rows of each duplicated title (grouped in order of first appearance).
+
+    Parameters
+    ----------
+    data : List[Dict[str, str]]
+        The list of csv rows without header, should be passed in with csv.DictReader
+
+    Returns
+    -------
+    List[Dict[str, str]]
+        Remove List with similar structure but duplicated removed
+    """
+    # title -> first row with this title, in order of first appearance
+    first_rows: Dict[str, Dict[str, str]] = {}
+    # title -> {dedup_key: kept row}, only for titles seen more than once
+    duplicated_rows: Dict[str, Dict[Tuple[str, str], Dict[str, str]]] = {}
+
+    for row in data:
+        title = row['ads_title']
+        first_row = first_rows.setdefault(title, row)
+        if first_row is row:
+            continue
+
+        kept_rows = duplicated_rows.get(title)
+        if kept_rows is None:
+            kept_rows = duplicated_rows[title] = {dedup_key(first_row): first_row}
+        kept_rows.setdefault(dedup_key(row), row)
+
+    result = [row for title, row in first_rows.items() if title not in duplicated_rows]
+    for title in first_rows:
+        if title in duplicated_rows:
+            result.extend(duplicated_rows[title].values())
+
+    return result
+
+
+def remove_duplicate_legacy(data: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    """'remove_duplicate' before the single-pass index (kept here as the baseline)"""
+    count_result = Counter(row['ads_title'] for row in data)
+    duplicate_titles = [title for title, count in count_result.items() if count > 1]
+    result = [row for row in data if row['ads_title'] not in duplicate_titles]
+
+    for title in duplicate_titles:
+        duplicated_rows = [row for row in data if row['ads_title'] == title]
+        existing_info = set()
+        for row in duplicated_rows:
+            url, school_name = re.findall(r'\"(.*?)\"', row['school'])
+            url = furl(url).remove(query=['source']).url.rstrip('/')
+            url = re.sub(r'https?://', '', url)
+            if (url, school_name) not in existing_info:
+                existing_info.add((url, school_name))
+                result.append(row)
+
+    return result
+
+
+def make_rows(n: int, duplicate_ratio: float = 0.3, seed: int = 0) -> List[Dict[str, str]]:
+    """Synthetic csv rows; about 'duplicate_ratio' of them repeat an earlier job (possibly from another board)"""
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n):
+        if rows and rng.random() < duplicate_ratio:
+            row = dict(rng.choice(rows))
+            row['ads_source'] = rng.choice(SOURCES)
+            # Same job with or without the 'source' query / scheme / trailing slash
+            row['school'] = row['school'].replace('https://', 'http://')
+        else:
+            school = f'school{rng.randrange(n // 4 + 1)}'
+            url = rng.choice(HOSTS).format(school=school, code=i)
+            row = {'ads_title': f'Assistant Professor of Chemistry {rng.randrange(n // 2 + 1)}',
+                   'posted_date': f'{rng.randint(1, 12):02d}/{rng.randint(1, 28):02d}/2025',
+                   'school': f'=hyperlink("{url}","{school}")',
+                   'ads_source': rng.choice(SOURCES)}
+        rows.append(row)
+    return rows
+
+
+def timeit(func, data, repeat: int = 1) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(data)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--legacy-rows', type=int, default=10_000,
+                        help='the legacy implementation is quadratic, so it is run on a smaller sample')
+    args = parser.parse_args()
+
+    sample = make_rows(args.legacy_rows)
+    # Compare row identity: both implementations must keep the very same rows in the same order
+    assert [id(row) for row in remove_duplicate(sample)] == [id(row) for row in remove_duplicate_legacy(sample)]
+
+    legacy_time = timeit(remove_duplicate_legacy, sample)
+    new_time = timeit(remove_duplicate, sample, repeat=3)
+    print(f'{args.legacy_rows:>7} rows  legacy: {legacy_time:8.3f}s  indexed: {new_time:8.3f}s  '
+          f'speedup: {legacy_time / new_time:.0f}x')
+
+    data = make_rows(args.rows)
+    new_time = timeit(remove_duplicate, data, repeat=3)
+    print(f'{args.rows:>7} rows  indexed: {new_time:8.3f}s  ({args.rows / new_time:,.0f} rows/s)')
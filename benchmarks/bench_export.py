@@ -0,0 +1,75 @@
+"""Benchmark of the jobs.csv export of the jobs history, with the near duplicates merged
+
+The jobs history holds '--jobs-per-day' jobs a day (some of them posted on 2 or 3 jobs boards) over more and more
+days: the export streams the rows from SQLite and only keeps the jobs of the last
+'near_duplicates.NEAR_DUPLICATE_WINDOW_DAYS' days, so its peak memory (measured with tracemalloc)
+stays about the same whatever the number of rows. The written file is checked to be from latest to oldest.
+
+Usage:
+    python benchmarks/bench_export.py [--days 30 120 480] [--jobs-per-day 100]
+"""
+import argparse
+import csv
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+from job_store import JobStore, posted_on  # noqa: E402
+from pipelines import FIELDS_TO_EXPORT  # noqa: E402
+
+SOURCES = {'higheredjobs': 'HigherEdJobs', 'cenews': 'C&ENJobs', 'chroniclehighered': 'Chronicle'}
+FIELDS = ['Organic', 'Inorganic', 'Analytical', 'Physical', 'Polymer', 'Materials', 'Biological', 'Theoretical']
+
+
+def fill_store(store: JobStore, days: int, jobs_per_day: int, seed: int = 0) -> int:
+    """Upsert the jobs of 'days' days into 'store', return the number of rows"""
+    rng = random.Random(seed)
+    rows = 0
+    for day in range(days):
+        posted = date(2024, 1, 1) + timedelta(days=day)
+        for job in range(jobs_per_day):
+            title = f'Assistant Professor of {rng.choice(FIELDS)} Chemistry'
+            school = f'University of {"".join(rng.choice("abcdefghij") for _ in range(6)).title()}'
+            for source in rng.sample(list(SOURCES), rng.choice([1, 1, 2, 3])):
+                # Posted on the other jobs boards a few days later
+                posted_date = posted + timedelta(days=rng.randint(0, 3))
+                store.upsert({'ads_title': title, 'school': school, 'posted_date': posted_date.strftime('%m/%d/%Y'),
+                              'ads_source': f'=hyperlink("https://{source}.example.com/{day}-{job}","{SOURCES[source]}")',
+                              'ads_job_code': f'{day}-{job}'}, source=source)
+                rows += 1
+    for source in SOURCES:
+        store.finish_run(source)
+    return rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--days', type=int, nargs='+', default=[30, 120, 480])
+    parser.add_argument('--jobs-per-day', type=int, default=100)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for days in args.days:
+            store = JobStore(Path(tmp_dir) / f'jobs-{days}.sqlite3')
+            rows = fill_store(store, days, args.jobs_per_day)
+            csv_file = Path(tmp_dir) / 'jobs.csv'
+
+            tracemalloc.start()
+            start = time.perf_counter()
+            written = store.export_csv(csv_file, FIELDS_TO_EXPORT, merge_near_duplicates=True)
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            store.close()
+
+            with open(csv_file, 'r', newline='') as f_in:
+                dates = [posted_on(row['posted_date']) for row in csv.DictReader(f_in)]
+            assert len(dates) == written and dates == sorted(dates, reverse=True), 'jobs.csv is not from latest to oldest'
+            print(f'{days:>4} days {rows:>9,} rows -> {written:>9,} rows  {rows / elapsed:>9,.0f} rows/s  '
+                  f'peak memory {peak / 1e6:>6.1f} MB')
@@ -0,0 +1,89 @@
+"""Check and benchmark the description extractors (rank, specialization, tenure)
+
+The samples below are (shortened) descriptions from the four jobs boards.
+A corpus of saved descriptions (one .txt or .html file per job) can be used instead of the samples.
+
+Usage:
+    python benchmarks/bench_extractors.py [--corpus DIR] [--repeat 200]
+"""
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+from extractors import extract_rank, extract_specialization, extract_tenure, strip_html  # noqa: E402
+
+SAMPLES = {
+    'C&ENJobs': (
+        'The Department of Chemistry at the University of Utah invites applications for a tenure-track '
+        'faculty position at the Assistant Professor level in Analytical Chemistry. Exceptional candidates '
+        'may be considered at the Associate Professor level. Applicants should hold a Ph.D. in Chemistry.',
+        {'rank': 'asst/assoc', 'specialization': 'analytical', 'tenure': 'tenure-track'}),
+    'Chronicle of Higher Education Jobs': (
+        'Open Rank Faculty Position in Biochemistry. The successful candidate will be appointed as an '
+        'Assistant, Associate or Full Professor with tenure commensurate with experience in biophysics '
+        'or bioorganic chemistry. Assistant Professor candidates must show promise in research.',
+        {'rank': 'asst/assoc/full', 'specialization': 'biochemistry, biophysics, bioorganic', 'tenure': 'tenure'}),
+    'HigherEdJobs': (
+        'Lecturer of Chemistry (Non-Tenure Track). Teach general and organic chemistry laboratories. '
+        'Organic chemistry or polymer science background preferred.',
+        {'rank': '', 'specialization': 'organic, polymer', 'tenure': '(Non-Tenure'}),
+    'ChemPostingCanada': (
+        '<p>The Department of Chemistry invites applications for a <b>tenure-stream</b> position at the rank '
+        'of Assistant Professor in Inorganic or Physical Chemistry (biochemical applications welcome).</p>',
+        {'rank': 'asst', 'specialization': 'inorganic, physical', 'tenure': 'tenure-stream'}),
+}
+
+
+def legacy_extract(description: str):
+    """The per-spider regex calls before the extractors module (kept here as the baseline)"""
+    rank = set(re.findall(r'Assistant\b|Associate\b|Full\s', description))
+    rank_text = '/'.join(word.strip().lower().replace('assistant', 'asst').replace('associate', 'assoc')
+                         for word in rank)
+    specialization = ', '.join(set(word.lower() for word in re.findall(
+        r'org\w*|anal\w*|inorg\w*|bio(?!chemical\b)\w+|physic\w*|polymer\w*', description, re.IGNORECASE)))
+    tenure_type = re.search(r'\S*tenure\S*', description, re.IGNORECASE)
+    return rank_text, specialization, tenure_type[0] if tenure_type else None
+
+
+def extract(description: str):
+    return extract_rank(description), extract_specialization(description), extract_tenure(description)
+
+
+def check_samples() -> None:
+    for board, (text, expected) in SAMPLES.items():
+        text = strip_html(text)
+        result = {'rank': extract_rank(text),
+                  'specialization': extract_specialization(text),
+                  'tenure': extract_tenure(text)}
+        assert result == expected, f'{board}: {result} != {expected}'
+
+
+def load_corpus(folder: Path):
+    return [strip_html(file.read_text(errors='ignore'))
+            for file in sorted(folder.iterdir()) if file.suffix in ('.txt', '.html')]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', type=Path, help='folder of saved job descriptions')
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    check_samples()
+
+    # Make the sample descriptions as long as a real one (a few thousand characters)
+    corpus = load_corpus(args.corpus) if args.corpus else [strip_html(text) * 20 for text, _ in SAMPLES.values()]
+    size = sum(map(len, corpus)) * args.repeat
+
+    for name, func in [('legacy re calls', legacy_extract), ('extractors', extract)]:
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            for description in corpus:
+                func(description)
+        elapsed = time.perf_counter() - start
+        print(f'{name:<16} {len(corpus) * args.repeat / elapsed:>10,.0f} descriptions/s '
+              f'{size / elapsed / 1e6:>8.1f} MB/s')
@@ -0,0 +1,126 @@
+"""Check and benchmark the extraction of the DataLayer and ld+json scripts of the C&EN and Chronicle details pages
+
+The details pages ('parse_ads' responses) are read from the recorded HTTP archives
+(`python src/list_jobs.py --record`); without archive, synthetic pages with large scripts are used.
+The baseline is the greedy regex + json.loads that 'parse_ads' used before ``json_extract.script_json``.
+
+Usage:
+    python benchmarks/bench_json_extract.py [--archive-dir DIR] [--repeat 200]
+"""
+import argparse
+import json
+import re
+import sys
+import time
+from pathlib import Path
+
+from scrapy.http import HtmlResponse
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+from http_archive import HTTP_ARCHIVE_FOLDER, read_archive, response_from_record  # noqa: E402
+from json_extract import SCRIPT_JSON_CACHE, first_json_object, script_json  # noqa: E402
+
+# The scripts and keys used by 'parse_ads', by spider
+QUERIES = {
+    'chemical_engineering_news_job': [
+        ('//script[contains(., "DataLayer")]/text()', ['Field of specialization-AllTerms']),
+        ('//script[@type="application/ld+json"]/text()', ['description']),
+    ],
+    'chronicle_of_higher_education_job': [
+        ('//script[contains(., "ClientGoogleTagManagerDataLayer")]/text()',
+         ['Employment Level-AllTerms', 'ApplicationURL']),
+    ],
+}
+
+SAMPLES = [
+    ('var ClientGoogleTagManagerDataLayer = [{"ApplicationURL": "https://apply.example.edu/?id=1", '
+     '"Employment Level-AllTerms": "Tenured/Tenure-track faculty", "Salary": null}];',
+     ['Employment Level-AllTerms', 'ApplicationURL'],
+     {'Employment Level-AllTerms': 'Tenured/Tenure-track faculty', 'ApplicationURL': 'https://apply.example.edu/?id=1'}),
+    # A '{' of javascript code before the object, a '}' inside a string, a nested object
+    ('if (window.dataLayer) {} dataLayer.push({"Field of specialization-AllTerms": "Organic {synthesis}", '
+     '"Position": {"Type": "Faculty"}});',
+     None,
+     {'Field of specialization-AllTerms': 'Organic {synthesis}', 'Position': {'Type': 'Faculty'}}),
+    ('{"@context": "http://schema.org", "@type": "JobPosting", "description": "Assistant Professor"}',
+     ['description', 'hiringOrganization'],
+     {'description': 'Assistant Professor', 'hiringOrganization': None}),
+    ('var DataLayer = [];', ['description'], None),
+]
+
+
+def legacy_script_json(response, query, keys=None):
+    """'parse_ads' before ``script_json``: greedy DOTALL regex over the whole script, then json.loads"""
+    script = response.xpath(query).get()
+    data_layer = re.search(r'.*(\{.+\})', script, re.MULTILINE | re.DOTALL)
+    if data_layer:
+        return json.loads(data_layer.group(1))
+    return None
+
+
+def check_samples() -> None:
+    for text, keys, expected in SAMPLES:
+        result = first_json_object(text, keys=keys)
+        assert result == expected, f'{text[:40]}: {result} != {expected}'
+
+
+def load_pages(archive_dir: Path):
+    """(spider name, details page response) of the archived 'parse_ads' responses"""
+    pages = []
+    for spider_name in QUERIES:
+        archive_file = archive_dir / f'{spider_name}.zip'
+        if not archive_file.exists():
+            continue
+        _, records = read_archive(archive_file)
+        pages.extend((spider_name, response_from_record(record))
+                     for record in records if record.get('callback') == 'parse_ads' and record['status'] == 200)
+    return pages
+
+
+def synthetic_pages():
+    """Details pages with scripts as large as the real ones (a long description, many DataLayer keys)"""
+    description = 'The Department of Chemistry invites applications for a tenure-track position. ' * 100
+    data_layer = {f'Category {i}-AllTerms': f'Value {i}' for i in range(200)}
+    pages = []
+    for spider_name, variable in [('chemical_engineering_news_job', 'DataLayer'),
+                                  ('chronicle_of_higher_education_job', 'ClientGoogleTagManagerDataLayer')]:
+        layer = {**data_layer, 'Field of specialization-AllTerms': 'Organic', 'Employment Level-AllTerms': 'Tenured',
+                 'ApplicationURL': 'https://apply.example.edu/?id=1'}
+        body = (f'<html><head><script>var {variable} = [{json.dumps(layer)}];</script>'
+                f'<script type="application/ld+json">{json.dumps({"description": description})}</script>'
+                f'</head><body></body></html>')
+        pages.append((spider_name, HtmlResponse(url='https://jobs.example.org/job/1/', body=body, encoding='utf-8')))
+    return pages
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--archive-dir', type=Path, default=HTTP_ARCHIVE_FOLDER)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    check_samples()
+
+    pages = load_pages(args.archive_dir) or synthetic_pages()
+    print(f'{len(pages)} details pages')
+
+    # The keys used by the spiders are the same with both extractions
+    for spider_name, response in pages:
+        for query, keys in QUERIES[spider_name]:
+            legacy = legacy_script_json(response, query) or {}
+            assert script_json(response, query, keys=keys) == {key: legacy.get(key) for key in keys} or not legacy, \
+                f'{response.url}: {query}'
+
+    for name, func, cached in [('legacy regex', legacy_script_json, False),
+                               ('script_json', script_json, False),
+                               ('script_json cached', script_json, True)]:
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            if not cached:
+                SCRIPT_JSON_CACHE.clear()
+            for spider_name, response in pages:
+                for query, keys in QUERIES[spider_name]:
+                    func(response, query, keys=keys)
+        elapsed = time.perf_counter() - start
+        print(f'{name:<20} {len(pages) * args.repeat / elapsed:>10,.0f} pages/s')
@@ -0,0 +1,119 @@
+"""Check and benchmark the cross-board near duplicate detection of ``near_duplicates.merge_near_duplicates``
+
+Synthetic jobs are posted on 1 to 3 jobs boards each, with the title rewritten by every board
+('Assistant Professor - Organic Chemistry', 'Assistant Professor of Organic Chemistry', ...), the school with
+or without 'The', and the description cut differently; many schools have several positions with close titles.
+The merged rows are compared to the truth (precision / recall of the merged pairs), and the LSH index to
+the comparison of each row with all the previous ones, which is quadratic in the number of jobs.
+
+Usage:
+    python benchmarks/bench_near_duplicates.py [--jobs 2000] [--pairwise-jobs 2000]
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+from near_duplicates import NearDuplicateIndex, merge_near_duplicates  # noqa: E402
+
+SOURCES = [('jobs_higheredjobs', 'HigherEdJobs'), ('chemical_engineering_news_job', 'C&ENJobs'),
+           ('chronicle_of_higher_education_job', 'Chronicle of Higher Education Jobs'),
+           ('chempostingscanada.blogspot.com', 'ChemPostingCanada')]
+RANKS = ['Assistant Professor', 'Associate Professor', 'Instructor', 'Lecturer']
+FIELDS = ['Organic Chemistry', 'Inorganic Chemistry', 'Analytical Chemistry', 'Physical Chemistry',
+          'Biochemistry', 'Chemistry Education', 'Polymer Chemistry', 'Materials Chemistry']
+TITLE_FORMATS = ['{rank} - {field}', '{rank} of {field}', '{rank}, {field}', 'Tenure-Track {rank} in {field}',
+                 '{rank} ({field})']
+WORDS = ('department invites applications research teaching undergraduate graduate laboratory students faculty '
+         'program candidates synthesis spectroscopy funding collaborative university campus experience degree '
+         'courses mentoring instrumentation community excellence diversity position start salary').split()
+
+
+def make_jobs(n: int, seed: int = 0) -> Tuple[List[Dict[str, str]], List[int]]:
+    """Rows of 'n' jobs (a few rows per job, one per jobs board posting it), and the job number of each row"""
+    rng = random.Random(seed)
+    schools = [f'University of {name}' for name in
+               (''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randint(5, 10))).title()
+                for _ in range(max(1, n // 3)))]
+    rows, truth = [], []
+    for job in range(n):
+        rank, field, school = rng.choice(RANKS), rng.choice(FIELDS), rng.choice(schools)
+        description = ' '.join(rng.choice(WORDS) for _ in range(150))
+        for source, source_name in rng.sample(SOURCES, rng.choice([1, 1, 2, 2, 3])):
+            title = rng.choice(TITLE_FORMATS).format(rank=rank, field=field)
+            start = rng.randint(0, 10)
+            rows.append({'source': source,
+                         'ads_title': title,
+                         'school': f'=hyperlink("https://apply.example.edu/{job}","{rng.choice(["", "The "])}{school}")',
+                         'ads_source': f'=hyperlink("https://{source}/job/{job}","{source_name}")',
+                         # Chronicle ads have no description
+                         'description': '' if source.startswith('chronicle') else ' '.join(description.split()[start:])})
+            truth.append(job)
+    order = list(range(len(rows)))
+    rng.shuffle(order)
+    return [rows[i] for i in order], [truth[i] for i in order]
+
+
+def merged_pairs(groups: List[List[int]]) -> set:
+    return {(min(a, b), max(a, b)) for group in groups for a in group for b in group if a != b}
+
+
+def lsh_groups(rows: List[Dict[str, str]]) -> Tuple[List[List[int]], float]:
+    """Row numbers merged together by 'merge_near_duplicates' and the time it took"""
+    groups: Dict[int, List[int]] = {}
+    start = time.perf_counter()
+    index = NearDuplicateIndex()
+    for i, row in enumerate(rows):
+        groups[i] = [i]
+        duplicate_of = index.add(i, row['source'], row['ads_title'], row['school'], row['description'])
+        if duplicate_of is not None:
+            groups[duplicate_of].append(i)
+            del groups[i]
+    elapsed = time.perf_counter() - start
+    return list(groups.values()), elapsed
+
+
+def pairwise_time(rows: List[Dict[str, str]]) -> float:
+    """Time to compare every row with all the previous kept rows (the same test, without the LSH index)"""
+    index = NearDuplicateIndex()
+    start = time.perf_counter()
+    kept = []
+    for row in rows:
+        job = index.job(row['source'], row['ads_title'], row['school'], row['description'])
+        duplicate_of = next((other for other in kept if index.is_duplicate(row['source'], job, other)), None)
+        if duplicate_of is None:
+            kept.append(job)
+        else:
+            duplicate_of.sources.add(row['source'])
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--jobs', type=int, default=2000)
+    parser.add_argument('--pairwise-jobs', type=int, default=2000,
+                        help='the pairwise comparison is quadratic, so it is run on a smaller sample')
+    args = parser.parse_args()
+
+    rows, truth = make_jobs(args.jobs)
+    groups, elapsed = lsh_groups(rows)
+    found = merged_pairs(groups)
+    expected = merged_pairs([[i for i, job in enumerate(truth) if job == number] for number in set(truth)])
+    true_positives = len(found & expected)
+    print(f'{args.jobs} jobs, {len(rows)} rows, {len(rows) - len(set(truth))} near duplicate rows')
+    print(f'merged pairs: precision {true_positives / max(1, len(found)):.1%}  '
+          f'recall {true_positives / max(1, len(expected)):.1%}')
+    print(f'LSH index    {elapsed:8.3f}s  {len(rows) / elapsed:>9,.0f} rows/s')
+
+    sample, _ = make_jobs(args.pairwise_jobs)
+    pairwise = pairwise_time(sample)
+    print(f'pairwise     {pairwise:8.3f}s  {len(sample) / pairwise:>9,.0f} rows/s  ({len(sample)} rows)')
+
+    # The merged row lists every jobs board
+    merged = merge_near_duplicates([dict(row) for row in rows], fields=['description'])
+    boards = max(merged, key=lambda row: row['ads_source'].count(' + '))['ads_source']
+    print(f'{len(merged)} rows after the merge, e.g. {boards}')
@@ -0,0 +1,161 @@
+"""Parsing throughput of every spider callback, over the responses of the recorded HTTP archives
+
+The archives are recorded with `python src/list_jobs.py --record` (or a spider's `--record`).
+Each archived listing, detail, JSON API, Atom feed and apply-redirect response is fed straight into
+the callback that requested it ('parse', 'parse_ads', 'parse_node', 'parse_redirect_application_url'),
+without a crawler nor a reactor, and the time is frozen at the time of the recording.
+
+Usage:
+    python benchmarks/bench_parsing.py [--archive-dir DIR] [--repeat 5]
+                                       [--save-baseline FILE] [--baseline FILE [--threshold 0.2]]
+
+With '--baseline', the exit code is 1 if the pages/s of any callback dropped more than 'threshold'.
+"""
+import argparse
+import json
+import logging
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+import scrapy
+from scrapy.item import Item
+from scrapy.settings import Settings
+from scrapy.spiders import XMLFeedSpider
+from scrapy.utils.misc import arg_to_iter
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+import posting_window  # noqa: E402
+from cenews_spider import ChemicalEngineeringNewsSpider  # noqa: E402
+from chempostingcanada_spider import ChempostingcanadaSpider  # noqa: E402
+from chroniclehighered_spider import ChronicalHigherEducationSpider  # noqa: E402
+from higheredjobs_spider import JobsHigheredjobsSpider  # noqa: E402
+from http_archive import HTTP_ARCHIVE_FOLDER, read_archive, response_from_record  # noqa: E402
+
+SPIDERS = {spidercls.name: spidercls
+           for spidercls in (ChemicalEngineeringNewsSpider, ChronicalHigherEducationSpider,
+                             JobsHigheredjobsSpider, ChempostingcanadaSpider)}
+
+
+def load_callbacks(archive_file: Path) -> Dict[str, Tuple[Callable, List[Any]]]:
+    """Group the archived responses of a spider by the callback they were requested for
+
+    Returns
+    -------
+    Dict[str, Tuple[Callable, List[Any]]]
+        '<spider name>.<callback name>' -> (bound callback, list of (response, cb_kwargs))
+    """
+    spider = SPIDERS[archive_file.stem]()
+    spider.settings = Settings()
+
+    recorded_at, records = read_archive(archive_file)
+    posting_window.freeze_now(recorded_at)
+
+    callbacks = {}
+    for record in records:
+        # Redirect hops never reach a callback, the response of the last hop does
+        if 300 <= record['status'] < 400:
+            continue
+        if 'callback' not in record:
+            sys.exit(f'{archive_file} was recorded without the request callbacks, record it again')
+
+        if record['callback'] is None:
+            # Default callback: 'parse' ('parse_node' for each entry of the Atom feed)
+            callback = spider._parse
+            callback_name = 'parse_node' if isinstance(spider, XMLFeedSpider) else 'parse'
+        else:
+            callback = getattr(spider, record['callback'])
+            callback_name = record['callback']
+
+        request = scrapy.Request(url=record['request_url'], cb_kwargs=record['cb_kwargs'])
+        response = response_from_record(record, request=request)
+        key = f'{spider.name}.{callback_name}'
+        callbacks.setdefault(key, (callback, []))[1].append((response, record['cb_kwargs']))
+    return callbacks
+
+
+def run_callback(callback: Callable, responses: List[Any]) -> Tuple[int, int]:
+    """Call the callback on every response and consume its output; return the number of items and requests"""
+    items = requests = 0
+    for response, cb_kwargs in responses:
+        for output in arg_to_iter(callback(response, **dict(cb_kwargs))):
+            if isinstance(output, (Item, dict)):
+                items += 1
+            elif isinstance(output, scrapy.Request):
+                requests += 1
+    return items, requests
+
+
+def measure(callback: Callable, responses: List[Any], repeat: int) -> Dict[str, float]:
+    # Peak memory in a separate pass, tracemalloc slows everything down
+    tracemalloc.start()
+    run_callback(callback, responses)
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        items, requests = run_callback(callback, responses)
+    elapsed = (time.perf_counter() - start) / repeat
+
+    return {
+        'pages': len(responses),
+        'items': items,
+        'requests': requests,
+        'pages_per_second': len(responses) / elapsed,
+        'items_per_second': items / elapsed,
+        'peak_memory_kib': peak_memory / 1024,
+    }
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]], threshold: float) -> List[str]:
+    """Callbacks whose pages/s dropped more than 'threshold' (fraction) below the baseline"""
+    regressions = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        expected = baseline[key]['pages_per_second']
+        if result['pages_per_second'] < expected * (1 - threshold):
+            regressions.append(f'{key}: {result["pages_per_second"]:,.1f} pages/s '
+                               f'(baseline {expected:,.1f} pages/s)')
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--archive-dir', type=Path, default=HTTP_ARCHIVE_FOLDER)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--save-baseline', type=Path, help='write the results to this json file')
+    parser.add_argument('--baseline', type=Path, help='json file of a previous --save-baseline')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='allowed drop of pages/s compared to the baseline, by default 0.2 (20%%)')
+    args = parser.parse_args()
+
+    # The spiders log every parsed ads at INFO level
+    logging.disable(logging.INFO)
+
+    archive_files = sorted(file for file in args.archive_dir.glob('*.zip') if file.stem in SPIDERS)
+    if not archive_files:
+        sys.exit(f'No archive in {args.archive_dir}, record one with: python src/list_jobs.py --record')
+
+    results = {}
+    for archive_file in archive_files:
+        for key, (callback, responses) in load_callbacks(archive_file).items():
+            results[key] = measure(callback, responses, args.repeat)
+
+    print(f'{"callback":<70} {"pages":>6} {"pages/s":>10} {"items/s":>10} {"peak KiB":>10}')
+    for key, result in results.items():
+        print(f'{key:<70} {result["pages"]:>6} {result["pages_per_second"]:>10,.1f} '
+              f'{result["items_per_second"]:>10,.1f} {result["peak_memory_kib"]:>10,.0f}')
+
+    if args.save_baseline:
+        args.save_baseline.write_text(json.dumps(results, indent=2))
+
+    if args.baseline:
+        regressions = compare(results, json.loads(args.baseline.read_text()), args.threshold)
+        if regressions:
+            print('\nThroughput regressions:\n' + '\n'.join(regressions))
+            sys.exit(1)
@@ -0,0 +1,93 @@
+"""Micro-benchmark of the item pipelines: items/second for each stage
+
+The csv files are exported from the jobs history after the crawl (see ``job_store.JobStore.export_csv``),
+not by a pipeline.
+
+Usage:
+    python benchmarks/bench_pipelines.py [--items 200000]
+"""
+import argparse
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+from itemadapter import ItemAdapter
+from scrapy.exceptions import DropItem
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+from items import JobItem  # noqa: E402
+from pipelines import (JOB_TITLE_IGNORE_KEYWORDS, CrossSourceDeDuplicatesPipeline,  # noqa: E402
+                       DeDuplicatesPipeline, RemoveIgnoredKeywordsPipeline)
+
+TITLES = ['Assistant Professor of Organic Chemistry', 'Postdoctoral Research Associate',
+          'Associate Professor - Analytical Chemistry', 'Research Scientist II',
+          'Tenure-Track Faculty Position in Physical Chemistry', 'Lecturer in Chemistry (Post Doc eligible)']
+
+
+class LegacyRemoveIgnoredKeywordsPipeline:
+    """The keyword filter before the precompiled alternation (kept here as the baseline)"""
+    def process_item(self, item, spider):
+        adapter = ItemAdapter(item)
+        for keyword in JOB_TITLE_IGNORE_KEYWORDS:
+            if re.search(keyword, adapter['ads_title'], re.IGNORECASE):
+                raise DropItem(f"'Postdoc' item found: {item!r}")
+        return item
+
+
+class FakeSpider:
+    name = 'benchmark'
+    seen_ads = None
+
+
+def make_items(n: int, seed: int = 0):
+    rng = random.Random(seed)
+    return [JobItem(ads_title=f'{rng.choice(TITLES)} {rng.randrange(n)}',
+                    school=f'=hyperlink("https://apply.interfolio.com/{i}","University {rng.randrange(n // 3 + 1)}")',
+                    posted_date=f'{rng.randint(1, 12):02d}/{rng.randint(1, 28):02d}/{rng.choice((2024, 2025))}',
+                    ads_job_code=rng.randrange(n))
+            for i in range(n)]
+
+
+def run_stage(pipeline, items, spider) -> float:
+    """Return the items/second of 'pipeline.process_item' (dropped items count as processed)"""
+    start = time.perf_counter()
+    for item in items:
+        try:
+            pipeline.process_item(item, spider)
+        except DropItem:
+            pass
+    return len(items) / (time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=200_000)
+    args = parser.parse_args()
+
+    items = make_items(args.items)
+    spider = FakeSpider()
+
+    # Both keyword filters must drop the very same items
+    legacy, tuned = LegacyRemoveIgnoredKeywordsPipeline(), RemoveIgnoredKeywordsPipeline()
+    for item in items[:10_000]:
+        results = []
+        for pipeline in (legacy, tuned):
+            try:
+                results.append(pipeline.process_item(item, spider) is item)
+            except DropItem:
+                results.append(False)
+        assert results[0] == results[1], item
+
+    cross_source_pipeline = CrossSourceDeDuplicatesPipeline()
+    cross_source_pipeline.open_spider(spider)
+
+    stages = [('RemoveIgnoredKeywordsPipeline (legacy loop)', legacy),
+              ('RemoveIgnoredKeywordsPipeline', tuned),
+              ('DeDuplicatesPipeline', DeDuplicatesPipeline()),
+              ('CrossSourceDeDuplicatesPipeline', cross_source_pipeline)]
+    for name, pipeline in stages:
+        print(f'{name:<45} {run_stage(pipeline, items, spider):>12,.0f} items/s')
+    cross_source_pipeline.seen_ads.clear()
@@ -0,0 +1,189 @@
+"""Reactor stall time of a crawl parsing large details pages in the reactor thread vs in a ``parse_pool.ParsePool``
+
+A local HTTP server serves synthetic C&EN details pages (a large DataLayer, ld+json description and html body),
+a spider downloads them and runs ``cenews_spider.ads_details`` on each one: inline in its callback
+(as by default) or in '--workers' worker processes (as with `python src/list_jobs.py --parse-workers N`).
+A heartbeat scheduled on the reactor every '--tick' milliseconds measures how late it runs: while a callback
+parses a page, the reactor neither sends nor receives anything. Each mode is crawled in its own process.
+The workers only take the parsing off the reactor when they have CPU cores of their own.
+
+Usage:
+    python benchmarks/bench_reactor_stall.py [--pages 300] [--page-kb 300] [--workers 2] [--tick 5]
+"""
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import scrapy
+from scrapy import signals
+from scrapy.crawler import CrawlerProcess
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+from cenews_spider import ads_details  # noqa: E402
+from parse_pool import ParsePool  # noqa: E402
+
+
+def details_page(number: int, page_kb: int) -> bytes:
+    """A C&EN-like details page of about 'page_kb' KB"""
+    paragraph = ('<p>The Department of <b>Chemistry</b> invites applications for a <i>tenure-track</i> position '
+                 'at the rank of <a href="#">Assistant Professor</a>.</p><ul><li>Ph.D.</li><li>teaching</li></ul>')
+    description = paragraph * max(1, page_kb * 1024 // (3 * len(paragraph)))
+    data_layer = {f'Category {i}-AllTerms': f'Value {i}' for i in range(200)}
+    data_layer['Field of specialization-AllTerms'] = 'Organic chemistry'
+    return (f'<html><head>'
+            f'<meta property="og:article:published_time" content="2024-05-0{number % 9 + 1}T10:00:00">'
+            f'<meta property="og:article:expiration_time" content="2024-07-01T10:00:00">'
+            f'<script>var DataLayer = [{json.dumps(data_layer)}];</script>'
+            f'<script type="application/ld+json">{json.dumps({"description": description})}</script>'
+            f'</head><body><div class="job-description">{description}</div>'
+            f'<a data-hook="apply-button" href="/apply/{number}/?id={number}">Apply</a>'
+            f'<div class="sidebar">{description}</div></body></html>').encode()
+
+
+def serve(pages: int, page_kb: int) -> ThreadingHTTPServer:
+    """Serve the details pages '/job/<number>/' on a free local port, in a thread"""
+    bodies = [details_page(number, page_kb) for number in range(pages)]
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = bodies[int(self.path.strip('/').split('/')[-1]) % pages]
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class DetailsSpider(scrapy.Spider):
+    name = 'reactor_stall'
+    parse_pool = None
+
+    def __init__(self, base_url: str, pages: int, **kwargs):
+        super().__init__(**kwargs)
+        self.base_url = base_url
+        self.pages = pages
+
+    def start_requests(self):
+        for number in range(self.pages):
+            yield scrapy.Request(f'{self.base_url}/job/{number}/', callback=self.parse_ads)
+
+    async def start(self):
+        # Same as 'start_requests' for Scrapy >= 2.13
+        for request in self.start_requests():
+            yield request
+
+    def parse_ads(self, response):
+        # As the spiders: inline unless a parse pool is attached
+        if self.parse_pool is not None:
+            return self.parse_ads_in_pool(response)
+        return [ads_details(response)]
+
+    async def parse_ads_in_pool(self, response):
+        yield await self.parse_pool.parse(ads_details, response)
+
+
+class Heartbeat:
+    """Lateness of a call scheduled every 'tick' seconds on the reactor, from the spider opened to closed"""
+    def __init__(self, tick: float):
+        self.tick = tick
+        self.lateness = []
+        self.loop = None
+        self.last = None
+        self.started_at = None
+        self.stopped_at = None
+
+    def start(self, spider):
+        from twisted.internet import task
+
+        self.started_at = self.last = time.perf_counter()
+        self.loop = task.LoopingCall(self.beat)
+        self.loop.start(self.tick, now=False)
+
+    def beat(self):
+        now = time.perf_counter()
+        self.lateness.append(max(0.0, now - self.last - self.tick))
+        self.last = now
+
+    def stop(self, spider, reason):
+        self.stopped_at = time.perf_counter()
+        if self.loop is not None and self.loop.running:
+            self.loop.stop()
+
+
+def crawl(base_url: str, pages: int, workers: int, tick: float) -> dict:
+    """Crawl the pages in this process, return the heartbeat statistics"""
+    process = CrawlerProcess(settings={
+        'LOG_LEVEL': 'WARNING',
+        'ROBOTSTXT_OBEY': False,
+        'TELNETCONSOLE_ENABLED': False,
+        'CONCURRENT_REQUESTS': 16,
+        'CONCURRENT_REQUESTS_PER_DOMAIN': 16,
+    })
+    crawler = process.create_crawler(DetailsSpider)
+    heartbeat = Heartbeat(tick)
+    pool = ParsePool(workers) if workers > 0 else None
+
+    def spider_opened(spider):
+        spider.parse_pool = pool
+        heartbeat.start(spider)
+
+    crawler.signals.connect(spider_opened, signal=signals.spider_opened)
+    crawler.signals.connect(heartbeat.stop, signal=signals.spider_closed)
+    process.crawl(crawler, base_url=base_url, pages=pages)
+    process.start()
+    if pool is not None:
+        pool.shutdown()
+
+    lateness = sorted(heartbeat.lateness) or [0.0]
+    return {'items': crawler.stats.get_value('item_scraped_count', 0),
+            'seconds': heartbeat.stopped_at - heartbeat.started_at,
+            'stalled': sum(late for late in lateness if late > tick),
+            'p99_ms': lateness[int(len(lateness) * 0.99)] * 1e3,
+            'max_ms': lateness[-1] * 1e3}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, default=300)
+    parser.add_argument('--page-kb', type=int, default=300, help='size of each details page')
+    parser.add_argument('--workers', type=int, default=2, help='worker processes of the parse pool')
+    parser.add_argument('--tick', type=float, default=5, help='heartbeat interval in milliseconds')
+    # Internal: crawl one mode in this process and print its statistics as json
+    parser.add_argument('--crawl', metavar='BASE_URL', help=argparse.SUPPRESS)
+    parser.add_argument('--crawl-workers', type=int, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.crawl:
+        logging.getLogger('scrapy').setLevel(logging.WARNING)
+        print(json.dumps(crawl(args.crawl, args.pages, args.crawl_workers, args.tick / 1e3)))
+        sys.exit(0)
+
+    server = serve(args.pages, args.page_kb)
+    base_url = f'http://127.0.0.1:{server.server_address[1]}'
+    print(f'{args.pages} details pages of {len(details_page(0, args.page_kb)) / 1024:,.0f} KB, '
+          f'heartbeat every {args.tick:g} ms, {os.cpu_count()} CPUs')
+    for name, workers in [('inline', 0), (f'parse pool ({args.workers} workers)', args.workers)]:
+        output = subprocess.run([sys.executable, __file__, '--crawl', base_url, '--crawl-workers', str(workers),
+                                 '--pages', str(args.pages), '--tick', str(args.tick)],
+                                check=True, capture_output=True, text=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        assert result['items'] == args.pages, f'{name}: {result["items"]} items of {args.pages} pages'
+        print(f'{name:<26} {result["seconds"]:>7.2f}s {args.pages / result["seconds"]:>7.1f} pages/s  '
+              f'stalled {result["stalled"]:>6.2f}s ({result["stalled"] / result["seconds"]:>4.0%})  '
+              f'p99 {result["p99_ms"]:>7.1f} ms  max {result["max_ms"]:>7.1f} ms')
+    server.shutdown()
@@ -0,0 +1,92 @@
+"""Check and benchmark the job description text extraction of the details pages
+
+The details pages ('parse_ads' responses) of HigherEdJobs and C&EN are read from the recorded
+HTTP archives (`python src/list_jobs.py --record`); without archive, synthetic pages with long descriptions are used.
+The baseline is the ``' '.join(... *::text ... if re.search(r'\\S', word))`` the spiders used
+before ``extractors.selection_text``.
+
+Usage:
+    python benchmarks/bench_text_extract.py [--archive-dir DIR] [--repeat 50] [--max-chars 2000]
+"""
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+
+from scrapy.http import HtmlResponse
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+from extractors import selection_text  # noqa: E402
+from http_archive import HTTP_ARCHIVE_FOLDER, read_archive, response_from_record  # noqa: E402
+
+# The description element of the details pages, by spider
+DESCRIPTION_QUERIES = {
+    'jobs_higheredjobs': '#jobDesc',
+    'chemical_engineering_news_job': '.job-description',
+}
+
+
+def legacy_text(response, query: str) -> str:
+    return ' '.join(word.strip()
+                    for word in (response.css(f'{query} *::text').getall())
+                    if re.search(r'\S', word))
+
+
+def load_pages(archive_dir: Path):
+    """(description query, details page response) of the archived 'parse_ads' responses"""
+    pages = []
+    for spider_name, query in DESCRIPTION_QUERIES.items():
+        archive_file = archive_dir / f'{spider_name}.zip'
+        if not archive_file.exists():
+            continue
+        _, records = read_archive(archive_file)
+        pages.extend((query, response_from_record(record))
+                     for record in records if record.get('callback') == 'parse_ads' and record['status'] == 200)
+    return pages
+
+
+def synthetic_pages():
+    """Details pages with a long description made of many small text nodes (lists, links, bold words)"""
+    paragraph = ('<p>The Department of <b>Chemistry</b> invites applications for a <i>tenure-track</i> position '
+                 'at the rank of <a href="#">Assistant Professor</a>.\n    </p>\n  <ul><li> Ph.D. </li><li> '
+                 'teaching </li></ul>')
+    pages = []
+    for query in sorted(set(DESCRIPTION_QUERIES.values())):
+        selector = query.lstrip('#.')
+        attribute = 'id' if query.startswith('#') else 'class'
+        body = f'<html><body><div {attribute}="{selector}">{paragraph * 200}</div></body></html>'
+        pages.append((query, HtmlResponse(url='https://jobs.example.org/job/1/', body=body, encoding='utf-8')))
+    return pages
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--archive-dir', type=Path, default=HTTP_ARCHIVE_FOLDER)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--max-chars', type=int, default=2000, help='character budget of the last measure')
+    args = parser.parse_args()
+
+    pages = load_pages(args.archive_dir) or synthetic_pages()
+    # Parse the html once, as the spiders do before their callback runs
+    for _, response in pages:
+        response.css('html')
+    size = sum(len(legacy_text(response, query)) for query, response in pages)
+    print(f'{len(pages)} details pages, {size / len(pages):,.0f} description characters per page')
+
+    # The same text, apart from the runs of whitespace inside a text node
+    for query, response in pages:
+        assert ' '.join(legacy_text(response, query).split()) == selection_text(response.css(query)), response.url
+
+    for name, func in [('legacy *::text', legacy_text),
+                       ('selection_text', lambda response, query: selection_text(response.css(query))),
+                       (f'selection_text {args.max_chars} chars',
+                        lambda response, query: selection_text(response.css(query), max_chars=args.max_chars))]:
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            for query, response in pages:
+                func(response, query)
+        elapsed = time.perf_counter() - start
+        print(f'{name:<28} {len(pages) * args.repeat / elapsed:>10,.0f} pages/s '
+              f'{elapsed / (len(pages) * args.repeat) * 1e3:>8.3f} ms/page')
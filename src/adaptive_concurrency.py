@@ -0,0 +1,143 @@
+from typing import Dict, Optional, Set
+from urllib.parse import urlsplit
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+
+# Responses telling the host is overloaded or throttling the crawler
+THROTTLE_HTTP_CODES = {429, 503}
+
+# Defaults of the 'ADAPTIVE_CONCURRENCY_*' settings
+TARGET_LATENCY = 1.0
+MAX_CONCURRENCY = 16
+TAIL_MAX_CONCURRENCY = 2
+MAX_DELAY = 30.0
+# Weight of the last response in the moving average of the latency
+LATENCY_SMOOTHING = 0.3
+
+
+class DomainStats:
+    """What was learned about one download slot (i.e. one domain) during the run"""
+    __slots__ = ('concurrency', 'delay', 'base_delay', 'latency', 'successes', 'throttled')
+
+    def __init__(self, concurrency: int, delay: float):
+        self.concurrency = concurrency
+        self.delay = delay
+        # The delay never goes below the configured one ('DOWNLOAD_DELAY' or 'DOWNLOAD_SLOTS')
+        self.base_delay = delay
+        self.latency: Optional[float] = None
+        self.successes = 0
+        self.throttled = 0
+
+
+# Download slot key -> stats, shared by all the crawlers of one 'CrawlerProcess'
+# (e.g. the same Workday host is requested by the C&EN and the Chronicle spiders)
+DOMAIN_STATS: Dict[str, DomainStats] = {}
+
+
+class AdaptiveConcurrencyMiddleware:
+    """Downloader middleware tuning the concurrency and the delay of each download slot from its latency and errors
+
+    - Fast responses (smoothed latency under 'ADAPTIVE_CONCURRENCY_TARGET_LATENCY') add one concurrent request
+      once as many responses as the current concurrency came back, and halve the delay
+      (down to the configured one)
+    - Slow responses remove one concurrent request
+    - Throttling (429, 503) and download errors halve the concurrency and double the delay (or use 'Retry-After')
+
+    The jobs boards of the spiders ('start_urls' hosts and 'DOWNLOAD_SLOTS') go up to 'ADAPTIVE_CONCURRENCY_MAX',
+    the long tail of employer application hosts up to 'ADAPTIVE_CONCURRENCY_TAIL_MAX'.
+    Its order has to be above the retry middleware (550) to see the throttled responses before they are retried.
+    Enable it in the settings with:
+        'DOWNLOADER_MIDDLEWARES': {'adaptive_concurrency.AdaptiveConcurrencyMiddleware': 560},
+        'ADAPTIVE_CONCURRENCY_ENABLED': True,
+    """
+    def __init__(self, crawler, target_latency: float, max_concurrency: int, tail_max_concurrency: int,
+                 max_delay: float):
+        self.crawler = crawler
+        self.target_latency = target_latency
+        self.max_concurrency = max_concurrency
+        self.tail_max_concurrency = tail_max_concurrency
+        self.max_delay = max_delay
+        self.board_hosts: Set[str] = set(crawler.settings.getdict('DOWNLOAD_SLOTS'))
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('ADAPTIVE_CONCURRENCY_ENABLED'):
+            raise NotConfigured
+
+        middleware = cls(
+            crawler,
+            target_latency=settings.getfloat('ADAPTIVE_CONCURRENCY_TARGET_LATENCY', TARGET_LATENCY),
+            max_concurrency=settings.getint('ADAPTIVE_CONCURRENCY_MAX', MAX_CONCURRENCY),
+            tail_max_concurrency=settings.getint('ADAPTIVE_CONCURRENCY_TAIL_MAX', TAIL_MAX_CONCURRENCY),
+            max_delay=settings.getfloat('ADAPTIVE_CONCURRENCY_MAX_DELAY', MAX_DELAY),
+        )
+        crawler.signals.connect(middleware.spider_opened, signal=signals.spider_opened)
+        return middleware
+
+    def spider_opened(self, spider):
+        self.board_hosts.update(urlsplit(url).hostname for url in getattr(spider, 'start_urls', ()))
+
+    def process_response(self, request, response, spider):
+        key, stats, slot = self._slot(request)
+        if slot is None:
+            return response
+
+        if response.status in THROTTLE_HTTP_CODES:
+            self._back_off(key, stats, retry_after=response.headers.get('Retry-After'))
+        # No latency for the responses served by the HTTP cache
+        elif 'download_latency' in request.meta:
+            self._observe_latency(key, stats, request.meta['download_latency'])
+
+        slot.concurrency, slot.delay = stats.concurrency, stats.delay
+        return response
+
+    def process_exception(self, request, exception, spider):
+        key, stats, slot = self._slot(request)
+        if slot is not None:
+            self._back_off(key, stats)
+            slot.concurrency, slot.delay = stats.concurrency, stats.delay
+
+    def _slot(self, request):
+        key = request.meta.get('download_slot')
+        slot = self.crawler.engine.downloader.slots.get(key) if key else None
+        if slot is None:
+            return key, None, None
+
+        stats = DOMAIN_STATS.get(key)
+        if stats is None:
+            concurrency = min(slot.concurrency, self._limit(key))
+            stats = DOMAIN_STATS[key] = DomainStats(concurrency, slot.delay)
+        return key, stats, slot
+
+    def _limit(self, key: str) -> int:
+        return self.max_concurrency if key in self.board_hosts else self.tail_max_concurrency
+
+    def _observe_latency(self, key: str, stats: DomainStats, latency: float) -> None:
+        stats.latency = latency if stats.latency is None else \
+            LATENCY_SMOOTHING * latency + (1 - LATENCY_SMOOTHING) * stats.latency
+
+        if stats.latency > self.target_latency:
+            stats.successes = 0
+            stats.concurrency = max(1, stats.concurrency - 1)
+            return
+
+        stats.delay = max(stats.base_delay, stats.delay / 2 if stats.delay > 0.05 else 0.0)
+        stats.successes += 1
+        if stats.successes >= stats.concurrency and stats.concurrency < self._limit(key):
+            stats.successes = 0
+            stats.concurrency += 1
+            self.crawler.stats.max_value(f'adaptive_concurrency/{key}', stats.concurrency)
+
+    def _back_off(self, key: str, stats: DomainStats, retry_after: Optional[bytes] = None) -> None:
+        stats.throttled += 1
+        stats.successes = 0
+        stats.concurrency = max(1, stats.concurrency // 2)
+        try:
+            delay = float(retry_after) if retry_after else max(1.0, stats.delay * 2)
+        except ValueError:
+            # 'Retry-After' can also be an HTTP date
+            delay = max(1.0, stats.delay * 2)
+        stats.delay = min(self.max_delay, delay)
+        self.crawler.stats.inc_value(f'adaptive_concurrency/throttled/{key}')
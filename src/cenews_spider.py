@@ -1,96 +1,92 @@
+import argparse
 import re
-import json
-from datetime import datetime, timezone
+# import json
+from datetime import datetime
 from pathlib import Path, PurePath
+from typing import Any, Dict
 
 import scrapy
-# useful for handling different item types with a single interface
-from itemadapter import ItemAdapter
 from scrapy.crawler import CrawlerProcess
-from scrapy.exceptions import DropItem
-from scrapy.exporters import CsvItemExporter
 
+from crawl_budget import LISTING_AGE_META
+from dedup import dedup_key
+from extractors import DESCRIPTION_MAX_CHARS, extract_rank, extract_tenure, extract_title_rank, selection_text, strip_html
+from http_archive import add_archive_arguments, archive_output_file, archive_settings
 from items import JobItem
+from job_store import JOB_STORE
+from json_extract import script_json
+from pipelines import FIELDS_TO_EXPORT
+from posting_window import POSTING_WINDOW_DAYS, current_time, estimated_listing_age, listing_freshness
+from redirect_cache import HEADERS_ONLY_META
 
 CURRENT_FILEPATH = Path(__file__).resolve().parent
 DATA_FOLDER = CURRENT_FILEPATH.parent / 'data'
 DATA_FOLDER.mkdir(exist_ok=True)
 THIS_SPIDER_RESULT_FILE = DATA_FOLDER / 'cenew_jobs.csv'
 
-JOB_TITLE_IGNORE_KEYWORDS = ['post-doc', 'postdoc', 'post doc', 'scientist']
 
-FIELDS_TO_EXPORT = ['ads_title', 'posted_date', 'priority_date', 'category',
-                    'school', 'department', 'specialization',
-                    'rank', 'city', 'state', 'canada',
-                    'current_status', 'comments1', 'comments2',
-                    'ads_source', 'ads_job_code'
-                    ]
-
-
-class CsvWriteLatestToOldest:
-    """Write to CSV file in latest to oldest order of 'posted_date'"""
-    def __init__(self, csv_export_file):
-        self.csv_export_file = csv_export_file
-
-    @classmethod
-    def from_crawler(cls, crawler):
-        """This is used to passed in parameter from setting
-        Ref: https://docs.scrapy.org/en/latest/topics/item-pipeline.html?highlight=from_crawler#write-items-to-mongodb
-        """
-
-        return cls(
-            csv_export_file=crawler.settings.get('CSV_EXPORT_FILE', THIS_SPIDER_RESULT_FILE),
-        )
-
-    def open_spider(self, spider):
-        self.list_items = []
-        self.file = open(self.csv_export_file, 'ab')
-
-        # Creating a FanItemExporter object and initiating export
-        self.exporter = CsvItemExporter(self.file, fields_to_export=FIELDS_TO_EXPORT)
-        self.exporter.start_exporting()
-
-    def close_spider(self, spider):
-        ordered_list = sorted(self.list_items,
-                              key=lambda i: i['posted_date'],
-                              reverse=True)
-
-        for i in ordered_list:
-            item = {key: i.get(key) or '' for key in FIELDS_TO_EXPORT}
-            self.exporter.export_item(item)
-
-        # Ending the export to file
-        self.exporter.finish_exporting()
-        self.file.close()
-
-    def process_item(self, item, spider):
-        self.list_items.append(item)
-        return item
-
-
-class RemoveIgnoredKeywordsPipeline:
-    """ Remove jobs ads with 'ads_title' containing one of the words in the IGNORED_KEYWORDS """
-    def process_item(self, item, spider):
-        adapter = ItemAdapter(item)
-        for keyword in JOB_TITLE_IGNORE_KEYWORDS:
-            if re.search(keyword, adapter['ads_title'], re.IGNORECASE):
-                raise DropItem(f"'Postdoc' item found: {item!r}")
-        return item
-
-
-class DeDuplicatesPipeline:
-    """ Remove duplication based on the ID of each ads for the specific jobs board """
-
-    def __init__(self):
-        self.ids_seen = set()
-
-    def process_item(self, item, spider):
-        adapter = ItemAdapter(item)
-        if adapter.get('ads_job_code'):
-            if adapter['ads_job_code'] in self.ids_seen:
-                raise DropItem(f"Duplicate item found: {item!r}")
-            self.ids_seen.add(adapter['ads_job_code'])
-        return item
+def ads_details(response) -> Dict[str, Any]:
+    """ The fields of a details page, as plain data (it runs in a worker process with 'parse_pool') """
+    # data_layer_string = response.xpath('//script[contains(., "DataLayer")]/text()').get()
+    # data_layer = re.search(r'.*(\{.+\})', data_layer_string, re.MULTILINE|re.DOTALL)
+    # # print(f'{data_layer=}')
+    # if data_layer:
+    #     data = json.loads(data_layer.group(1))
+    #     # print(f'{data=}')
+    data = script_json(response, '//script[contains(., "DataLayer")]/text()',
+                       keys=['Field of specialization-AllTerms']) or {}
+    # print(f'{data=}')
+
+    # detail_data_layer_string = response.css('script[type="application/ld+json"]::text').get()
+    # if detail_data_layer_string:
+    #     detail_data = json.loads(detail_data_layer_string)
+    #     # print(f'{detail_data=}')
+    detail_data = script_json(response, '//script[@type="application/ld+json"]/text()',
+                              keys=['description']) or {}
+    # print(f'{detail_data=}')
+
+    # Get the text
+    # posted_date = ''.join(response.css('.job-detail-description__posted-date > *:last-child *::text').getall()).strip()
+    posted_date = response.css('meta[property="og:article:published_time"]').attrib.get('content')
+    #  Convert to datetime format mm/dd/yyyy
+    # posted_date = datetime.strptime(posted_date, '%b %d, %Y')
+    posted_date_obj = datetime.fromisoformat(posted_date)
+
+    # priority_date = ''.join(response.css('.job-detail-description__end-date > *:last-child *::text').getall()).strip()
+    # priority_date = datetime.strptime(priority_date, '%b %d, %Y').strftime('%m/%d/%Y')
+    priority_date = response.css('meta[property="og:article:expiration_time"]').attrib.get('content')
+    priority_date = datetime.fromisoformat(priority_date).strftime('%m/%d/%Y')
+
+    specialization = data.get('Field of specialization-AllTerms')
+    if not specialization:
+        specialization_text_list = response.css('.job-detail-description__category-Fieldofspecialization > *:last-child *::text').getall()
+        specialization = re.sub(r'\s{2,}', '', ''.join(specialization_text_list))
+
+    # job_description = ' '.join(word.strip()
+    #                            for word in (response.css('.job-description *::text').getall())
+    #                            if re.search(r'\S', word))
+    job_description = detail_data.get('description')
+    if not job_description:
+        # job_description = ' '.join(word.strip()
+        #                        for word in (response.css('.job-description *::text').getall())
+        #                        if re.search(r'\S', word))
+        job_description = selection_text(response.css('.job-description'))
+    # print(f'{job_description=}')
+
+    # scrapy `.attrib` is also available on SelectorList directly; it returns attributes for the first matching element:returns attributes for the first matching element:
+    # https://docs.scrapy.org/en/latest/topics/selectors.html#using-selectors
+    # apply_button_partial_url = response.css('a.button--apply').attrib['href']
+    apply_button_partial_url = response.css('a[data-hook="apply-button"]').attrib['href']
+
+    return {'posted_date': posted_date_obj,
+            'priority_date': priority_date,
+            'specialization': specialization,
+            # Get the ranking (using the job description)
+            'rank': extract_rank(job_description),
+            'comments1': extract_tenure(job_description),
+            # The ld+json description is html
+            'description': strip_html(job_description)[:DESCRIPTION_MAX_CHARS],
+            'apply_button_partial_url': apply_button_partial_url}
 
 
 class ChemicalEngineeringNewsSpider(scrapy.Spider):
@@ -99,6 +95,14 @@ class ChemicalEngineeringNewsSpider(scrapy.Spider):
     start_urls = ['https://chemistryjobs.acs.org/jobs/full-time/north-america/']
     base_url = 'https://chemistryjobs.acs.org/'
     # handle_httpstatus_list = [301, 302]
+    # Set by 'crawl_state.CrawlStateExtension' when 'CRAWL_STATE_ENABLED'
+    crawl_state = None
+    # Set by 'pipelines.CrossSourceDeDuplicatesPipeline' when enabled
+    seen_ads = None
+    # Set by 'redirect_cache.RedirectCacheExtension' when 'REDIRECT_CACHE_ENABLED'
+    redirect_cache = None
+    # Set by 'parse_pool.ParsePoolExtension' when 'PARSE_POOL_WORKERS' > 0
+    parse_pool = None
 
     def parse(self, response):
         # Get all the jobs listing
@@ -109,7 +113,17 @@ class ChemicalEngineeringNewsSpider(scrapy.Spider):
         # # Use C&E News own 'filter' of ads posted in the past 2 days (have green badge say 'New' in the top left corner of each ads listing)
         # jobs = response.xpath('//*[contains(@class, "lister__item")][.//*[contains(@class, "badge--green")]]//*[contains(@class, "lister__details")]')
 
+        # In 'DATE_AWARE_CRAWL' mode, ads older than the posting window (according to the listing) are skipped
+        # and the pagination stops at the first page without any ads inside the window
+        is_date_aware = self.settings.getbool('DATE_AWARE_CRAWL')
+        has_ads_in_window = False
+
         for job in jobs:
+            if is_date_aware:
+                if listing_freshness(job, window_days=POSTING_WINDOW_DAYS) is False:
+                    continue
+                has_ads_in_window = True
+
             title = job.xpath('.//*[contains(@class, "lister__header")]//a//text()').get().strip()
             # print(f'{title=}')
             location = job.xpath('.//*[contains(@class, "lister__meta-item--location")]//text()').get()
@@ -126,9 +140,7 @@ class ChemicalEngineeringNewsSpider(scrapy.Spider):
             ads_source = f'=hyperlink("{details_url}","C&ENJobs")'
 
             # Get the ranking
-            rank = re.findall(r'assist|assoc', title, re.IGNORECASE)
-            rank = '/'.join(word.lower().replace('assist', 'asst')
-                            for word in rank)
+            rank = extract_title_rank(title)
 
             # # Get specialization
             # specialization = re.findall(r'org\w*|anal\w*|inorg\w*|bio\w*|physic\w*|polymer\w*', title, re.IGNORECASE)
@@ -148,102 +160,113 @@ class ChemicalEngineeringNewsSpider(scrapy.Spider):
             }
             # yield JobItem(cb_kwargs)
 
+            # Reuse the ad already processed in a previous run instead of fetching its details again
+            if self.crawl_state is not None:
+                known_ad = self.crawl_state.lookup(ads_job_code)
+                if known_ad is not None and self.crawl_state.is_known(known_ad, self.seen_ads, self.name):
+                    if known_ad['item'] and self.crawl_state.is_recent(known_ad):
+                        yield JobItem(known_ad['item'])
+                    continue
+
             # Pass the callback function arguments with 'cb_kwargs': https://docs.scrapy.org/en/latest/topics/request-response.html?highlight=cb_kwargs#scrapy.http.Request.cb_kwargs
+            # The listing age sets the priority of the request (see 'crawl_budget.RecencyPriorityMiddleware')
             yield scrapy.Request(url=details_url,
                                  cb_kwargs=cb_kwargs,
-                                 callback=self.parse_ads)
+                                 callback=self.parse_ads,
+                                 meta={LISTING_AGE_META: estimated_listing_age(job)})
 
         # Find next page url if exists:
         next_page_partial_url = response.xpath('//*[not(contains(@class, "paginator__items"))][contains(@class, "paginator__item")][.//*[contains(@rel, "next")]]//a/@href').get()
         # print(f'{next_page_partial_url=}')
-        if next_page_partial_url:
+        if next_page_partial_url and (has_ads_in_window or not is_date_aware):
             next_page_url = response.urljoin(next_page_partial_url)
             # print(f'{next_page_url=}')
             yield scrapy.Request(url=next_page_url, callback=self.parse)
 
     def parse_ads(self, response, **cb_kwargs):
-        data_layer_string = response.xpath('//script[contains(., "DataLayer")]/text()').get()
-        data_layer = re.search(r'.*(\{.+\})', data_layer_string, re.MULTILINE|re.DOTALL)
-        # print(f'{data_layer=}')
-        if data_layer:
-            data = json.loads(data_layer.group(1))
-            # print(f'{data=}')
-
-        detail_data_layer_string = response.css('script[type="application/ld+json"]::text').get()
-        if detail_data_layer_string:
-            detail_data = json.loads(detail_data_layer_string)
-            # print(f'{detail_data=}')
-            
-        # Get the text
-        # posted_date = ''.join(response.css('.job-detail-description__posted-date > *:last-child *::text').getall()).strip()
-        posted_date = response.css('meta[property="og:article:published_time"]').attrib.get('content')
-        #  Convert to datetime format mm/dd/yyyy
-        # posted_date = datetime.strptime(posted_date, '%b %d, %Y')
-        posted_date_obj = datetime.fromisoformat(posted_date)
+        # With 'parse_pool.ParsePoolExtension', the page is parsed in a worker process (the output is asynchronous)
+        if self.parse_pool is not None:
+            return self.parse_ads_in_pool(response, cb_kwargs)
+        return self.ads_outputs(response, ads_details(response), cb_kwargs)
+
+    async def parse_ads_in_pool(self, response, cb_kwargs: dict):
+        details = await self.parse_pool.parse(ads_details, response)
+        for output in self.ads_outputs(response, details, cb_kwargs):
+            yield output
+
+    def ads_outputs(self, response, details: Dict[str, Any], cb_kwargs: dict):
+        """ The item or the apply-url redirect request of an ad from the fields of its details page """
+        posted_date_obj = details['posted_date']
         posted_date_string = posted_date_obj.strftime('%m/%d/%Y')
 
-        # priority_date = ''.join(response.css('.job-detail-description__end-date > *:last-child *::text').getall()).strip()
-        # priority_date = datetime.strptime(priority_date, '%b %d, %Y').strftime('%m/%d/%Y')
-        priority_date = response.css('meta[property="og:article:expiration_time"]').attrib.get('content')
-        priority_date = datetime.fromisoformat(priority_date).strftime('%m/%d/%Y')
-
-        if data_layer:
-            specialization = data.get('Field of specialization-AllTerms')
-        else: 
-            specialization_text_list = response.css('.job-detail-description__category-Fieldofspecialization > *:last-child *::text').getall()
-            specialization = re.sub(r'\s{2,}', '', ''.join(specialization_text_list))
-
-        # job_description = ' '.join(word.strip()
-        #                            for word in (response.css('.job-description *::text').getall())
-        #                            if re.search(r'\S', word))
-        if detail_data_layer_string:
-            job_description = detail_data.get('description')
-        if not job_description:
-            job_description = ' '.join(word.strip()
-                                   for word in (response.css('.job-description *::text').getall())
-                                   if re.search(r'\S', word))
-        # print(f'{job_description=}')
-
-        # Get the ranking (using the job description)
-        rank = re.findall(r'Assistant\b|Associate\b|Full\s', job_description)
-        rank_text = '/'.join(word.lower().replace('assistant', 'asst').replace('associate', 'assoc')
-                             for word in rank)
-        # print(f'{rank_text=}')
-        cb_kwargs['rank'] = rank_text or cb_kwargs['rank']
-
-        tenure_type = re.search(r'\S*tenure\S*', job_description, re.IGNORECASE)
-        # print(f'{tenure_type=}')
-        comments1 = tenure_type[0] if tenure_type else None
-
+        cb_kwargs['rank'] = details['rank'] or cb_kwargs['rank']
         cb_kwargs.update({'posted_date': posted_date_string,
-                          'priority_date': priority_date,
-                          'specialization': specialization,
-                          'comments1': comments1})
+                          'posted_at': posted_date_obj.isoformat(),
+                          'priority_date': details['priority_date'],
+                          'specialization': details['specialization'],
+                          'comments1': details['comments1'],
+                          'description': details['description']})
         # yield JobItem(cb_kwargs)
 
-        is_posted_in_the_past_five_days = (datetime.now(tz=timezone.utc) - posted_date_obj).days <= 5
+        is_posted_in_the_past_five_days = (current_time() - posted_date_obj).days <= POSTING_WINDOW_DAYS
         # Update the school field to embed the link to the online app if exists (following Chemjobber List format)
-        # scrapy `.attrib` is also available on SelectorList directly; it returns attributes for the first matching element:returns attributes for the first matching element:
-        # https://docs.scrapy.org/en/latest/topics/selectors.html#using-selectors
-        # apply_button_partial_url = response.css('a.button--apply').attrib['href']
-        apply_button_partial_url = response.css('a[data-hook="apply-button"]').attrib['href']
+        apply_button_partial_url = details['apply_button_partial_url']
         if apply_button_partial_url and is_posted_in_the_past_five_days:
             apply_button_url = response.urljoin(apply_button_partial_url) + '&Action=Cancel'
             # print(f'{apply_button_url=}')
 
+            # Skip the redirect request if the same job was already exported from another jobs board
+            key = dedup_key(cb_kwargs['ads_title'], cb_kwargs['school'])
+            if self.seen_ads is not None and self.seen_ads.is_duplicate(key, self.name):
+                self.logger.info(f"Duplicate of a job found on another jobs board: {cb_kwargs['ads_title']}")
+                # Remembered so its details page is not fetched again while the other jobs board still has it
+                if self.crawl_state is not None:
+                    self.crawl_state.record(cb_kwargs['ads_job_code'], posted_date_obj, duplicate_of=key)
+                return
+
+            # The application url found in a previous run costs no request
+            if self.redirect_cache is not None:
+                application_url = self.redirect_cache.get(apply_button_url)
+                if application_url is not None:
+                    yield self.application_item(application_url, posted_date_obj, cb_kwargs)
+                    return
+
+            # Only the final url is needed: the body of the career site page is not downloaded
             yield scrapy.Request(url=apply_button_url,
                                  callback=self.parse_redirect_application_url,
-                                 cb_kwargs=cb_kwargs)
+                                 cb_kwargs=cb_kwargs,
+                                 meta={'posted_date': posted_date_obj,
+                                       'apply_url': apply_button_url,
+                                       HEADERS_ONLY_META: True})
+        elif self.crawl_state is not None:
+            # Remember the ad (without item) so it is not fetched again in the next runs
+            self.crawl_state.record(cb_kwargs['ads_job_code'], posted_date_obj)
 
     def parse_redirect_application_url(self, response, **cb_kwargs):
         """ Get the redirect url to the application url """
         application_url = response.url or response.request.url
         # print(f'{application_url=}')
+        if self.redirect_cache is not None:
+            self.redirect_cache.set(response.meta['apply_url'], application_url)
+        yield self.application_item(application_url, response.meta.get('posted_date'), cb_kwargs)
+
+    def application_item(self, application_url: str, posted_date: datetime, cb_kwargs: dict) -> JobItem:
+        """ The job item with the school field embedding the link to the online application """
         cb_kwargs['school'] = f'=hyperlink("{application_url}","{cb_kwargs["school"]}")'
-        yield JobItem(cb_kwargs)
+        if self.crawl_state is not None:
+            self.crawl_state.record(cb_kwargs['ads_job_code'], posted_date, cb_kwargs)
+        return JobItem(cb_kwargs)
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=f'Crawl {ChemicalEngineeringNewsSpider.name} into {THIS_SPIDER_RESULT_FILE}')
+    add_archive_arguments(parser)
+    args = parser.parse_args()
+    if args.http_archive:
+        # A recording / replay writes its own jobs history and csv file, next to the archives
+        THIS_SPIDER_RESULT_FILE = archive_output_file(args.http_archive, THIS_SPIDER_RESULT_FILE)
+        JOB_STORE.move_to(archive_output_file(args.http_archive, JOB_STORE.file))
+
     # Remove the result file if exists
     THIS_SPIDER_RESULT_FILE.unlink(missing_ok=True)
 
@@ -255,11 +278,10 @@ if __name__ == '__main__':
         #   'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
         #   'Accept-Language': 'en'
         # },
-        'CSV_EXPORT_FILE': THIS_SPIDER_RESULT_FILE,
         'ITEM_PIPELINES': {
-            '__main__.RemoveIgnoredKeywordsPipeline': 100,
-            '__main__.DeDuplicatesPipeline': 800,
-            '__main__.CsvWriteLatestToOldest': 900,
+            'pipelines.RemoveIgnoredKeywordsPipeline': 100,
+            'pipelines.DeDuplicatesPipeline': 800,
+            'pipelines.JobStorePipeline': 900,
             },
         # 'FEEDS': {
         #     Path(THIS_SPIDER_RESULT_FILE): {
@@ -273,6 +295,13 @@ if __name__ == '__main__':
         # 'ROBOTSTXT_OBEY': False,
     }
 
+    # Record the responses into (or replay them from) the local HTTP archive
+    settings.update(archive_settings(args.http_archive))
+
     process = CrawlerProcess(settings=settings)
     process.crawl(ChemicalEngineeringNewsSpider)
     process.start()
+
+    # Export the jobs of this run from the jobs history, from latest to oldest
+    JOB_STORE.export_csv(file=THIS_SPIDER_RESULT_FILE, fieldnames=FIELDS_TO_EXPORT, source=ChemicalEngineeringNewsSpider.name)
+    JOB_STORE.close()
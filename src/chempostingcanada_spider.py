@@ -1,15 +1,17 @@
-import re
-from datetime import datetime
+import argparse
+from datetime import datetime, timedelta
 from pathlib import Path
 
-# useful for handling different item types with a single interface
-from itemadapter import ItemAdapter
+import scrapy
 from scrapy.crawler import CrawlerProcess
-from scrapy.exceptions import DropItem
-from scrapy.exporters import CsvItemExporter
 from scrapy.spiders import XMLFeedSpider
 
+from extractors import DESCRIPTION_MAX_CHARS, extract_rank, extract_specialization, extract_tenure, strip_html
+from http_archive import add_archive_arguments, archive_output_file, archive_settings
 from items import JobItem
+from job_store import JOB_STORE
+from pipelines import FIELDS_TO_EXPORT
+from posting_window import current_time
 
 
 CURRENT_FILEPATH = Path(__file__).resolve().parent
@@ -17,84 +19,9 @@ DATA_FOLDER = CURRENT_FILEPATH.parent / 'data'
 DATA_FOLDER.mkdir(exist_ok=True)
 THIS_SPIDER_RESULT_FILE = DATA_FOLDER / 'chempostingcanada_jobs.csv'
 
-JOB_TITLE_IGNORE_KEYWORDS = ['post-doc', 'postdoc', 'post doc', 'scientist']
-
-FIELDS_TO_EXPORT = ['ads_title', 'posted_date', 'priority_date', 'category',
-                    'school', 'department', 'specialization',
-                    'rank', 'city', 'state', 'canada',
-                    'current_status', 'comments1', 'comments2',
-                    'ads_source', 'ads_job_code'
-                    ]
-
 COUNTRIES_TO_SEARCH = ['United States', 'Canada', 'Puerto Rico']
 
 
-class CsvWriteLatestToOldest:
-    """Write to CSV file in latest to oldest order of 'posted_date'"""
-    def __init__(self, csv_export_file):
-        self.csv_export_file = csv_export_file
-
-    @classmethod
-    def from_crawler(cls, crawler):
-        """This is used to passed in parameter from setting
-        Ref: https://docs.scrapy.org/en/latest/topics/item-pipeline.html?highlight=from_crawler#write-items-to-mongodb
-        """
-
-        return cls(
-            csv_export_file=crawler.settings.get('CSV_EXPORT_FILE', THIS_SPIDER_RESULT_FILE),
-        )
-
-    def open_spider(self, spider):
-        self.list_items = []
-        self.file = open(self.csv_export_file, 'ab')
-
-        # Creating a FanItemExporter object and initiating export
-        self.exporter = CsvItemExporter(self.file, fields_to_export=FIELDS_TO_EXPORT)
-        self.exporter.start_exporting()
-
-    def close_spider(self, spider):
-        ordered_list = sorted(self.list_items,
-                              key=lambda i: i['posted_date'],
-                              reverse=True)
-
-        for i in ordered_list:
-            item = {key: i.get(key) or '' for key in FIELDS_TO_EXPORT}
-            self.exporter.export_item(item)
-
-        # Ending the export to file
-        self.exporter.finish_exporting()
-        self.file.close()
-
-    def process_item(self, item, spider):
-        self.list_items.append(item)
-        return item
-
-
-class RemoveIgnoredKeywordsPipeline:
-    """ Remove jobs ads with 'ads_title' containing one of the words in the IGNORED_KEYWORDS """
-    def process_item(self, item, spider):
-        adapter = ItemAdapter(item)
-        for keyword in JOB_TITLE_IGNORE_KEYWORDS:
-            if re.search(keyword, adapter['ads_title'], re.IGNORECASE):
-                raise DropItem(f"'Postdoc' item found: {item!r}")
-        return item
-
-
-class DeDuplicatesPipeline:
-    """ Remove duplication based on the ID of each ads for the specific jobs board """
-
-    def __init__(self):
-        self.ids_seen = set()
-
-    def process_item(self, item, spider):
-        adapter = ItemAdapter(item)
-        if adapter.get('ads_job_code'):
-            if adapter['ads_job_code'] in self.ids_seen:
-                raise DropItem(f"Duplicate item found: {item!r}")
-            self.ids_seen.add(adapter['ads_job_code'])
-        return item
-
-
 class ChempostingcanadaSpider(XMLFeedSpider):
     name = 'chempostingscanada.blogspot.com'
     allowed_domains = ['chempostingscanada.blogspot.com']
@@ -107,6 +34,16 @@ class ChempostingcanadaSpider(XMLFeedSpider):
                   ('thr', 'http://purl.org/syndication/thread/1.0')]
     iterator = 'iternodes'  # This is actually unnecessary, since it's the default value
     itertag = 'entry'
+    # Only the ads posted in this many days are exported
+    window_days = 10
+
+    def start_requests(self):
+        # Only request the entries updated inside the window with Blogger 'updated-min' query:
+        # https://developers.google.com/blogger/docs/2.0/developers_guide_protocol#RetrievingWithQuery
+        # It is rounded to the day so the url (and its 'ETag' for conditional requests) is the same for all the runs of a day
+        updated_min = (current_time() - timedelta(days=self.window_days + 1)).strftime('%Y-%m-%dT00:00:00Z')
+        for url in self.start_urls:
+            yield scrapy.Request(url=f'{url}?updated-min={updated_min}&max-results=500')
 
     def parse_node(self, response, node):
         # self.logger.info('Hi, this is a <%s> node!: %s', self.itertag, ''.join(node.getall()))
@@ -118,8 +55,8 @@ class ChempostingcanadaSpider(XMLFeedSpider):
         posted_date = datetime.fromisoformat(posted_date)
         timezone_info = posted_date.tzinfo
         posted_date_string = posted_date.strftime('%m/%d/%Y')
-        now = datetime.now(tz=timezone_info)
-        is_posted_in_the_past_five_days = (now - posted_date).days <= 10
+        now = current_time(tz=timezone_info)
+        is_posted_in_the_past_five_days = (now - posted_date).days <= self.window_days
 
         if not is_posted_in_the_past_five_days:
             return
@@ -134,27 +71,21 @@ class ChempostingcanadaSpider(XMLFeedSpider):
 
         ads_content = node.xpath('.//x:content/text()').get()
         # self.logger.info(f'{ads_content=}')
-        ads_content_text_only = re.sub('<[^<]+?>', ' ', ads_content)
+        ads_content_text_only = strip_html(ads_content)
         self.logger.info(f'{ads_content_text_only=}')
 
         # Get specialization
-        specialization = set(word.lower()
-                             for word in re.findall(r'org\w*|anal\w*|inorg\w*|bio(?!chemical\b)\w+|physic\w*|polymer\w*', ads_content_text_only, re.IGNORECASE))
-        specialization = ', '.join(specialization)
+        specialization = extract_specialization(ads_content_text_only)
 
         # Get the ranking (using the job description)
-        rank = set(re.findall(r'Assistant\b|Associate\b|Full\s', ads_content_text_only))
-        rank_text = '/'.join(word.strip().lower()
-                             .replace('assistant', 'asst').replace('associate', 'assoc')
-                             for word in rank)
+        rank_text = extract_rank(ads_content_text_only)
 
-        tenure_type = re.search(r'\S*tenure\S*', ads_content_text_only, re.IGNORECASE)
-        # print(f'{tenure_type=}')
-        comments1 = tenure_type[0] if tenure_type else None
+        comments1 = extract_tenure(ads_content_text_only)
 
         # self.logger.info(f'{item=}')
         item.update({
             'posted_date': posted_date_string,
+            'posted_at': posted_date.isoformat(),
             'ads_title': title,
             'canada': 'yes',
             'ads_source': ads_source,
@@ -162,11 +93,20 @@ class ChempostingcanadaSpider(XMLFeedSpider):
             'specialization': specialization,
             'rank': rank_text,
             'comments1': comments1,
+            'description': ads_content_text_only[:DESCRIPTION_MAX_CHARS],
         })
         return item
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=f'Crawl {ChempostingcanadaSpider.name} into {THIS_SPIDER_RESULT_FILE}')
+    add_archive_arguments(parser)
+    args = parser.parse_args()
+    if args.http_archive:
+        # A recording / replay writes its own jobs history and csv file, next to the archives
+        THIS_SPIDER_RESULT_FILE = archive_output_file(args.http_archive, THIS_SPIDER_RESULT_FILE)
+        JOB_STORE.move_to(archive_output_file(args.http_archive, JOB_STORE.file))
+
     # Remove the result file if exists
     THIS_SPIDER_RESULT_FILE.unlink(missing_ok=True)
 
@@ -178,11 +118,10 @@ if __name__ == '__main__':
         #   'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
         #   'Accept-Language': 'en'
         # },
-        'CSV_EXPORT_FILE': THIS_SPIDER_RESULT_FILE,
         'ITEM_PIPELINES': {
-            '__main__.RemoveIgnoredKeywordsPipeline': 100,
-            '__main__.DeDuplicatesPipeline': 800,
-            '__main__.CsvWriteLatestToOldest': 900,
+            'pipelines.RemoveIgnoredKeywordsPipeline': 100,
+            'pipelines.DeDuplicatesPipeline': 800,
+            'pipelines.JobStorePipeline': 900,
             },
         # 'FEEDS': {
         #     Path(THIS_SPIDER_RESULT_FILE): {
@@ -196,6 +135,13 @@ if __name__ == '__main__':
         # 'ROBOTSTXT_OBEY': False,
     }
 
+    # Record the responses into (or replay them from) the local HTTP archive
+    settings.update(archive_settings(args.http_archive))
+
     process = CrawlerProcess(settings=settings)
     process.crawl(ChempostingcanadaSpider)
     process.start()
+
+    # Export the jobs of this run from the jobs history, from latest to oldest
+    JOB_STORE.export_csv(file=THIS_SPIDER_RESULT_FILE, fieldnames=FIELDS_TO_EXPORT, source=ChempostingcanadaSpider.name)
+    JOB_STORE.close()
@@ -0,0 +1,107 @@
+from datetime import date, datetime
+from functools import lru_cache
+from pathlib import Path, PurePath
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from dedup import hyperlink_parts
+
+# Rows per row group of the Parquet file: the rows are converted and written batch by batch
+BATCH_SIZE = 10_000
+
+
+@lru_cache(maxsize=4096)
+def parse_date(value: Optional[str]) -> Optional[date]:
+    """Date of a 'mm/dd/YYYY' field, None if empty or invalid (only a few hundred different dates in a run)"""
+    try:
+        return datetime.strptime(value, '%m/%d/%Y').date()
+    except (TypeError, ValueError):
+        return None
+
+
+def text(value: Any) -> Optional[str]:
+    return None if value is None or value == '' else str(value)
+
+
+def hyperlink_url(cell: Optional[str]) -> Optional[str]:
+    return text(hyperlink_parts(cell)[0])
+
+
+def hyperlink_label(cell: Optional[str]) -> Optional[str]:
+    return text(hyperlink_parts(cell)[1])
+
+
+def is_yes(value: Optional[str]) -> bool:
+    # The spiders set 'canada' to 'yes' or leave it empty
+    return (value or '').lower() == 'yes'
+
+
+# A column of the Parquet file: (name, pyarrow type name, value of the item field -> value of the column)
+Column = Tuple[str, str, Callable[[Any], Any]]
+
+# Item field -> its columns in the Parquet file; the other fields are one string column each.
+# The '=hyperlink("url","name")' cells are split so the readers do not parse the sheet formulas again
+FIELD_COLUMNS: Dict[str, List[Column]] = {
+    'posted_date': [('posted_date', 'date32', parse_date)],
+    'priority_date': [('priority_date', 'date32', parse_date)],
+    'canada': [('canada', 'bool_', is_yes)],
+    'school': [('school_name', 'string', hyperlink_label), ('application_url', 'string', hyperlink_url)],
+    # Lists all the jobs boards of a merged near duplicate, e.g. 'HigherEdJobs + C&ENJobs'
+    'ads_source': [('source_name', 'string', hyperlink_label), ('source_url', 'string', hyperlink_url)],
+}
+
+
+def columns_of(fieldnames: Sequence[str]) -> List[Column]:
+    """Columns of the Parquet file of the rows of 'fieldnames', in the order of the fields"""
+    return [column for field in fieldnames for column in FIELD_COLUMNS.get(field, [(field, 'string', text)])]
+
+
+def write_parquet(file: PurePath, rows: Iterable[Sequence[Any]], fieldnames: Sequence[str],
+                  batch_size: int = BATCH_SIZE) -> int:
+    """Write rows of item field values to a Parquet file with typed columns (see 'FIELD_COLUMNS')
+
+    pyarrow is only needed (and imported) here, it is not a dependency of the crawl:
+    `pip install pyarrow` to use 'list_jobs.py --parquet'.
+
+    Parameters
+    ----------
+    file : PurePath
+        Parquet file to be written (overwritten if exists)
+    rows : Iterable[Sequence[Any]]
+        Values of 'fieldnames' of each job, e.g. ``JobStore.export_rows``
+    fieldnames : Sequence[str]
+        The item fields of the rows
+    batch_size : int, optional
+        Number of rows per row group, by default 10000
+
+    Returns
+    -------
+    int
+        Number of rows written
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    columns = columns_of(fieldnames)
+    schema = pa.schema([(name, getattr(pa, type_name)()) for name, type_name, _ in columns])
+    # Field number of each column
+    sources = [position for position, field in enumerate(fieldnames) for _ in FIELD_COLUMNS.get(field, [None])]
+
+    def write_batch(batch: List[Sequence[Any]]) -> None:
+        arrays = [pa.array([convert(row[position]) for row in batch], type=schema.field(name).type)
+                  for (name, _, convert), position in zip(columns, sources)]
+        writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+
+    rows_written = 0
+    Path(file).parent.mkdir(parents=True, exist_ok=True)
+    with pq.ParquetWriter(str(file), schema) as writer:
+        batch: List[Sequence[Any]] = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                write_batch(batch)
+                rows_written += len(batch)
+                batch = []
+        if batch or not rows_written:
+            write_batch(batch)
+            rows_written += len(batch)
+    return rows_written
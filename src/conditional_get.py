@@ -0,0 +1,258 @@
+import hashlib
+import json
+from datetime import datetime
+from pathlib import Path, PurePath
+from typing import Any, Dict, List, Optional
+
+from itemadapter import ItemAdapter, is_item
+from scrapy import Request, signals
+from scrapy.exceptions import NotConfigured
+
+from items import JobItem
+from posting_window import POSTING_WINDOW_DAYS, current_time
+
+CURRENT_FILEPATH = Path(__file__).resolve().parent
+DATA_FOLDER = CURRENT_FILEPATH.parent / 'data'
+CONDITIONAL_GET_FOLDER = DATA_FOLDER / 'conditional_get'
+
+# request.meta keys: the url of the conditional request a request comes from (set on the start requests
+# and inherited by all the requests of their callbacks), and what the downloader learned about the response
+CONDITIONAL_GET_META = 'conditional_get'
+UNCHANGED_META = 'conditional_get_unchanged'
+VALIDATORS_META = 'conditional_get_validators'
+
+
+class ConditionalGetStore:
+    """Validators ('ETag', 'Last-Modified', hash of the body) of the start urls of one spider
+    and the items the spider got from each of them (following all their requests) in the last run
+    """
+    def __init__(self, file: PurePath):
+        self.file = Path(file)
+        self.entries: Dict[str, Dict[str, Any]] = {}
+
+    def load(self) -> 'ConditionalGetStore':
+        if self.file.exists():
+            with open(self.file, 'r') as f_in:
+                self.entries = json.load(f_in)
+        return self
+
+    def save(self) -> None:
+        self.file.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.file, 'w') as f_out:
+            json.dump(self.entries, f_out, indent=1, sort_keys=True)
+
+
+# Store file -> store, shared by the downloader and the spider middlewares of a spider
+STORES: Dict[Path, ConditionalGetStore] = {}
+
+
+def get_store(crawler, spider) -> ConditionalGetStore:
+    file = Path(crawler.settings.get('CONDITIONAL_GET_DIR', CONDITIONAL_GET_FOLDER)) / f'{spider.name}.json'
+    store = STORES.get(file)
+    if store is None:
+        store = STORES[file] = ConditionalGetStore(file).load()
+    return store
+
+
+def body_hash(body: bytes) -> str:
+    return hashlib.sha1(body).hexdigest()
+
+
+class ConditionalGetDownloaderMiddleware:
+    """Send the start requests as conditional requests ('If-None-Match', 'If-Modified-Since')
+    and tell ``ConditionalGetSpiderMiddleware`` whether the response changed since the last run
+    (a '304 Not Modified' or the same body hash)
+
+    Enable it with ``ConditionalGetSpiderMiddleware`` in the settings:
+        'DOWNLOADER_MIDDLEWARES': {'conditional_get.ConditionalGetDownloaderMiddleware': 570},
+        'SPIDER_MIDDLEWARES': {'conditional_get.ConditionalGetSpiderMiddleware': 950},
+        'CONDITIONAL_GET_ENABLED': True,
+    """
+    def __init__(self, crawler):
+        self.crawler = crawler
+        self.store: Optional[ConditionalGetStore] = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('CONDITIONAL_GET_ENABLED'):
+            raise NotConfigured
+
+        middleware = cls(crawler)
+        crawler.signals.connect(middleware.spider_opened, signal=signals.spider_opened)
+        return middleware
+
+    def spider_opened(self, spider):
+        self.store = get_store(self.crawler, spider)
+
+    def process_request(self, request, spider):
+        # Only the start requests themselves, not the requests of their callbacks (which only inherit the key)
+        if request.meta.get(CONDITIONAL_GET_META) != request.url:
+            return None
+
+        entry = self.store.entries.get(request.url)
+        if entry is None:
+            return None
+
+        if entry.get('etag'):
+            request.headers.setdefault('If-None-Match', entry['etag'])
+        if entry.get('last_modified'):
+            request.headers.setdefault('If-Modified-Since', entry['last_modified'])
+        # The 304 has to reach the spider middleware instead of being filtered as an error
+        request.meta['handle_httpstatus_list'] = [*request.meta.get('handle_httpstatus_list', []), 304]
+        return None
+
+    def process_response(self, request, response, spider):
+        url = request.meta.get(CONDITIONAL_GET_META)
+        if url is None or url != request.meta.get('redirect_urls', [request.url])[0]:
+            return response
+
+        entry = self.store.entries.get(url)
+        if response.status == 304:
+            request.meta[UNCHANGED_META] = entry is not None
+            return response
+
+        validators = {
+            'etag': response.headers.get('ETag', b'').decode('latin-1') or None,
+            'last_modified': response.headers.get('Last-Modified', b'').decode('latin-1') or None,
+            'body_hash': body_hash(response.body),
+        }
+        request.meta[UNCHANGED_META] = entry is not None and entry.get('body_hash') == validators['body_hash']
+        request.meta[VALIDATORS_META] = validators
+        return response
+
+
+class ConditionalGetSpiderMiddleware:
+    """Skip the callback of an unchanged start url and reuse the items it gave in the last run
+
+    The start requests are marked with ``meta={'conditional_get': <url>}``; the requests of their callbacks
+    (e.g. the details pages, the next listing pages) inherit it, so all the items found from a start url
+    are stored together. The reused items still go through the posting window
+    ('window_days' attribute of the spider, by default 'POSTING_WINDOW_DAYS') and the item pipelines,
+    and are marked as seen in the crawl state of the spider (see ``crawl_state.CrawlState``), as if the listing
+    had been parsed. The store is only updated when the spider finished, with the start urls of this run only
+    (e.g. the ChemPostingCanada feed url changes every day).
+    """
+    def __init__(self, crawler):
+        self.crawler = crawler
+        self.store: Optional[ConditionalGetStore] = None
+        # start url -> validators and items of this run, for the start urls that changed
+        self.pending: Dict[str, Dict[str, Any]] = {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('CONDITIONAL_GET_ENABLED'):
+            raise NotConfigured
+
+        middleware = cls(crawler)
+        crawler.signals.connect(middleware.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(middleware.spider_closed, signal=signals.spider_closed)
+        return middleware
+
+    def spider_opened(self, spider):
+        self.store = get_store(self.crawler, spider)
+        self.pending = {}
+
+    def spider_closed(self, spider, reason):
+        if reason != 'finished':
+            return
+        # The start urls not requested in this run, or whose callback failed, are forgotten
+        self.store.entries = {url: entry for url, entry in self.pending.items() if 'body_hash' in entry}
+        self.store.save()
+
+    def process_start_requests(self, start_requests, spider):
+        for request in start_requests:
+            yield self._mark_start_request(request)
+
+    async def process_start(self, start):
+        # Same as 'process_start_requests' for Scrapy >= 2.13
+        async for request in start:
+            yield self._mark_start_request(request)
+
+    def _mark_start_request(self, request):
+        if isinstance(request, Request) and request.method == 'GET':
+            request.meta.setdefault(CONDITIONAL_GET_META, request.url)
+        return request
+
+    def process_spider_output(self, response, result, spider):
+        url = response.meta.get(CONDITIONAL_GET_META)
+        if url is None:
+            yield from result
+            return
+
+        if response.meta.get(UNCHANGED_META):
+            # The callback is never called: its output generator is dropped without being consumed
+            spider.logger.info(f'Unchanged since the last run, reusing its items: {url}')
+            self.crawler.stats.inc_value('conditional_get/unchanged')
+            yield from self._reuse_items(url, spider)
+            return
+
+        self._start_entry(url, response)
+        for output in result:
+            yield self._track_output(url, output)
+        self._finish_entry(url, response)
+
+    async def process_spider_output_async(self, response, result, spider):
+        # Same as 'process_spider_output' when the output is asynchronous, each output yielded as soon as it comes
+        url = response.meta.get(CONDITIONAL_GET_META)
+        if url is not None and response.meta.get(UNCHANGED_META):
+            for item in self.process_spider_output(response, (), spider):
+                yield item
+            return
+
+        if url is None:
+            async for output in result:
+                yield output
+            return
+
+        self._start_entry(url, response)
+        async for output in result:
+            yield self._track_output(url, output)
+        self._finish_entry(url, response)
+
+    def _start_entry(self, url: str, response) -> None:
+        # The items of the callbacks of a changed start url, its validators once its callback gave all its outputs
+        if VALIDATORS_META in response.meta:
+            self.pending[url] = {'items': []}
+
+    def _track_output(self, url: str, output):
+        if isinstance(output, Request):
+            output.meta.setdefault(CONDITIONAL_GET_META, url)
+        elif is_item(output) and url in self.pending:
+            self.pending[url]['items'].append(ItemAdapter(output).asdict())
+        return output
+
+    def _finish_entry(self, url: str, response) -> None:
+        # Not reached if the callback failed: the start url is parsed again in the next run
+        if VALIDATORS_META in response.meta:
+            self.pending[url].update(response.meta[VALIDATORS_META])
+
+    def _reuse_items(self, url: str, spider) -> List[JobItem]:
+        entry = self.store.entries[url]
+        # Keep the entry (and its items) for the next run
+        self.pending[url] = entry
+        window_days = getattr(spider, 'window_days', POSTING_WINDOW_DAYS)
+        items = [JobItem(item) for item in entry['items'] if is_in_window(item, window_days)]
+
+        # The listing is not parsed: the ads of the reused items are seen in this run all the same
+        crawl_state = getattr(spider, 'crawl_state', None)
+        if crawl_state is not None:
+            for item in items:
+                if not item.get('ads_job_code'):
+                    continue
+                # 'lookup' marks a known ad as seen, the others are recorded again
+                if crawl_state.lookup(item['ads_job_code']) is None and item.get('posted_at'):
+                    crawl_state.record(item['ads_job_code'], datetime.fromisoformat(item['posted_at']), item)
+        return items
+
+
+def is_in_window(item: Dict[str, Any], window_days: int = POSTING_WINDOW_DAYS) -> bool:
+    """Same check as the spiders with the time the item was posted ('posted_at'), the day of 'posted_date'
+    for the items stored before it existed; True without any of them
+    """
+    if item.get('posted_at'):
+        posted_at = datetime.fromisoformat(item['posted_at'])
+        return (current_time(tz=posted_at.tzinfo) - posted_at).days <= window_days
+    if item.get('posted_date'):
+        posted_date = datetime.strptime(item['posted_date'], '%m/%d/%Y')
+        return (current_time().replace(tzinfo=None) - posted_date).days <= window_days
+    return True
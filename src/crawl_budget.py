@@ -0,0 +1,161 @@
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+from scrapy import Request, signals
+from scrapy.exceptions import IgnoreRequest, NotConfigured
+from scrapy.utils.defer import deferred_from_coro
+
+from posting_window import POSTING_WINDOW_DAYS, current_time
+
+# request.meta key of the age (in days) of the ad a request is for, as shown on the listing
+# (the requests with a 'posted_date' datetime in their meta do not need it)
+LISTING_AGE_META = 'listing_age_days'
+
+# Priorities: the listing pages first (they find the ads), then the requests of the ads from the latest posted,
+# and for the same age the apply-url redirects (the last request of an ad) before the details pages
+LISTING_PRIORITY = 1000
+PRIORITY_PER_DAY = 100
+REDIRECT_BONUS = 50
+# Ads of unknown age (e.g. no date on the listing) come after all the ads inside the posting window
+UNKNOWN_AGE_PRIORITY = -1
+
+# Callbacks of the listing pages (the other callbacks are for one ad each)
+LISTING_CALLBACKS = {'parse', 'parse_node', 'parse_nodes'}
+REDIRECT_CALLBACKS = {'parse_redirect_application_url'}
+
+
+def request_age_days(request: Request) -> Optional[int]:
+    """Age in days of the ad of a request: from its 'posted_date' meta, or the listing age, None if unknown"""
+    posted_date = request.meta.get('posted_date')
+    if isinstance(posted_date, datetime):
+        if posted_date.tzinfo is None:
+            posted_date = posted_date.replace(tzinfo=timezone.utc)
+        return (current_time(tz=posted_date.tzinfo) - posted_date).days
+    return request.meta.get(LISTING_AGE_META)
+
+
+def request_priority(request: Request, window_days: int = POSTING_WINDOW_DAYS) -> int:
+    """Priority of a request from its type (listing page, details page, apply-url redirect) and the age of its ad
+
+    e.g. with a 5-day window: listing pages 1000, details page of an ad posted today 500, 3 days ago 200,
+    apply-url redirect of an ad posted 3 days ago 250, ad of unknown age -1, 7 days ago -200
+    """
+    callback = getattr(request.callback, '__name__', None) or 'parse'
+    if callback in LISTING_CALLBACKS:
+        return LISTING_PRIORITY
+
+    age = request_age_days(request)
+    if age is None:
+        return UNKNOWN_AGE_PRIORITY
+    priority = PRIORITY_PER_DAY * (window_days - age)
+    if callback in REDIRECT_CALLBACKS:
+        priority += REDIRECT_BONUS
+    return priority
+
+
+class RecencyPriorityMiddleware:
+    """Spider middleware setting the priority of the requests (see ``request_priority``),
+    so the scheduler sends the listing pages then the requests of the latest ads first
+
+    The requests with an explicit priority (not 0) are left as is. Its order is not the one of the depth
+    middleware (900): the middlewares of the same order run in no defined order. Enable it with:
+        'SPIDER_MIDDLEWARES': {'crawl_budget.RecencyPriorityMiddleware': 910},
+        'RECENCY_PRIORITY_ENABLED': True,
+    """
+    def __init__(self, crawler):
+        self.crawler = crawler
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('RECENCY_PRIORITY_ENABLED'):
+            raise NotConfigured
+        return cls(crawler)
+
+    def process_start_requests(self, start_requests, spider):
+        for request in start_requests:
+            yield self._prioritize(request, spider)
+
+    async def process_start(self, start):
+        # Same as 'process_start_requests' for Scrapy >= 2.13
+        async for request in start:
+            yield self._prioritize(request, self.crawler.spider)
+
+    def process_spider_output(self, response, result, spider):
+        for output in result:
+            yield self._prioritize(output, spider)
+
+    async def process_spider_output_async(self, response, result, spider):
+        # Same as 'process_spider_output' when the output is asynchronous
+        async for output in result:
+            yield self._prioritize(output, spider)
+
+    def _prioritize(self, output, spider):
+        if isinstance(output, Request) and output.priority == 0:
+            output.priority = request_priority(output, window_days=getattr(spider, 'window_days', POSTING_WINDOW_DAYS))
+        return output
+
+
+class CrawlDeadlineMiddleware:
+    """Downloader middleware bounding the crawl of each spider to 'CRAWL_DEADLINE' seconds
+
+    After 'CRAWL_DEADLINE_SOFT_RATIO' of the budget (by default 80%), the requests with a priority lower than
+    'CRAWL_DEADLINE_MIN_PRIORITY' (by default 0: the ads of unknown age or older than the posting window) are dropped;
+    at the deadline the spider is closed with the reason 'deadline'. With ``RecencyPriorityMiddleware``
+    the requests of the latest ads are sent first, so a bounded run keeps the most recent ads.
+    Its order is not the one of the retry middleware (550): the middlewares of the same order run in no defined order.
+    Enable it with:
+        'DOWNLOADER_MIDDLEWARES': {'crawl_budget.CrawlDeadlineMiddleware': 540},
+        'CRAWL_DEADLINE': 600,
+    """
+    def __init__(self, crawler, deadline: float, soft_ratio: float, min_priority: int):
+        self.crawler = crawler
+        self.deadline = deadline
+        self.soft_deadline = deadline * soft_ratio
+        self.min_priority = min_priority
+        self.started_at: Optional[float] = None
+        self.task = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        deadline = crawler.settings.getfloat('CRAWL_DEADLINE')
+        if deadline <= 0:
+            raise NotConfigured
+
+        middleware = cls(crawler, deadline=deadline,
+                         soft_ratio=crawler.settings.getfloat('CRAWL_DEADLINE_SOFT_RATIO', 0.8),
+                         min_priority=crawler.settings.getint('CRAWL_DEADLINE_MIN_PRIORITY', 0))
+        crawler.signals.connect(middleware.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(middleware.spider_closed, signal=signals.spider_closed)
+        return middleware
+
+    def spider_opened(self, spider):
+        # Imported once the crawler installed its reactor (see 'daemon.run_daemon')
+        from twisted.internet import reactor
+
+        self.started_at = time.monotonic()
+        self.task = reactor.callLater(self.deadline, self.close_spider, spider)
+        spider.logger.info(f'Crawl deadline in {self.deadline:g}s')
+
+    def spider_closed(self, spider):
+        if self.task is not None and self.task.active():
+            self.task.cancel()
+        self.task = None
+
+    def close_spider(self, spider):
+        spider.logger.info(f'Crawl deadline of {self.deadline:g}s reached, closing the spider')
+        self.crawler.stats.set_value('crawl_budget/deadline_reached', True)
+        engine = self.crawler.engine
+        # 'close_spider_async' for Scrapy >= 2.13
+        if hasattr(engine, 'close_spider_async'):
+            deferred_from_coro(engine.close_spider_async(reason='deadline'))
+        else:
+            engine.close_spider(spider, reason='deadline')
+
+    def process_request(self, request, spider):
+        if self.started_at is None or time.monotonic() - self.started_at < self.soft_deadline:
+            return None
+        if request.priority < self.min_priority:
+            self.crawler.stats.inc_value('crawl_budget/dropped')
+            raise IgnoreRequest(f'Crawl deadline close, dropped low priority ({request.priority}) request: {request.url}')
+        return None
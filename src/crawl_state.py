@@ -0,0 +1,118 @@
+import json
+from datetime import datetime, timedelta, timezone
+from pathlib import Path, PurePath
+from typing import Any, Dict, Optional, Tuple
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+
+from dedup import SeenAds
+from posting_window import POSTING_WINDOW_DAYS, current_time
+
+CURRENT_FILEPATH = Path(__file__).resolve().parent
+DATA_FOLDER = CURRENT_FILEPATH.parent / 'data'
+CRAWL_STATE_FOLDER = DATA_FOLDER / 'crawl_state'
+
+# Forget ads that have not been seen on their jobs board for this many days
+CRAWL_STATE_MAX_AGE_DAYS = 30
+
+
+class CrawlState:
+    """Persistent store of the ads already processed by one spider, keyed by 'ads_job_code'
+
+    Each entry holds the time the ad was posted, the last time it was seen on the listing
+    and the extracted ``JobItem`` (as a dict) if the ad was recent enough to be exported,
+    or the dedup key of the job if the ad was skipped as the duplicate of a job from another jobs board.
+    The 'ads_source' part of the key is the file itself: every spider has its own state file.
+    """
+    def __init__(self, file: PurePath, max_age_days: int = CRAWL_STATE_MAX_AGE_DAYS):
+        self.file = Path(file)
+        self.max_age_days = max_age_days
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.now = datetime.now(tz=timezone.utc)
+
+    def load(self) -> 'CrawlState':
+        if self.file.exists():
+            with open(self.file, 'r') as f_in:
+                self.entries = json.load(f_in)
+        return self
+
+    def save(self) -> None:
+        """Write the state back to disk, dropping ads that have not been seen for a while"""
+        oldest_seen = (self.now - timedelta(days=self.max_age_days)).isoformat()
+        entries = {job_code: entry for job_code, entry in self.entries.items()
+                   if entry['last_seen'] >= oldest_seen}
+
+        self.file.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.file, 'w') as f_out:
+            json.dump(entries, f_out, indent=1, sort_keys=True)
+
+    def lookup(self, ads_job_code) -> Optional[Dict[str, Any]]:
+        """Return the stored entry of an ad already processed in a previous run (or None)
+        and mark it as seen in this run
+        """
+        entry = self.entries.get(str(ads_job_code))
+        if entry is not None:
+            entry['last_seen'] = self.now.isoformat()
+        return entry
+
+    def record(self, ads_job_code, posted_date: datetime, item: Optional[Dict[str, Any]] = None,
+               duplicate_of: Optional[Tuple[str, str]] = None) -> None:
+        """Remember an ad; 'item' is None when the ad was too old to be exported or, with 'duplicate_of'
+        (its ``dedup.dedup_key``), when the same job was already exported from another jobs board
+        """
+        entry = {
+            'posted_date': posted_date.isoformat(),
+            'last_seen': self.now.isoformat(),
+            'item': dict(item) if item is not None else None,
+        }
+        if duplicate_of is not None:
+            entry['duplicate_of'] = list(duplicate_of)
+        self.entries[str(ads_job_code)] = entry
+
+    def is_known(self, entry: Dict[str, Any], seen_ads: Optional[SeenAds] = None, source: Optional[str] = None) -> bool:
+        """Whether a stored ad of the spider 'source' needs no request in this run: always, unless it was skipped
+        as a duplicate and its job has not been exported by another jobs board in this run (yet), e.g. that ad was removed
+        """
+        duplicate_of = entry.get('duplicate_of')
+        return duplicate_of is None or (seen_ads is not None and seen_ads.is_duplicate(tuple(duplicate_of), source))
+
+    def is_recent(self, entry: Dict[str, Any], days: int = POSTING_WINDOW_DAYS) -> bool:
+        """Same check as each spider's 'is_posted_in_the_past_five_days', using the stored posted date"""
+        posted_date = datetime.fromisoformat(entry['posted_date'])
+        return (current_time(tz=posted_date.tzinfo) - posted_date).days <= days
+
+
+class CrawlStateExtension:
+    """Attach a ``CrawlState`` to each spider as ``spider.crawl_state`` and save it when the spider closes
+
+    Enable it in the settings with:
+        'EXTENSIONS': {'crawl_state.CrawlStateExtension': 500},
+        'CRAWL_STATE_ENABLED': True,
+        'CRAWL_STATE_DIR': DATA_FOLDER / 'crawl_state',
+    """
+    def __init__(self, state_dir: PurePath, max_age_days: int):
+        self.state_dir = Path(state_dir)
+        self.max_age_days = max_age_days
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('CRAWL_STATE_ENABLED'):
+            raise NotConfigured
+
+        ext = cls(
+            state_dir=crawler.settings.get('CRAWL_STATE_DIR', CRAWL_STATE_FOLDER),
+            max_age_days=crawler.settings.getint('CRAWL_STATE_MAX_AGE_DAYS', CRAWL_STATE_MAX_AGE_DAYS),
+        )
+        crawler.signals.connect(ext.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(ext.spider_closed, signal=signals.spider_closed)
+        return ext
+
+    def spider_opened(self, spider):
+        spider.crawl_state = CrawlState(self.state_dir / f'{spider.name}.json',
+                                        max_age_days=self.max_age_days).load()
+        spider.logger.info(f'Loaded {len(spider.crawl_state.entries)} known ads from {spider.crawl_state.file}')
+
+    def spider_closed(self, spider, reason):
+        if spider.crawl_state is not None:
+            spider.crawl_state.save()
@@ -0,0 +1,108 @@
+import logging
+import sys
+import time
+from typing import Callable, Optional, Sequence, Type
+
+from scrapy import Spider
+from scrapy.crawler import CrawlerProcess
+from scrapy.utils.reactor import install_reactor
+from twisted.internet import task
+
+from dedup import SEEN_ADS
+from instrumentation import RUN_REPORT
+from job_store import COMPLETED_CLOSE_REASONS, JOB_STORE
+
+logger = logging.getLogger(__name__)
+
+
+class SpiderSchedule:
+    """Crawl one spider every 'interval' seconds in a running ``CrawlerProcess``
+
+    A run starts when the previous one is finished (runs of the same spider never overlap):
+    a run longer than the interval is followed right away by the next one.
+    Before each run, the jobs the spider exported in its previous run are forgotten by the cross-source
+    deduplication (``SEEN_ADS``) and a new run of the spider starts in ``JOB_STORE``;
+    the jobs of the other spiders are kept. A run that fails or is not completed (see
+    ``job_store.COMPLETED_CLOSE_REASONS``) is not counted in 'completed' and 'after_run' is not called:
+    the jobs of the previous completed run of the spider are still the exported ones.
+
+    Parameters
+    ----------
+    process : CrawlerProcess
+        The process crawling all the spiders
+    spidercls : Type[Spider]
+        The spider to crawl
+    interval : float
+        Seconds between the start of two runs
+    after_run : Optional[Callable[[Type[Spider]], None]], optional
+        Called (in the reactor thread) after each completed run, e.g. to export the csv file, by default None
+    """
+    def __init__(self, process: CrawlerProcess, spidercls: Type[Spider], interval: float,
+                 after_run: Optional[Callable[[Type[Spider]], None]] = None):
+        self.process = process
+        self.spidercls = spidercls
+        self.interval = interval
+        self.after_run = after_run
+        self.runs = 0
+        self.completed = 0
+        self.loop: Optional[task.LoopingCall] = None
+
+    def start(self) -> None:
+        # Created once the reactor of the process is installed (the loop is bound to the installed reactor)
+        self.loop = task.LoopingCall(self.run)
+        self.loop.start(self.interval, now=True).addErrback(self._log_failure, 'Schedule stopped')
+
+    def stop(self) -> None:
+        if self.loop is not None and self.loop.running:
+            self.loop.stop()
+
+    def run(self):
+        self.runs += 1
+        logger.info(f'Run {self.runs} of {self.spidercls.name} (every {self.interval / 60:g} minutes)')
+        SEEN_ADS.forget(self.spidercls.name)
+        JOB_STORE.start_run(self.spidercls.name)
+        start = time.perf_counter()
+
+        crawler = self.process.create_crawler(self.spidercls)
+        deferred = self.process.crawl(crawler)
+        deferred.addCallbacks(self._finished, self._log_failure, callbackArgs=(crawler, start),
+                              errbackArgs=('Crawl failed',))
+        # Errors of 'after_run' must not stop the schedule
+        deferred.addErrback(self._log_failure, 'After run failed')
+        return deferred
+
+    def _finished(self, _, crawler, start: float) -> None:
+        RUN_REPORT.add('stages', f'crawl.{self.spidercls.name}', time.perf_counter() - start)
+        reason = crawler.stats.get_value('finish_reason')
+        if reason not in COMPLETED_CLOSE_REASONS:
+            logger.warning(f'Run {self.runs} of {self.spidercls.name} not completed ({reason})')
+            return
+        self.completed += 1
+        if self.after_run is not None:
+            self.after_run(self.spidercls)
+
+    def _log_failure(self, failure, message: str) -> None:
+        logger.error(f'{message} ({self.spidercls.name}): {failure.getErrorMessage()}',
+                     exc_info=(failure.type, failure.value, failure.getTracebackObject()))
+
+
+def run_daemon(process: CrawlerProcess, schedules: Sequence[SpiderSchedule]) -> None:
+    """Crawl each spider on its own schedule until the process is stopped (Ctrl-C / SIGTERM)
+
+    The process, its Twisted reactor and the module-level caches (``SEEN_ADS``, ``JOB_STORE``,
+    the redirect cache, the conditional GET stores) stay alive between the runs.
+    """
+    # Recent Scrapy versions only install the reactor of the 'TWISTED_REACTOR' setting when the crawl starts,
+    # importing 'twisted.internet.reactor' first would install the default one
+    reactor_path = process.settings.get('TWISTED_REACTOR')
+    if reactor_path and 'twisted.internet.reactor' not in sys.modules:
+        install_reactor(reactor_path, process.settings.get('ASYNCIO_EVENT_LOOP'))
+
+    for schedule in schedules:
+        schedule.start()
+    try:
+        # The reactor keeps running after the crawls; the signal handlers of the process stop it
+        process.start(stop_after_crawl=False)
+    finally:
+        for schedule in schedules:
+            schedule.stop()
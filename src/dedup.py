@@ -0,0 +1,68 @@
+import re
+from typing import Dict, Optional, Tuple
+
+# The 'school' field is either the school name or '=hyperlink("url","school name")'
+HYPERLINK_PATTERN = re.compile(r'^=hyperlink\(".*?","(.*)"\)$', re.IGNORECASE)
+HYPERLINK_PARTS_PATTERN = re.compile(r'^=hyperlink\("(.*?)","(.*)"\)$', re.IGNORECASE)
+NON_ALPHANUMERIC_PATTERN = re.compile(r'[\W_]+')
+LEADING_THE_PATTERN = re.compile(r'^the\s+')
+
+
+def school_name(school: str) -> str:
+    """Return the school name of a 'school' field, with or without the embedded hyperlink"""
+    match = HYPERLINK_PATTERN.match(school or '')
+    return match.group(1) if match else (school or '')
+
+
+def hyperlink_parts(cell: str) -> Tuple[Optional[str], str]:
+    """(url, label) of a '=hyperlink("url","label")' cell, (None, cell) for a cell without hyperlink"""
+    match = HYPERLINK_PARTS_PATTERN.match(cell or '')
+    return (match.group(1), match.group(2)) if match else (None, cell or '')
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase and collapse every run of punctuation/whitespace into one space"""
+    return NON_ALPHANUMERIC_PATTERN.sub(' ', (text or '').lower()).strip()
+
+
+def dedup_key(ads_title: str, school: str) -> Tuple[str, str]:
+    """Key of a job regardless of the jobs board it is posted on: (normalized title, normalized school name)
+
+    e.g. 'Assistant Professor - Organic Chemistry' at 'The University of Arizona' and
+    'Assistant Professor, Organic Chemistry' at '=hyperlink("...","University of Arizona")' give the same key
+
+    Unlike the old 'remove_duplicate' of jobs.csv (exact title + canonical application url + school name), the
+    application url is not part of the key: the spiders check the key before requesting the redirect to the
+    application url, and the jobs boards often link different application pages for the same job. Every pair of
+    ads merged by the old key still has one key; two ads of the same title at the same school are one job.
+    """
+    return normalize_text(ads_title), LEADING_THE_PATTERN.sub('', normalize_text(school_name(school)))
+
+
+class SeenAds:
+    """Keys of the jobs already exported by any spider of the process, with the spider that exported each of them"""
+    def __init__(self):
+        self.keys: Dict[Tuple[str, str], Optional[str]] = {}
+
+    def __contains__(self, key: Tuple[str, str]) -> bool:
+        return key in self.keys
+
+    def is_duplicate(self, key: Tuple[str, str], source: Optional[str] = None) -> bool:
+        """Whether the job was already exported by another spider than 'source'
+        (two ads of the same jobs board with the same title and school are two jobs)
+        """
+        return key in self.keys and self.keys[key] != source
+
+    def add(self, key: Tuple[str, str], source: Optional[str] = None) -> None:
+        self.keys.setdefault(key, source)
+
+    def forget(self, source: str) -> None:
+        """Remove the keys exported by the spider 'source', e.g. before it crawls again in the same process"""
+        self.keys = {key: owner for key, owner in self.keys.items() if owner != source}
+
+    def clear(self) -> None:
+        self.keys.clear()
+
+
+# Shared by all the crawlers of one 'CrawlerProcess'
+SEEN_ADS = SeenAds()
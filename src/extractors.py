@@ -0,0 +1,103 @@
+import re
+from typing import Optional
+
+# Compiled once, shared by all the spiders
+HTML_TAG_PATTERN = re.compile(r'<[^<]+?>')
+RANK_PATTERN = re.compile(r'Assistant\b|Associate\b|Full\s')
+# Matched against the lowercased description, which is several times faster than re.IGNORECASE
+SPECIALIZATION_PATTERN = re.compile(r'org\w*|anal\w*|inorg\w*|bio(?!chemical\b)\w+|physic\w*|polymer\w*')
+TENURE_PATTERN = re.compile(r'\S*tenure\S*', re.IGNORECASE)
+# Patterns of the ad titles of the listings, as the spiders matched them inline
+TITLE_RANK_PATTERN = re.compile(r'assist|assoc', re.IGNORECASE)
+# The Chronicle titles also have 'Open Rank' positions
+TITLE_OPEN_RANK_PATTERN = re.compile(r'assist|assoc|open\W+rank', re.IGNORECASE)
+TITLE_SPECIALIZATION_PATTERN = re.compile(r'org\w*|anal\w*|inorg\w*|bio\w*|physic\w*|polymer\w*', re.IGNORECASE)
+
+RANK_ABBREVIATIONS = {'assistant': 'asst', 'associate': 'assoc', 'full': 'full'}
+
+# Characters of the job description kept in the items (enough for 'near_duplicates', which compares the first words)
+DESCRIPTION_MAX_CHARS = 2000
+
+
+def strip_html(html: str) -> str:
+    """Replace every html tag with a space"""
+    return HTML_TAG_PATTERN.sub(' ', html or '')
+
+
+def selection_text(selection, max_chars: Optional[int] = None) -> str:
+    r"""Text of the elements of a parsel selection (and of their descendants), whitespace collapsed into single spaces
+
+    Same text as ``' '.join(word.strip() for word in selection.css('*::text').getall() if re.search(r'\S', word))``
+    (apart from the runs of whitespace inside a text node), without one selector, string and regex call per text node:
+    the lxml subtrees are walked directly.
+
+    Parameters
+    ----------
+    selection : Selector or SelectorList
+        e.g. ``response.css('#jobDesc')``
+    max_chars : Optional[int], optional
+        Stop after this many characters (e.g. only the beginning of the description is needed), by default None
+
+    Returns
+    -------
+    str
+        The text, '' if nothing is selected
+    """
+    # A SelectorList is a list of Selector; text / attribute selectors (string roots) have no subtree
+    selectors = selection if isinstance(selection, list) else [selection]
+    roots = [selector.root for selector in selectors if hasattr(selector.root, 'itertext')]
+    if max_chars is None:
+        return ' '.join(' '.join(text for root in roots for text in root.itertext()).split())
+
+    words = []
+    size = 0
+    for root in roots:
+        for text in root.itertext():
+            for word in text.split():
+                words.append(word)
+                size += len(word) + 1
+                if size > max_chars:
+                    return ' '.join(words)[:max_chars]
+    return ' '.join(words)
+
+
+def extract_rank(description: str) -> str:
+    """Ranks mentioned in a job description, abbreviated and in order of first appearance
+
+    e.g. 'Assistant or Associate Professor ... Assistant Professor' -> 'asst/assoc'
+    """
+    ranks = dict.fromkeys(RANK_ABBREVIATIONS[word.strip().lower()]
+                          for word in RANK_PATTERN.findall(description or ''))
+    return '/'.join(ranks)
+
+
+def extract_specialization(description: str) -> str:
+    """Fields of chemistry mentioned in a job description, lowercased and in order of first appearance
+
+    e.g. 'Organic or Bioorganic chemistry, organic synthesis' -> 'organic, bioorganic'
+    """
+    specializations = dict.fromkeys(SPECIALIZATION_PATTERN.findall((description or '').lower()))
+    return ', '.join(specializations)
+
+
+def extract_title_rank(title: str, open_rank: bool = False) -> str:
+    """Ranks in an ad title, abbreviated, in order and with repeats (e.g. 'Assistant/Associate Professor' -> 'asst/assoc')
+
+    With 'open_rank', 'Open Rank' is a rank too (e.g. 'open rank', as written in the title)
+    """
+    pattern = TITLE_OPEN_RANK_PATTERN if open_rank else TITLE_RANK_PATTERN
+    return '/'.join(word.lower().replace('assist', 'asst') for word in pattern.findall(title or ''))
+
+
+def extract_title_specialization(title: str) -> str:
+    """Fields of chemistry in an ad title, as written, in order and with repeats
+
+    e.g. 'Assistant Professor - Organic or Bioorganic Chemistry' -> 'Organic, Bioorganic'
+    """
+    return ', '.join(TITLE_SPECIALIZATION_PATTERN.findall(title or ''))
+
+
+def extract_tenure(description: str):
+    """First word mentioning tenure in a job description (e.g. 'tenure-track'), None if there is none"""
+    tenure_type = TENURE_PATTERN.search(description or '')
+    return tenure_type[0] if tenure_type else None
@@ -1,16 +1,21 @@
 # quote_spiders.py
-import re
-from datetime import datetime, timezone
+import argparse
+from datetime import datetime
 from pathlib import Path
+from typing import Any, Dict
 
 import scrapy
-# useful for handling different item types with a single interface
-from itemadapter import ItemAdapter
 from scrapy.crawler import CrawlerProcess
-from scrapy.exceptions import DropItem
-from scrapy.exporters import CsvItemExporter
 
+from dedup import dedup_key
+from extractors import (DESCRIPTION_MAX_CHARS, extract_rank, extract_tenure, extract_title_rank,
+                        extract_title_specialization, selection_text)
+from http_archive import add_archive_arguments, archive_output_file, archive_settings
 from items import JobItem
+from job_store import JOB_STORE
+from json_extract import iter_json_array
+from pipelines import FIELDS_TO_EXPORT
+from posting_window import POSTING_WINDOW_DAYS, current_time
 
 
 CURRENT_FILEPATH = Path(__file__).resolve().parent
@@ -18,79 +23,26 @@ DATA_FOLDER = CURRENT_FILEPATH.parent / 'data'
 DATA_FOLDER.mkdir(exist_ok=True)
 THIS_SPIDER_RESULT_FILE = DATA_FOLDER / 'higheredjobs_jobs.csv'
 
-JOB_TITLE_IGNORE_KEYWORDS = ['post-doc', 'postdoc', 'post doc', 'scientist']
 
-FIELDS_TO_EXPORT = ['ads_title', 'posted_date', 'priority_date', 'category',
-                    'school', 'department', 'specialization',
-                    'rank', 'city', 'state', 'canada',
-                    'current_status', 'comments1', 'comments2',
-                    'ads_source', 'ads_job_code'
-                    ]
+def ads_details(response) -> Dict[str, Any]:
+    """ The fields of a details page, as plain data (it runs in a worker process with 'parse_pool') """
+    # online_application_title_field = response.xpath(
+    #     './/*[@id="jobApplyInfo"]//*[contains(@class, "field-label")][contains(normalize-space(text()), "Online App. Form")]'
+    # )
+    # online_application_url = online_application_title_field.xpath('./following-sibling::div[1]/a/@data-orig-href').get()
+    online_application_url = response.css('#js-applyurl').attrib.get('data-orig-href')
 
+    # job_description = ' '.join(word.strip()
+    #                     for word in (response.css('#jobDesc *::text').getall())
+    #                     if re.search(r'\S', word))
+    job_description = selection_text(response.css('#jobDesc'))
+    # print(f'{job_description=}')
 
-class CsvWriteLatestToOldest(object):
-    """ Write to CSV file in latest to oldest order of 'posted_date' """
-    def __init__(self, csv_export_file):
-        self.csv_export_file = csv_export_file
-
-    @classmethod
-    def from_crawler(cls, crawler):
-        """This is used to passed in parameter from setting
-        Ref: https://docs.scrapy.org/en/latest/topics/item-pipeline.html?highlight=from_crawler#write-items-to-mongodb
-        """
-        return cls(
-            csv_export_file=crawler.settings.get('CSV_EXPORT_FILE', THIS_SPIDER_RESULT_FILE),
-        )
-
-    def open_spider(self, spider):
-        self.list_items = []
-        self.file = open(self.csv_export_file, 'ab')
-
-        # Creating a FanItemExporter object and initiating export
-        self.exporter = CsvItemExporter(self.file, fields_to_export=FIELDS_TO_EXPORT)
-        self.exporter.start_exporting()
-
-    def close_spider(self, spider):
-        ordered_list = sorted(self.list_items,
-                              key=lambda i: i['posted_date'],
-                              reverse=True)
-
-        for i in ordered_list:
-            item = {key: i.get(key) or '' for key in FIELDS_TO_EXPORT}
-            self.exporter.export_item(item)
-
-        # Ending the export to file
-        self.exporter.finish_exporting()
-        self.file.close()
-
-    def process_item(self, item, spider):
-        self.list_items.append(item)
-        return item
-
-
-class RemoveIgnoredKeywordsPipeline:
-    """ Remove jobs ads with 'ads_title' containing one of the words in the IGNORED_KEYWORDS """
-    def process_item(self, item, spider):
-        adapter = ItemAdapter(item)
-        for keyword in JOB_TITLE_IGNORE_KEYWORDS:
-            if re.search(keyword, adapter['ads_title'], re.IGNORECASE):
-                raise DropItem(f"'{keyword}' item found: {item!r}")
-        return item
-
-
-class DeDuplicatesPipeline:
-    """ Remove duplication based on the ID of each ads for the specific jobs board """
-
-    def __init__(self):
-        self.ids_seen = set()
-
-    def process_item(self, item, spider):
-        adapter = ItemAdapter(item)
-        if adapter.get('ads_job_code'):
-            if adapter['ads_job_code'] in self.ids_seen:
-                raise DropItem(f"Duplicate item found: {item!r}")
-            self.ids_seen.add(adapter['ads_job_code'])
-        return item
+    return {'online_application_url': online_application_url,
+            # Get the ranking (using the job description)
+            'rank': extract_rank(job_description),
+            'comments1': extract_tenure(job_description),
+            'description': job_description[:DESCRIPTION_MAX_CHARS]}
 
 
 class JobsHigheredjobsSpider(scrapy.Spider):
@@ -99,20 +51,47 @@ class JobsHigheredjobsSpider(scrapy.Spider):
     start_urls = ['https://www.higheredjobs.com/faculty/search.cfm?JobCat=101&StartRow=-1&SortBy=1&NumJobs=25&filterby=&filterptype=1&filtercountry=38&filtercountry=226&CatType=']
     base_url = 'https://www.higheredjobs.com/faculty/'
     api_url = 'https://www.higheredjobs.com/assets/api/searchResults.cfc'
+    # Set by 'crawl_state.CrawlStateExtension' when 'CRAWL_STATE_ENABLED'
+    crawl_state = None
+    # Set by 'pipelines.CrossSourceDeDuplicatesPipeline' when enabled
+    seen_ads = None
+    # Set by 'parse_pool.ParsePoolExtension' when 'PARSE_POOL_WORKERS' > 0
+    parse_pool = None
+
+    # Results of the search API per request, sorted from the latest posted
+    api_page_size = 100
+    # Hard limit of search API pages per crawl, in case the API keeps returning full pages of fresh ads
+    max_api_pages = 20
 
     def start_requests(self):
-        form_data = {'method':'getResults','JobCatCodeList':'101','sortBy':'1','AllCatsReturned':'true'}
+        # The 'JobCode's of the search API pages already parsed in this crawl
+        self.api_job_codes = set()
+        return [self.api_request(start_row=1)]
+
+    def api_request(self, start_row: int) -> scrapy.FormRequest:
+        """ Request one page of the search API ('sortBy' 1: latest posted first), starting at the 'start_row' job """
+        form_data = {'method':'getResults','JobCatCodeList':'101','sortBy':'1','AllCatsReturned':'true',
+                     'StartRow': str(start_row), 'NumJobs': str(self.api_page_size)}
         headers = {'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0.0.0 Safari/537.36', }
-        return [scrapy.FormRequest(url=self.api_url, formdata=form_data, headers=headers, callback=self.parse)]
+        return scrapy.FormRequest(url=self.api_url, formdata=form_data, headers=headers, callback=self.parse,
+                                  cb_kwargs={'start_row': start_row})
 
-    def parse(self, response):
-        search_response = response.json()
-        jobs = search_response['data']['ARYSEARCHJOBS']
+    def parse(self, response, start_row: int = 1):
+        # search_response = response.json()
+        # jobs = search_response['data']['ARYSEARCHJOBS']
         # print(search_response)
+        # Decode the jobs one by one, the ones after the first ads older than the posting window are never decoded
+        jobs = iter_json_array(response.text, 'ARYSEARCHJOBS')
     
         # jobs = response.css('.row.record')
         is_posted_in_the_past_five_days = True
+        jobs_count = 0
+        new_jobs_count = 0
         for job in jobs:
+            jobs_count += 1
+            if job.get('JobCode') not in self.api_job_codes:
+                self.api_job_codes.add(job.get('JobCode'))
+                new_jobs_count += 1
             '''Example:
             {'InstType': 1, 'isAAEmail': False, 'RemoteType': 1, 'isMilitaryUpgrade': True, 
             'Department': '', 'Priority': False, 'InstCity': 'Tucson', 'isPoolPosition': False, 
@@ -123,7 +102,14 @@ class JobsHigheredjobsSpider(scrapy.Spider):
 
             '''
             posted_date = datetime.fromisoformat(job.get('DatePosted'))
-            is_posted_in_the_past_five_days = ((datetime.now(tz=timezone.utc) - posted_date).days <= 5)
+            is_posted_in_the_past_five_days = ((current_time() - posted_date).days <= POSTING_WINDOW_DAYS)
+            if not is_posted_in_the_past_five_days:
+                # Priority (featured) ads can be listed first whatever their posted date
+                if job.get('Priority'):
+                    is_posted_in_the_past_five_days = True
+                    continue
+                # Sorted from the latest posted: all the next ones are older
+                break
 
             # title = job.xpath('.//a/text()').get().strip()
             # details_url = response.urljoin(job.xpath('.//a/@href').get())
@@ -152,16 +138,14 @@ class JobsHigheredjobsSpider(scrapy.Spider):
             ads_source = f'=hyperlink("{details_url}","HigherEdJobs")'
 
             # Get the ranking
-            rank = re.findall(r'assist|assoc', title, re.IGNORECASE)
-            rank = '/'.join(word.lower().replace('assist', 'asst')
-                            for word in rank)
+            rank = extract_title_rank(title)
 
             # Get specialization
-            specialization = re.findall(r'org\w*|anal\w*|inorg\w*|bio\w*|physic\w*|polymer\w*', title, re.IGNORECASE)
-            specialization = ', '.join(specialization)
+            specialization = extract_title_specialization(title)
 
             cb_kwargs = {
                 'posted_date': posted_date.strftime('%m/%d/%Y'),
+                'posted_at': posted_date.isoformat(),
                 'school': school,
                 'department': department,
                 'city': city,
@@ -173,11 +157,38 @@ class JobsHigheredjobsSpider(scrapy.Spider):
                 'specialization': specialization,
             }
 
+            # Reuse the ad already processed in a previous run instead of fetching its details again
+            if self.crawl_state is not None:
+                known_ad = self.crawl_state.lookup(ads_job_code)
+                if known_ad is not None and self.crawl_state.is_known(known_ad, self.seen_ads, self.name):
+                    if known_ad['item']:
+                        yield JobItem(known_ad['item'])
+                    continue
+
+            # Skip the details page if the same job was already exported from another jobs board
+            key = dedup_key(title, school)
+            if self.seen_ads is not None and self.seen_ads.is_duplicate(key, self.name):
+                self.logger.info(f'Duplicate of a job found on another jobs board: {title}')
+                # Remembered so its details page is not fetched again while the other jobs board still has it
+                if self.crawl_state is not None:
+                    self.crawl_state.record(ads_job_code, posted_date, duplicate_of=key)
+                continue
+
             # Pass the callback function arguments with 'cb_kwargs': https://docs.scrapy.org/en/latest/topics/request-response.html?highlight=cb_kwargs#scrapy.http.Request.cb_kwargs
-            if is_posted_in_the_past_five_days:
-                yield scrapy.Request(url=details_url,
-                                     cb_kwargs=cb_kwargs,
-                                     callback=self.parse_ads)
+            yield scrapy.Request(url=details_url,
+                                 cb_kwargs=cb_kwargs,
+                                 callback=self.parse_ads,
+                                 meta={'posted_date': posted_date})
+
+        # Next page of the API only if this one was full and had no ads older than the window
+        # (a larger page means the API ignored the paging and returned all the jobs, a page without new
+        # 'JobCode' that it ignored 'StartRow' and returned the same page again)
+        page = (start_row - 1) // self.api_page_size + 1
+        if is_posted_in_the_past_five_days and jobs_count == self.api_page_size and new_jobs_count:
+            if page < self.max_api_pages:
+                yield self.api_request(start_row=start_row + self.api_page_size)
+            else:
+                self.logger.warning(f'Stopped at the {self.max_api_pages} pages limit of the search API')
 
         # # Find next page url if exists:
         # next_page_partial_url = response.xpath('.//a[.//img[not(contains(@class, "disabled")) and contains(@src, "right.gif")]]/@href').get()
@@ -189,39 +200,41 @@ class JobsHigheredjobsSpider(scrapy.Spider):
         #     yield scrapy.Request(url=next_page_url, callback=self.parse)
 
     def parse_ads(self, response, **cb_kwargs):
-        # online_application_title_field = response.xpath(
-        #     './/*[@id="jobApplyInfo"]//*[contains(@class, "field-label")][contains(normalize-space(text()), "Online App. Form")]'
-        # )
-        # online_application_url = online_application_title_field.xpath('./following-sibling::div[1]/a/@data-orig-href').get()
-        online_application_url = response.css('#js-applyurl').attrib.get('data-orig-href')
-
+        # With 'parse_pool.ParsePoolExtension', the page is parsed in a worker process (the output is asynchronous)
+        if self.parse_pool is not None:
+            return self.parse_ads_in_pool(response, cb_kwargs)
+        return self.ads_outputs(response, ads_details(response), cb_kwargs)
+
+    async def parse_ads_in_pool(self, response, cb_kwargs: dict):
+        details = await self.parse_pool.parse(ads_details, response)
+        for output in self.ads_outputs(response, details, cb_kwargs):
+            yield output
+
+    def ads_outputs(self, response, details: Dict[str, Any], cb_kwargs: dict):
+        """ The item of an ad from the fields of its details page """
         # Update the school field to embed the link to the online app if exists (following Chemjobber List format)
-        application_url = online_application_url or response.url
+        application_url = details['online_application_url'] or response.url
         cb_kwargs['school'] = f'=hyperlink("{application_url}","{cb_kwargs["school"]}")'
         # print(f'{cb_kwargs=}')
 
-        job_description = ' '.join(word.strip()
-                            for word in (response.css('#jobDesc *::text').getall())
-                            if re.search(r'\S', word))
-        # print(f'{job_description=}')
-
-        # Get the ranking (using the job description)
-        rank = set(re.findall(r'Assistant\b|Associate\b|Full\s', job_description))
-        rank_text = '/'.join(word.lower().replace('assistant', 'asst').replace('associate', 'assoc')
-                             for word in rank)
-        # print(f'{rank_text=}')
-        cb_kwargs['rank'] = rank_text or cb_kwargs['rank']
-
-        tenure_type = re.search(r'\S*tenure\S*', job_description, re.IGNORECASE)
-        # print(f'{tenure_type=}')
-        comments1 = tenure_type[0] if tenure_type else None
-
-        cb_kwargs['comments1'] = comments1
+        cb_kwargs['rank'] = details['rank'] or cb_kwargs['rank']
+        cb_kwargs['comments1'] = details['comments1']
+        cb_kwargs['description'] = details['description']
 
+        if self.crawl_state is not None:
+            self.crawl_state.record(cb_kwargs['ads_job_code'], response.meta['posted_date'], cb_kwargs)
         yield JobItem(cb_kwargs)
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=f'Crawl {JobsHigheredjobsSpider.name} into {THIS_SPIDER_RESULT_FILE}')
+    add_archive_arguments(parser)
+    args = parser.parse_args()
+    if args.http_archive:
+        # A recording / replay writes its own jobs history and csv file, next to the archives
+        THIS_SPIDER_RESULT_FILE = archive_output_file(args.http_archive, THIS_SPIDER_RESULT_FILE)
+        JOB_STORE.move_to(archive_output_file(args.http_archive, JOB_STORE.file))
+
     # Remove the result file if exists
     THIS_SPIDER_RESULT_FILE.unlink(missing_ok=True)
 
@@ -233,11 +246,10 @@ if __name__ == '__main__':
         #   'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
         #   'Accept-Language': 'en'
         # },
-        'CSV_EXPORT_FILE': THIS_SPIDER_RESULT_FILE,
         'ITEM_PIPELINES': {
-            '__main__.RemoveIgnoredKeywordsPipeline': 100,
-            '__main__.DeDuplicatesPipeline': 800,
-            '__main__.CsvWriteLatestToOldest': 900,
+            'pipelines.RemoveIgnoredKeywordsPipeline': 100,
+            'pipelines.DeDuplicatesPipeline': 800,
+            'pipelines.JobStorePipeline': 900,
         },
         # 'FEEDS': {
         #     Path(THIS_SPIDER_RESULT_FILE): {
@@ -251,6 +263,13 @@ if __name__ == '__main__':
         # 'ROBOTSTXT_OBEY': False,
     }
 
+    # Record the responses into (or replay them from) the local HTTP archive
+    settings.update(archive_settings(args.http_archive))
+
     process = CrawlerProcess(settings=settings)
     process.crawl(JobsHigheredjobsSpider)
     process.start()
+
+    # Export the jobs of this run from the jobs history, from latest to oldest
+    JOB_STORE.export_csv(file=THIS_SPIDER_RESULT_FILE, fieldnames=FIELDS_TO_EXPORT, source=JobsHigheredjobsSpider.name)
+    JOB_STORE.close()
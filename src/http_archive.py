@@ -0,0 +1,173 @@
+import pickle
+import zipfile
+from argparse import ArgumentParser
+from datetime import datetime, timedelta, timezone
+from pathlib import Path, PurePath
+from typing import Any, Dict, List, Optional, Tuple
+
+from scrapy.http import Headers, Request
+from scrapy.responsetypes import responsetypes
+
+import posting_window
+
+CURRENT_FILEPATH = Path(__file__).resolve().parent
+DATA_FOLDER = CURRENT_FILEPATH.parent / 'data'
+HTTP_ARCHIVE_FOLDER = DATA_FOLDER / 'http_archive'
+
+RECORD = 'record'
+REPLAY = 'replay'
+
+# Name of the archive member holding the time of the recording
+RECORDED_AT_MEMBER = '__recorded_at__'
+
+
+class ZipArchiveCacheStorage:
+    """Scrapy HTTP cache storage keeping all the responses of one spider in a single compressed zip file
+
+    Each response (listing, detail, JSON API, every redirect hop...) is one deflated member named after
+    the request fingerprint. It is used through 'HTTPCACHE_STORAGE' by the settings of ``archive_settings``:
+    the 'record' mode writes a new archive, the 'replay' mode only reads it (a missing response is ignored,
+    nothing is downloaded) and freezes the posting window at the time of the recording.
+
+    The posting window clock is one for the whole process (see ``posting_window.freeze_now``): it is frozen
+    at the recording time of the first archive replayed and only goes back to the real time when the last
+    replayed archive of the process is closed, so all the spiders of 'list_jobs.py --replay' see the same time.
+    """
+    # Archives replayed by the spiders of the process
+    open_replays = 0
+
+    def __init__(self, settings):
+        self.archive_dir = Path(settings.get('HTTP_ARCHIVE_DIR', HTTP_ARCHIVE_FOLDER))
+        self.mode = settings.get('HTTP_ARCHIVE_MODE', REPLAY)
+        self.archive: Optional[zipfile.ZipFile] = None
+
+    def open_spider(self, spider):
+        self.archive_dir.mkdir(parents=True, exist_ok=True)
+        archive_file = self.archive_dir / f'{spider.name}.zip'
+        self.fingerprinter = spider.crawler.request_fingerprinter
+
+        if self.mode == RECORD:
+            self.archive = zipfile.ZipFile(archive_file, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=9)
+            self.archive.writestr(RECORDED_AT_MEMBER, datetime.now(tz=timezone.utc).isoformat())
+        else:
+            self.archive = zipfile.ZipFile(archive_file, 'r')
+            self.members = set(self.archive.namelist())
+            recorded_at = datetime.fromisoformat(self.archive.read(RECORDED_AT_MEMBER).decode())
+            if ZipArchiveCacheStorage.open_replays == 0:
+                posting_window.freeze_now(recorded_at)
+            elif abs(posting_window.current_time() - recorded_at) > timedelta(days=1):
+                spider.logger.warning(f'{archive_file} was recorded at {recorded_at.isoformat()}, the posting window '
+                                      f'is checked at {posting_window.current_time().isoformat()} (first replayed archive)')
+            ZipArchiveCacheStorage.open_replays += 1
+        spider.logger.info(f'HTTP archive ({self.mode}): {archive_file}')
+
+    def close_spider(self, spider):
+        self.archive.close()
+        if self.mode == REPLAY:
+            ZipArchiveCacheStorage.open_replays -= 1
+            if ZipArchiveCacheStorage.open_replays == 0:
+                posting_window.freeze_now(None)
+
+    def retrieve_response(self, spider, request):
+        if self.mode == RECORD:
+            return None
+
+        key = self.fingerprinter.fingerprint(request).hex()
+        if key not in self.members:
+            return None
+
+        return response_from_record(pickle.loads(self.archive.read(key)))
+
+    def store_response(self, spider, request, response):
+        if self.mode != RECORD:
+            return
+
+        key = self.fingerprinter.fingerprint(request).hex()
+        data = {
+            'status': response.status,
+            'url': response.url,
+            'headers': dict(response.headers),
+            'body': response.body,
+            # Enough of the request to call the spider callback again without a crawler (see 'read_archive')
+            'request_url': request.url,
+            'callback': getattr(request.callback, '__name__', None),
+            'cb_kwargs': request.cb_kwargs,
+        }
+        self.archive.writestr(key, pickle.dumps(data, protocol=4))
+
+
+def response_from_record(data: Dict[str, Any], request: Optional[Request] = None):
+    """Rebuild the scrapy response of an archived record"""
+    headers = Headers(data['headers'])
+    respcls = responsetypes.from_args(headers=headers, url=data['url'], body=data['body'])
+    return respcls(url=data['url'], headers=headers, status=data['status'], body=data['body'], request=request)
+
+
+def read_archive(archive_file: PurePath) -> Tuple[datetime, List[Dict[str, Any]]]:
+    """Read all the records of an archive, e.g. to feed them to the spider callbacks without a crawler
+
+    Returns
+    -------
+    Tuple[datetime, List[Dict[str, Any]]]
+        The time of the recording and the records ('status', 'url', 'headers', 'body',
+        'request_url', 'callback' and 'cb_kwargs'), in the order they were recorded
+    """
+    with zipfile.ZipFile(archive_file, 'r') as archive:
+        recorded_at = datetime.fromisoformat(archive.read(RECORDED_AT_MEMBER).decode())
+        records = [pickle.loads(archive.read(name))
+                   for name in archive.namelist() if name != RECORDED_AT_MEMBER]
+    return recorded_at, records
+
+
+def archive_settings(mode: Optional[str], archive_dir: PurePath = HTTP_ARCHIVE_FOLDER) -> Dict[str, Any]:
+    """Scrapy settings to record every response into the archive, or to replay the archive without network
+
+    Parameters
+    ----------
+    mode : Optional[str]
+        'record', 'replay' or None (no archive, empty settings)
+    archive_dir : PurePath, optional
+        Folder of the archives (one zip file per spider), by default 'data/http_archive'
+
+    Returns
+    -------
+    Dict[str, Any]
+        The settings to add to the crawler process settings
+    """
+    if not mode:
+        return {}
+
+    return {
+        'HTTPCACHE_ENABLED': True,
+        'HTTPCACHE_STORAGE': 'http_archive.ZipArchiveCacheStorage',
+        # Cache every response (redirects and errors included) and never expire them
+        'HTTPCACHE_POLICY': 'scrapy.extensions.httpcache.DummyPolicy',
+        'HTTPCACHE_EXPIRATION_SECS': 0,
+        'HTTPCACHE_IGNORE_HTTP_CODES': [],
+        # Replay: drop the requests missing from the archive instead of downloading them
+        'HTTPCACHE_IGNORE_MISSING': mode == REPLAY,
+        'HTTP_ARCHIVE_MODE': mode,
+        'HTTP_ARCHIVE_DIR': archive_dir,
+        # Every detail page has to go through the archive, do not skip the ads known from the previous runs
+        'CRAWL_STATE_ENABLED': False,
+        'REDIRECT_CACHE_ENABLED': False,
+        'CONDITIONAL_GET_ENABLED': False,
+    }
+
+
+def archive_output_file(mode: Optional[str], file: PurePath, archive_dir: PurePath = HTTP_ARCHIVE_FOLDER) -> Path:
+    """Where a recording or a replay writes 'file' (jobs history, csv files, run report): 'archive_dir/<mode>/',
+    so the production data is never overwritten with archived data; 'file' itself without archive mode
+    """
+    if not mode:
+        return Path(file)
+    return Path(archive_dir) / mode / Path(file).name
+
+
+def add_archive_arguments(parser: ArgumentParser) -> None:
+    """Add the mutually exclusive '--record' / '--replay' options (stored in 'http_archive')"""
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--record', dest='http_archive', action='store_const', const=RECORD,
+                       help=f'record every response into {HTTP_ARCHIVE_FOLDER}/<spider>.zip')
+    group.add_argument('--replay', dest='http_archive', action='store_const', const=REPLAY,
+                       help='replay the recorded responses, without any network access')
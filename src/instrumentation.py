@@ -0,0 +1,195 @@
+import json
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from functools import wraps
+from pathlib import Path, PurePath
+from typing import Any, Dict
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+
+CURRENT_FILEPATH = Path(__file__).resolve().parent
+DATA_FOLDER = CURRENT_FILEPATH.parent / 'data'
+RUN_REPORT_FILE = DATA_FOLDER / 'run_report.json'
+
+# request.meta key of the time the request entered the scheduler
+SCHEDULED_AT_META = 'instrumentation_scheduled_at'
+QUEUE_WAIT_META = 'instrumentation_queue_wait'
+
+
+class Timing:
+    """Number, total, mean and max of the durations (in seconds) of one measured thing"""
+    __slots__ = ('count', 'total', 'max')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def merge(self, other: 'Timing') -> None:
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def asdict(self) -> Dict[str, float]:
+        return {
+            'count': self.count,
+            'total': round(self.total, 6),
+            'mean': round(self.total / self.count, 6) if self.count else 0.0,
+            'max': round(self.max, 6),
+        }
+
+
+class RunReport:
+    """Timings of one run of the crawl, grouped by section (e.g. 'stages', 'pipelines') then by name
+
+    The callbacks are timed by ``InstrumentationMiddleware``, the pipelines by ``timed_pipeline``
+    and the phases before / after the crawl with the ``stage`` context manager.
+    """
+    def __init__(self):
+        self.started_at = datetime.now(tz=timezone.utc)
+        self.sections: Dict[str, Dict[str, Timing]] = {}
+
+    def reset(self) -> None:
+        """Start a new report, e.g. after each run of 'list_jobs.py --daemon' (the process outlives the runs)"""
+        self.started_at = datetime.now(tz=timezone.utc)
+        self.sections = {}
+
+    def add(self, section: str, name: str, seconds: float) -> None:
+        timings = self.sections.setdefault(section, {})
+        timing = timings.get(name)
+        if timing is None:
+            timing = timings[name] = Timing()
+        timing.add(seconds)
+
+    def merge(self, sections: Dict[str, Dict[str, Timing]]) -> None:
+        """Add the timings of another report, e.g. of a worker process of 'list_jobs.py --workers'"""
+        for section, timings in sections.items():
+            for name, timing in timings.items():
+                self.sections.setdefault(section, {}).setdefault(name, Timing()).merge(timing)
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time the wall clock duration of a phase of the run, e.g. ``with RUN_REPORT.stage('crawl'):``"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add('stages', name, time.perf_counter() - start)
+
+    def asdict(self) -> Dict[str, Any]:
+        return {
+            'started_at': self.started_at.isoformat(),
+            'finished_at': datetime.now(tz=timezone.utc).isoformat(),
+            **{section: {name: timing.asdict() for name, timing in sorted(timings.items())}
+               for section, timings in self.sections.items()},
+        }
+
+    def write(self, file: PurePath = RUN_REPORT_FILE) -> None:
+        with open(file, 'w') as f_out:
+            json.dump(self.asdict(), f_out, indent=1)
+
+
+# Shared by all the crawlers of one 'CrawlerProcess', written by the caller after the run
+RUN_REPORT = RunReport()
+
+
+def timed_pipeline(cls):
+    """Class decorator recording the time spent in 'process_item' of an item pipeline (dropped items included)"""
+    process_item = cls.process_item
+
+    @wraps(process_item)
+    def timed_process_item(self, item, spider):
+        start = time.perf_counter()
+        try:
+            return process_item(self, item, spider)
+        finally:
+            RUN_REPORT.add('pipelines', cls.__name__, time.perf_counter() - start)
+
+    cls.process_item = timed_process_item
+    return cls
+
+
+class InstrumentationMiddleware:
+    """Spider middleware recording, for each spider callback, the time its requests waited in the scheduler,
+    their download latency and the CPU time spent in the callback itself
+
+    It has to be the closest middleware to the spider to only measure the callback, after the meta copy
+    detection middleware of Scrapy >= 2.19 (1000). Enable it with:
+        'SPIDER_MIDDLEWARES': {'instrumentation.InstrumentationMiddleware': 1010},
+        'INSTRUMENTATION_ENABLED': True,
+    """
+    def __init__(self, report: RunReport):
+        self.report = report
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('INSTRUMENTATION_ENABLED'):
+            raise NotConfigured
+
+        middleware = cls(report=RUN_REPORT)
+        crawler.signals.connect(middleware.request_scheduled, signal=signals.request_scheduled)
+        crawler.signals.connect(middleware.request_reached_downloader, signal=signals.request_reached_downloader)
+        return middleware
+
+    def request_scheduled(self, request, spider):
+        request.meta[SCHEDULED_AT_META] = time.perf_counter()
+
+    def request_reached_downloader(self, request, spider):
+        scheduled_at = request.meta.get(SCHEDULED_AT_META)
+        if scheduled_at is not None:
+            request.meta[QUEUE_WAIT_META] = time.perf_counter() - scheduled_at
+
+    def process_spider_input(self, response, spider):
+        key = callback_key(response.request, spider)
+        # No download latency for the responses served by the HTTP cache
+        if 'download_latency' in response.meta:
+            self.report.add('download_latency', key, response.meta['download_latency'])
+        if QUEUE_WAIT_META in response.meta:
+            self.report.add('queue_wait', key, response.meta[QUEUE_WAIT_META])
+
+    def process_spider_output(self, response, result, spider):
+        # The callbacks are generators: only the time spent inside each 'next' belongs to the callback,
+        # not the time the downstream middlewares, the engine and the pipelines spend on its output
+        key = callback_key(response.request, spider)
+        cpu_time = 0.0
+        iterator = iter(result)
+        while True:
+            start = time.process_time()
+            try:
+                output = next(iterator)
+            except StopIteration:
+                break
+            finally:
+                cpu_time += time.process_time() - start
+            yield output
+        self.report.add('callback_cpu_time', key, cpu_time)
+
+    async def process_spider_output_async(self, response, result, spider):
+        # Same as 'process_spider_output' when the output is asynchronous (e.g. the start requests of Scrapy >= 2.13)
+        key = callback_key(response.request, spider)
+        cpu_time = 0.0
+        iterator = result.__aiter__()
+        while True:
+            start = time.process_time()
+            try:
+                output = await iterator.__anext__()
+            except StopAsyncIteration:
+                break
+            finally:
+                cpu_time += time.process_time() - start
+            yield output
+        self.report.add('callback_cpu_time', key, cpu_time)
+
+
+def callback_key(request, spider) -> str:
+    """'<spider name>.<callback name>', e.g. 'chemical_engineering_news_job.parse_ads'"""
+    callback = getattr(request.callback, '__name__', None) or 'parse'
+    return f'{spider.name}.{callback}'
@@ -16,3 +16,8 @@ class JobItem(Item):
     specialization = Field()
     canada = Field()
     comments1 = Field()
+    # Beginning of the job description, only used to find the same job on several jobs boards (not exported)
+    description = Field()
+    # Time the ad was posted (ISO format), to check the posting window of the items reused
+    # by 'conditional_get' as the spiders do, not only with the day of 'posted_date' (not exported)
+    posted_at = Field()
@@ -0,0 +1,238 @@
+import csv
+import sqlite3
+from datetime import datetime, timezone
+from pathlib import Path, PurePath
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+from itemadapter import ItemAdapter
+
+from dedup import dedup_key
+from items import JobItem
+from near_duplicates import merge_recent_near_duplicates
+
+CURRENT_FILEPATH = Path(__file__).resolve().parent
+DATA_FOLDER = CURRENT_FILEPATH.parent / 'data'
+JOB_STORE_FILE = DATA_FOLDER / 'jobs.sqlite3'
+
+# One column per field of the item, all stored as text (as in the csv files)
+ITEM_FIELDS: List[str] = list(JobItem.fields)
+# All the columns of the 'jobs' table
+TABLE_COLUMNS: List[str] = ['source', 'job_key', 'posted_on', 'title_key', 'school_key', 'first_seen', 'last_seen',
+                            *ITEM_FIELDS]
+# Close reasons of a completed run: the spider crawled all its pages, or all it could before the '--deadline'
+# of a bounded run (see 'crawl_budget.CrawlDeadlineMiddleware'); not 'shutdown' (Ctrl-C) nor an error
+COMPLETED_CLOSE_REASONS = ('finished', 'deadline')
+# Columns compared by 'export_csv' to merge the same job found on several jobs boards
+NEAR_DUPLICATE_COLUMNS = ['source', 'posted_on', 'ads_title', 'school', 'ads_source', 'description']
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS jobs (
+    source TEXT NOT NULL,
+    job_key TEXT NOT NULL,
+    posted_on TEXT,
+    title_key TEXT,
+    school_key TEXT,
+    first_seen TEXT NOT NULL,
+    last_seen TEXT NOT NULL,
+    {', '.join(f'{field} TEXT' for field in ITEM_FIELDS)},
+    PRIMARY KEY (source, job_key)
+);
+CREATE INDEX IF NOT EXISTS jobs_posted_on ON jobs (posted_on);
+CREATE INDEX IF NOT EXISTS jobs_dedup_key ON jobs (title_key, school_key);
+CREATE INDEX IF NOT EXISTS jobs_last_seen ON jobs (last_seen, posted_on);
+CREATE TABLE IF NOT EXISTS completed_runs (
+    source TEXT PRIMARY KEY,
+    started_at TEXT NOT NULL
+);
+"""
+
+UPSERT = f"""
+INSERT INTO jobs (source, job_key, posted_on, title_key, school_key, first_seen, last_seen, {', '.join(ITEM_FIELDS)})
+VALUES (:source, :job_key, :posted_on, :title_key, :school_key, :seen, :seen, {', '.join(f':{field}' for field in ITEM_FIELDS)})
+ON CONFLICT (source, job_key) DO UPDATE SET
+    posted_on = excluded.posted_on, title_key = excluded.title_key, school_key = excluded.school_key,
+    last_seen = excluded.last_seen, {', '.join(f'{field} = excluded.{field}' for field in ITEM_FIELDS)}
+"""
+
+
+def export_query(columns: Sequence[str], conditions: str) -> str:
+    """Query of the 'columns' (empty if not a column of the table) of the jobs matching 'conditions',
+    from latest to oldest posted
+    """
+    selected = ', '.join(column if column in TABLE_COLUMNS else f"'' AS {column}" for column in columns)
+    # 'rowid' keeps the jobs posted the same day in the order they were first seen
+    return f'SELECT {selected} FROM jobs WHERE {conditions} ORDER BY posted_on DESC, rowid'
+
+
+def posted_on(posted_date: Optional[str]) -> Optional[str]:
+    """ISO date ('YYYY-mm-dd', sortable) of the 'mm/dd/YYYY' posted date of an item"""
+    try:
+        return datetime.strptime(posted_date, '%m/%d/%Y').date().isoformat()
+    except (TypeError, ValueError):
+        return None
+
+
+class JobStore:
+    """History of all the jobs ever exported, in a SQLite database
+
+    Each job is one row keyed by (spider name, 'ads_job_code'), inserted the first time it is seen
+    and updated by every later run ('last_seen' is the start of the run).
+    The csv files are exported from it with an indexed query instead of being rewritten by the crawl:
+    the jobs seen since the start of the last completed run of each spider (see 'finish_run'), so a crawl
+    still running (e.g. in 'list_jobs.py --daemon') or one that failed does not remove the jobs of its spider.
+    """
+    def __init__(self, file: PurePath = JOB_STORE_FILE):
+        self.file = Path(file)
+        self.run_started_at = datetime.now(tz=timezone.utc).isoformat()
+        # Spider name -> start of its current (or last) run in this process, the 'last_seen' of its jobs
+        # ('run_started_at' unless the spider was crawled again, see 'start_run')
+        self.runs: Dict[str, str] = {}
+        self._connection: Optional[sqlite3.Connection] = None
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        # Opened on first use: importing the module does not create the database
+        if self._connection is None:
+            self.file.parent.mkdir(parents=True, exist_ok=True)
+            self._connection = sqlite3.connect(self.file)
+            self._connection.executescript(SCHEMA)
+            # Columns of the fields added to 'JobItem' after the database was created
+            columns = {row[1] for row in self._connection.execute('PRAGMA table_info(jobs)')}
+            for field in ITEM_FIELDS:
+                if field not in columns:
+                    self._connection.execute(f'ALTER TABLE jobs ADD COLUMN {field} TEXT')
+        return self._connection
+
+    def move_to(self, file: PurePath) -> None:
+        """Use another database file from now on (e.g. for a recording or a replay, see 'http_archive')"""
+        self.close()
+        self.file = Path(file)
+
+    def start_run(self, source: str) -> None:
+        """Start a new run of the spider 'source' in the same process (e.g. 'list_jobs.py --daemon'):
+        once it is finished (see 'finish_run'), its jobs not seen again in this run are no longer exported
+        """
+        self.runs[source] = datetime.now(tz=timezone.utc).isoformat()
+
+    def finish_run(self, source: str) -> None:
+        """The current run of the spider 'source' completed: export its jobs from now on, instead of the ones
+        of its previous completed run (kept in the database, also for the next processes)
+        """
+        started_at = self.runs.setdefault(source, self.run_started_at)
+        self.connection.execute('INSERT OR REPLACE INTO completed_runs (source, started_at) VALUES (?, ?)',
+                                (source, started_at))
+        self.commit()
+
+    def upsert(self, item, source: str) -> None:
+        """Insert or update a job, as seen by the spider 'source' in this run"""
+        adapter = ItemAdapter(item)
+        row: Dict[str, Any] = {field: adapter.get(field) for field in ITEM_FIELDS}
+        title_key, school_key = dedup_key(row['ads_title'], row['school'])
+        row.update({
+            'source': source,
+            # The Atom feed ads have no job code, their link is unique
+            'job_key': str(row['ads_job_code'] or row['ads_source']),
+            'posted_on': posted_on(row['posted_date']),
+            'title_key': title_key,
+            'school_key': school_key,
+            'seen': self.runs.setdefault(source, self.run_started_at),
+        })
+        row.update({field: None if row[field] is None else str(row[field]) for field in ITEM_FIELDS})
+        self.connection.execute(UPSERT, row)
+
+    def commit(self) -> None:
+        if self._connection is not None:
+            self._connection.commit()
+
+    def export_csv(self, file: PurePath, fieldnames: Sequence[str], source: Optional[str] = None,
+                   merge_near_duplicates: bool = False) -> int:
+        """ Write the jobs seen in the last run of each spider (of the 'source' spider only if given) to a csv file,
+        from latest to oldest posted
+
+        Parameters
+        ----------
+        file : PurePath
+            csv file to be written (overwritten if exists)
+        fieldnames : Sequence[str]
+            The header of the csv file; the fields that are not stored are left empty
+        source : Optional[str], optional
+            Name of the spider, by default None (all the spiders)
+        merge_near_duplicates : bool, optional
+            Merge the same job posted on several jobs boards with slightly different titles into one row
+            listing all their 'ads_source' (see ``near_duplicates.merge_near_duplicates``), by default False
+
+        Returns
+        -------
+        int
+            Number of rows written
+        """
+        rows = 0
+        with open(file, 'w') as f_out:
+            writer = csv.writer(f_out)
+            writer.writerow(fieldnames)
+            for row in self.export_rows(fieldnames, source=source, merge_near_duplicates=merge_near_duplicates):
+                writer.writerow('' if value is None else value for value in row)
+                rows += 1
+        return rows
+
+    def export_parquet(self, file: PurePath, fieldnames: Sequence[str], source: Optional[str] = None,
+                       merge_near_duplicates: bool = False) -> int:
+        """ Write the same jobs as ``export_csv`` to a Parquet file, with typed and split columns
+        (see ``columnar_export.write_parquet``, needs pyarrow)
+
+        Returns
+        -------
+        int
+            Number of rows written
+        """
+        from columnar_export import write_parquet
+
+        rows = self.export_rows(fieldnames, source=source, merge_near_duplicates=merge_near_duplicates)
+        return write_parquet(file, rows, fieldnames)
+
+    def export_rows(self, fieldnames: Sequence[str], source: Optional[str] = None,
+                    merge_near_duplicates: bool = False) -> Iterable[Sequence[Any]]:
+        """Values of 'fieldnames' (None if not stored) of the jobs seen since the start of the last completed run
+        of each spider crawled by this process (of the 'source' spider only if given), from latest to oldest posted
+
+        The spiders without a completed run have no jobs exported.
+
+        The rows are read from the query one at a time (SQLite sorts them with the 'posted_on' index, or spills
+        its sort to disk), without holding them in memory; with 'merge_near_duplicates', only the jobs posted
+        within a few days of the current row are kept (see '_merged_rows').
+        """
+        self.commit()
+        sources = [source] if source is not None else list(self.runs)
+        completed_runs = self.connection.execute('SELECT source, started_at FROM completed_runs')
+        runs = {name: started_at for name, started_at in completed_runs if name in sources}
+        # The jobs of the completed run and the ones already seen again by a later run (running or failed)
+        conditions = ' OR '.join('(last_seen >= ? AND source = ?)' for _ in runs) or '0'
+        parameters = [value for name, started_at in runs.items() for value in (started_at, name)]
+
+        if merge_near_duplicates:
+            return self._merged_rows(conditions, parameters, fieldnames)
+        return self.connection.execute(export_query(fieldnames, conditions), parameters)
+
+    def _merged_rows(self, conditions: str, parameters: Sequence[str], fieldnames: Sequence[str]) -> Iterator[List[Any]]:
+        """Rows of the export query, each job posted on several jobs boards merged into its first row
+
+        One streaming pass over the query: only the jobs posted within ``near_duplicates.NEAR_DUPLICATE_WINDOW_DAYS``
+        of the current row are in memory (see ``near_duplicates.merge_recent_near_duplicates``).
+        """
+        # The columns used to find the near duplicates first, then the exported ones
+        columns = [*NEAR_DUPLICATE_COLUMNS, *fieldnames]
+        jobs = ({**dict(zip(NEAR_DUPLICATE_COLUMNS, values)),
+                 **dict(zip(fieldnames, values[len(NEAR_DUPLICATE_COLUMNS):]))}
+                for values in self.connection.execute(export_query(columns, conditions), parameters))
+        for job in merge_recent_near_duplicates(jobs, fields=fieldnames):
+            yield [job[field] for field in fieldnames]
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.commit()
+            self._connection.close()
+            self._connection = None
+
+
+# Shared by all the crawlers of one 'CrawlerProcess'
+JOB_STORE = JobStore()
@@ -0,0 +1,93 @@
+import json
+import re
+from typing import Any, Dict, Iterator, Optional, Sequence, Tuple
+from weakref import WeakKeyDictionary
+
+# Shared decoder, 'raw_decode' decodes one value and returns where it ends
+JSON_DECODER = json.JSONDecoder()
+# What separates two values of a json array
+ARRAY_SEPARATOR_PATTERN = re.compile(r'[\s,]*')
+
+# Response -> {(xpath query, keys): decoded object}, so each script of a page is decoded once
+SCRIPT_JSON_CACHE: 'WeakKeyDictionary[Any, Dict[Tuple[str, Optional[Tuple[str, ...]]], Optional[Dict[str, Any]]]]' = \
+    WeakKeyDictionary()
+
+
+def iter_json_array(text: str, key: str) -> Iterator[Any]:
+    """Decode the values of the array of the first '"key": [...]' of a json text one by one
+
+    Only the values that are consumed are decoded: stopping the iteration early
+    (e.g. at the first ads older than the posting window) skips the rest of the text.
+
+    Parameters
+    ----------
+    text : str
+        The json text, e.g. the body of an API response
+    key : str
+        The name of the array, e.g. 'ARYSEARCHJOBS'
+
+    Yields
+    ------
+    Any
+        Each value of the array (nothing if the key is not in the text)
+    """
+    match = re.search(rf'"{re.escape(key)}"\s*:\s*\[', text)
+    if not match:
+        return
+
+    index = match.end()
+    while True:
+        index = ARRAY_SEPARATOR_PATTERN.match(text, index).end()
+        if index >= len(text) or text[index] == ']':
+            return
+        value, index = JSON_DECODER.raw_decode(text, index)
+        yield value
+
+
+def first_json_object(text: Optional[str], keys: Optional[Sequence[str]] = None) -> Optional[Dict[str, Any]]:
+    """Decode the first (non empty) json object of a text, e.g. a `<script>` assigning it to a variable
+
+    The object boundaries are found by the json decoder itself in one linear scan from the first '{'
+    (instead of a greedy regex backtracking over the whole script), nested objects included.
+
+    Parameters
+    ----------
+    text : Optional[str]
+        e.g. 'var ClientGoogleTagManagerDataLayer = [{"ApplicationURL": "..."}];'
+    keys : Optional[Sequence[str]], optional
+        Only keep these keys (missing ones are None), by default None (the whole object)
+
+    Returns
+    -------
+    Optional[Dict[str, Any]]
+        The object, None if the text has no json object
+    """
+    if not text:
+        return None
+
+    index = text.find('{')
+    while index != -1:
+        try:
+            value, _ = JSON_DECODER.raw_decode(text, index)
+        except ValueError:
+            value = None
+        if not value:
+            # e.g. a '{' of javascript code (or an empty block) before the object
+            index = text.find('{', index + 1)
+            continue
+        if keys is None:
+            return value
+        return {key: value.get(key) for key in keys}
+    return None
+
+
+def script_json(response, query: str, keys: Optional[Sequence[str]] = None) -> Optional[Dict[str, Any]]:
+    """The first json object of the first node matched by the xpath 'query' in a response, cached per response
+
+    e.g. ``script_json(response, '//script[@type="application/ld+json"]/text()', keys=['description'])``
+    """
+    cache_key = (query, tuple(keys) if keys is not None else None)
+    cache = SCRIPT_JSON_CACHE.setdefault(response, {})
+    if cache_key not in cache:
+        cache[cache_key] = first_json_object(response.xpath(query).get(), keys=keys)
+    return cache[cache_key]
@@ -1,112 +1,144 @@
-import csv
+import argparse
+import importlib
+import importlib.util
 import re
-from collections import Counter
-from pathlib import Path, PurePath
-from typing import Dict, List, Sequence
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Tuple
 
-from furl import furl
-from scrapy.crawler import CrawlerProcess
+# The spiders, the crawler and the google sheet client are imported when needed (see 'timed_import'):
+# e.g. 'list_jobs.py --spiders cenews --no-sheet' does not import the other spiders nor the sheet client
+# from scrapy.crawler import CrawlerProcess
+#
+# from cenews_spider import ChemicalEngineeringNewsSpider
+# from chroniclehighered_spider import ChronicalHigherEducationSpider
+# from higheredjobs_spider import JobsHigheredjobsSpider
+# from chempostingcanada_spider import ChempostingcanadaSpider
+# from http_archive import add_archive_arguments, archive_settings
+# from instrumentation import RUN_REPORT, RUN_REPORT_FILE
+# from orchestrator import run_workers
+# from job_store import JOB_STORE
+# from pipelines import FIELDS_TO_EXPORT
+# from write_to_sheet import sync_csv_to_google_sheet
 
-from cenews_spider import ChemicalEngineeringNewsSpider
-from chroniclehighered_spider import ChronicalHigherEducationSpider
-from higheredjobs_spider import JobsHigheredjobsSpider
-from chempostingcanada_spider import ChempostingcanadaSpider
-from write_to_sheet import write_csv_to_google_sheet
+STARTED_AT = time.perf_counter()
 
 CURRENT_FILEPATH = Path(__file__).resolve().parent
 DATA_FOLDER = CURRENT_FILEPATH.parent / 'data'
 DATA_FOLDER.mkdir(exist_ok=True)
 RESULT_FILE = DATA_FOLDER / 'jobs.csv'
+# Same jobs as 'RESULT_FILE', with typed date columns and the hyperlinks split into url and name columns
+RESULT_PARQUET_FILE = DATA_FOLDER / 'jobs.parquet'
+CRAWL_STATE_FOLDER = DATA_FOLDER / 'crawl_state'
 
-JOB_TITLE_IGNORE_KEYWORDS = ['post-doc', 'postdoc', 'scientist']
-
-FIELDS_TO_EXPORT = ['ads_title', 'posted_date', 'priority_date', 'category',
-                    'school', 'department', 'specialization',
-                    'rank', 'city', 'state', 'canada',
-                    'current_status', 'comments1', 'comments2',
-                    'ads_source', 'ads_job_code'
-                    ]
-
-
-def process_csv(file: PurePath, fieldnames: Sequence, sort_by: str, reverse: bool = False) -> None:
-    """ Remove duplicated row & Sort a csv file by the 'sort_by' column name
-
-    Parameters
-    ----------
-    file : PurePath
-        csv file to be sorted
-    fieldnames : Sequence
-        The header list of strings for the csv name
-    sort_by : str
-        The name of the column that to be sorted by
-    reverse : bool, optional
-        Setting for reversed order, by default False
-    """
-    with open(file, 'r') as f_in:
-        dict_reader = csv.DictReader(f_in, fieldnames=fieldnames)
-        data = list(dict_reader)
-
-    deduplicated_data = remove_duplicate(data)
-    # print(f'{len(deduplicated_data)=}')
-
-    sorted_data = sorted(deduplicated_data, key=lambda i: i[sort_by], reverse=reverse)
-
-    with open(file, 'w') as f_out:
-        dict_writer = csv.DictWriter(f_out, fieldnames=fieldnames)
-        dict_writer.writeheader()
-        dict_writer.writerows(sorted_data)
-
-
-def remove_duplicate(data: List[Dict[str, str]]) -> List[Dict[str, str]]:
-    """Remove duplicated row based on 'ads_title' and then the application url
-
-    Duplicated is first considered based on the 'ads_title' then the url in the 'school' key.
-    url is first processed to remove query 'source' as well as scheme (e.g. 'http' or 'https')
-
-    Parameters
-    ----------
-    data : List[Dict[str, str]]
-        The list of csv rows without header, should be passed in with csv.DictReader
-
-    Returns
-    -------
-    List[Dict[str, str]]
-        Remove List with similar structure but duplicated removed
-    """
-    count_result = Counter(row['ads_title'] for row in data)
-    # print(f'{count_result=}')
-
-    # Get all rows with 'ads_title' count more than 1
-    duplicate_titles = [title for title, count in count_result.items() if count > 1]
-    # print(f'{duplicate_titles=}')
-
-    # Add all non-duplicated into the result list
-    result = [row for row in data if row['ads_title'] not in duplicate_titles]
-    # print(f'{len(result)=}')
-
-    for title in duplicate_titles:
-        duplicated_rows = [row for row in data if row['ads_title'] == title]
-        # print(f'{duplicated_rows=}')
-
-        existing_info = set()
-        for row in duplicated_rows:
-            url, school_name = re.findall(r'\"(.*?)\"', row['school'])
-            # Remove query 'source' since some url is like this:
-            # 'https://embryriddle.wd1.myworkdayjobs.com/en-US/External/job/Daytona-Beach-FL/Non-Tenure-Track-Faculty-Position-in-Chemistry--Daytona-Beach-Campus-_R300364?source=HigherEdJobs'
-            url = furl(url).remove(query=['source']).url.rstrip('/')
-            # Need to remove scheme ('http' or 'https'):
-            url = re.sub(r'https?://', '', url)
-            if (url, school_name) not in existing_info:
-                existing_info.add((url, school_name))
-                result.append(row)
-            # print(f'{existing_info=}')
-
-    return result
+# Name of the spider on the command line -> (module, class), in crawl order
+SPIDERS: Dict[str, Tuple[str, str]] = {
+    'higheredjobs': ('higheredjobs_spider', 'JobsHigheredjobsSpider'),
+    'cenews': ('cenews_spider', 'ChemicalEngineeringNewsSpider'),
+    'chroniclehighered': ('chroniclehighered_spider', 'ChronicalHigherEducationSpider'),
+    'chempostingcanada': ('chempostingcanada_spider', 'ChempostingcanadaSpider'),
+}
+
+# Default minutes between two crawls of each jobs board in 'list_jobs.py --daemon':
+# the Blogger feed is cheap and changes often, the Chronicle listing rarely has new chemistry jobs
+DAEMON_INTERVALS: Dict[str, float] = {
+    'higheredjobs': 60,
+    'cenews': 60,
+    'chroniclehighered': 180,
+    'chempostingcanada': 15,
+}
+
+# Module name -> seconds spent importing it (with the modules it imported first), in import order
+IMPORT_TIMES: Dict[str, float] = {}
+
+
+def timed_import(name: str):
+    """Import a module and record how long it took in ``IMPORT_TIMES`` (only the first import costs)"""
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    IMPORT_TIMES.setdefault(name, time.perf_counter() - start)
+    return module
+
+
+def load_spider(name: str):
+    """The spider class of a name of ``SPIDERS``, importing only its module"""
+    module_name, class_name = SPIDERS[name]
+    return getattr(timed_import(module_name), class_name)
+
+
+def parse_interval(text: str) -> Tuple[str, float]:
+    """'--interval' value 'NAME=MINUTES' -> (name, minutes)"""
+    name, _, minutes = text.partition('=')
+    if name not in SPIDERS:
+        raise argparse.ArgumentTypeError(f'unknown spider {name!r}, choose from {", ".join(SPIDERS)}')
+    try:
+        return name, float(minutes)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'invalid minutes in {text!r}, e.g. chempostingcanada=15')
+
+
+def parse_duration(text: str) -> float:
+    """'--deadline' value in seconds, e.g. '600', '90s', '10m', '1h'"""
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([smh]?)\s*', text.lower())
+    if not match:
+        raise argparse.ArgumentTypeError(f'invalid duration {text!r}, e.g. 600, 90s, 10m or 1h')
+    number, unit = match.groups()
+    return float(number) * {'': 1, 's': 1, 'm': 60, 'h': 3600}[unit]
+
+
+def print_startup_profile(startup: float) -> None:
+    print(f'Startup: {startup:.3f}s, imports:', file=sys.stderr)
+    for name, seconds in sorted(IMPORT_TIMES.items(), key=lambda i: i[1], reverse=True):
+        print(f'  {name:<28} {seconds:>8.3f}s', file=sys.stderr)
 
 
 if __name__ == '__main__':
-    # Remove the result file if exists
-    RESULT_FILE.unlink(missing_ok=True)
+    parser = argparse.ArgumentParser(description=f'Crawl all the jobs boards into {RESULT_FILE} and the google sheet')
+    parser.add_argument('--spiders', nargs='+', choices=list(SPIDERS), default=list(SPIDERS), metavar='SPIDER',
+                        help=f'only crawl these jobs boards ({", ".join(SPIDERS)}), by default all of them; '
+                             'the google sheet is only synced when all of them are crawled')
+    parser.add_argument('--no-sheet', action='store_true', help='do not sync the csv file to the google sheet')
+    parser.add_argument('--profile-startup', action='store_true',
+                        help='print the startup time and the import time of each module before crawling')
+    http_archive = timed_import('http_archive')
+    http_archive.add_archive_arguments(parser)
+    parser.add_argument('--workers', type=int, default=1,
+                        help=f'number of crawling processes, at most one per spider ({len(SPIDERS)}), by default 1')
+    parser.add_argument('--deadline', type=parse_duration, default=0, metavar='DURATION',
+                        help='time budget of the crawl of each jobs board (e.g. 600, 90s, 10m, 1h): the latest ads '
+                             'are crawled first and the spiders are closed at the deadline, by default no deadline')
+    parser.add_argument('--parse-workers', type=int, default=0, metavar='N',
+                        help='parse the details pages in N worker processes, off the thread downloading the pages, '
+                             'by default 0 (parsed in the crawling process)')
+    parser.add_argument('--parquet', action='store_true',
+                        help=f'also export the jobs to {RESULT_PARQUET_FILE.name}, a columnar file with typed dates and '
+                             'the school / source hyperlinks split into name and url columns (needs pyarrow)')
+    parser.add_argument('--daemon', action='store_true',
+                        help='keep running and crawl each jobs board on its own interval, exporting the csv file '
+                             '(and syncing the google sheet) after each crawl; stop with Ctrl-C')
+    parser.add_argument('--interval', type=parse_interval, action='append', default=[], metavar='SPIDER=MINUTES',
+                        help='minutes between two crawls of a jobs board in --daemon mode, by default '
+                             + ', '.join(f'{name}={minutes:g}' for name, minutes in DAEMON_INTERVALS.items()))
+    args = parser.parse_args()
+    if args.daemon and args.workers > 1:
+        parser.error('--daemon crawls in one process, it cannot be used with --workers')
+    # pyarrow is optional: checked before crawling, imported only by the export
+    if args.parquet and importlib.util.find_spec('pyarrow') is None:
+        parser.error('--parquet needs pyarrow: pip install pyarrow')
+
+    spider_classes = [load_spider(name) for name in SPIDERS if name in args.spiders]
+    instrumentation = timed_import('instrumentation')
+    RUN_REPORT = instrumentation.RUN_REPORT
+    JOB_STORE = timed_import('job_store').JOB_STORE
+    FIELDS_TO_EXPORT = timed_import('pipelines').FIELDS_TO_EXPORT
+    RUN_REPORT_FILE = instrumentation.RUN_REPORT_FILE
+    if args.http_archive:
+        # A recording / replay writes its own jobs history, csv files and run report, next to the archives
+        RESULT_FILE, RESULT_PARQUET_FILE, RUN_REPORT_FILE = (
+            http_archive.archive_output_file(args.http_archive, file)
+            for file in (RESULT_FILE, RESULT_PARQUET_FILE, RUN_REPORT_FILE))
+        JOB_STORE.move_to(http_archive.archive_output_file(args.http_archive, JOB_STORE.file))
 
     settings = {
         'USER_AGENT': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0.0.0 Safari/537.36',
@@ -117,40 +149,138 @@ if __name__ == '__main__':
         #   'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
         #   'Accept-Language': 'en'
         # },
-        'CSV_EXPORT_FILE': RESULT_FILE,
+        # Skip the detail pages of ads already processed in the previous runs
+        'EXTENSIONS': {
+            'crawl_state.CrawlStateExtension': 500,
+            'redirect_cache.RedirectCacheExtension': 510,
+            'parse_pool.ParsePoolExtension': 520,
+        },
+        'CRAWL_STATE_ENABLED': True,
+        'CRAWL_STATE_DIR': CRAWL_STATE_FOLDER,
+        # Resolve the apply urls from the headers only, and only once per 'REDIRECT_CACHE_TTL_DAYS'
+        'REDIRECT_CACHE_ENABLED': True,
+        # With '--parse-workers', the details pages are parsed in a pool of processes while the next pages download
+        'PARSE_POOL_WORKERS': args.parse_workers,
+        # Queue wait, download latency and CPU time of each callback, written to 'RUN_REPORT_FILE'
+        'SPIDER_MIDDLEWARES': {
+            'crawl_budget.RecencyPriorityMiddleware': 910,
+            'conditional_get.ConditionalGetSpiderMiddleware': 950,
+            'instrumentation.InstrumentationMiddleware': 1010,
+        },
+        'INSTRUMENTATION_ENABLED': True,
+        # Listing pages first, then the requests of the ads from the latest posted; with '--deadline' the spiders
+        # drop the requests of old / undated ads near the deadline and are closed at the deadline
+        'RECENCY_PRIORITY_ENABLED': True,
+        'CRAWL_DEADLINE': args.deadline,
+        # Reuse the items of the last run for the start urls (first listing pages, Atom feed) that did not change
+        'CONDITIONAL_GET_ENABLED': True,
+        # Stop C&EN and Chronicle pagination once the listings are older than the posting window
+        'DATE_AWARE_CRAWL': True,
+        # Learn the latency and the throttling of each domain during the run: the jobs boards start at 4
+        # concurrent requests and may go up to 'ADAPTIVE_CONCURRENCY_MAX', the employer application hosts stay at 2
+        'DOWNLOADER_MIDDLEWARES': {
+            'crawl_budget.CrawlDeadlineMiddleware': 540,
+            'adaptive_concurrency.AdaptiveConcurrencyMiddleware': 560,
+            'conditional_get.ConditionalGetDownloaderMiddleware': 570,
+        },
+        'ADAPTIVE_CONCURRENCY_ENABLED': True,
+        'CONCURRENT_REQUESTS': 32,
+        'CONCURRENT_REQUESTS_PER_DOMAIN': 2,
+        'DOWNLOAD_SLOTS': {
+            'chemistryjobs.acs.org': {'concurrency': 4},
+            'jobs.chronicle.com': {'concurrency': 4},
+            'www.higheredjobs.com': {'concurrency': 4},
+        },
         'ITEM_PIPELINES': {
-            # 'higheredjobs_spider.RemoveIgnoredKeywordsPipeline': 1,
-            # 'higheredjobs_spider.DeDuplicatesPipeline': 2,
-            # 'higheredjobs_spider.CsvWriteLatestToOldest': 3,
-            'cenews_spider.RemoveIgnoredKeywordsPipeline': 4,
-            'cenews_spider.DeDuplicatesPipeline': 5,
-            # 'cenews_spider.CsvWriteLatestToOldest': 6,
+            'pipelines.RemoveIgnoredKeywordsPipeline': 4,
+            'pipelines.DeDuplicatesPipeline': 5,
+            # Drop the same job found on several jobs boards, then keep the items in the jobs history 'JOB_STORE'
+            'pipelines.CrossSourceDeDuplicatesPipeline': 7,
+            'pipelines.JobStorePipeline': 8,
             },
-        'FEEDS': {
-            Path(RESULT_FILE): {
-                'format': 'csv',
-                'fields': FIELDS_TO_EXPORT,
-                'overwrite': False,
-                'store_empty': False,
-                'item_export_kwargs': {
-                    'include_headers_line': False,
-                }
-            },
-        },
+        # 'FEEDS': {
+        #     Path(RESULT_FILE): {
+        #         'format': 'csv',
+        #         'fields': FIELDS_TO_EXPORT,
+        #         'overwrite': False,
+        #         'store_empty': False,
+        #         'item_export_kwargs': {
+        #             'include_headers_line': False,
+        #         }
+        #     },
+        # },
         'LOG_LEVEL': 'INFO',
         # 'ROBOTSTXT_OBEY': False,
     }
 
-    process = CrawlerProcess(settings=settings)
-    process.crawl(JobsHigheredjobsSpider)
-    process.crawl(ChemicalEngineeringNewsSpider)
-    process.crawl(ChronicalHigherEducationSpider)
-    process.crawl(ChempostingcanadaSpider)
-    process.start()
+    # Record the responses into (or replay them from) the local HTTP archive
+    settings.update(http_archive.archive_settings(args.http_archive))
+
+    if args.workers > 1:
+        run_workers = timed_import('orchestrator').run_workers
+    else:
+        CrawlerProcess = timed_import('scrapy.crawler').CrawlerProcess
+    if args.daemon:
+        daemon = timed_import('daemon')
+
+    startup = time.perf_counter() - STARTED_AT
+    RUN_REPORT.add('stages', 'startup', startup)
+    for name, seconds in IMPORT_TIMES.items():
+        RUN_REPORT.add('imports', name, seconds)
+    if args.profile_startup:
+        print_startup_profile(startup)
+
+    # Write csv file to google sheet (only the rows changed since the last run)
+    # Recording / replaying is for development only, the google sheet is left untouched,
+    # as well as when some jobs boards are not crawled (their rows would be removed from the sheet)
+    sync_sheet = not (args.http_archive or args.no_sheet or len(spider_classes) < len(SPIDERS))
+
+    def export_jobs(sync_sheet: bool = sync_sheet) -> None:
+        # Export the (already deduplicated) jobs of the last run of each spider from the jobs history
+        # to the csv file, from latest to oldest
+        with RUN_REPORT.stage('write_jobs_csv'):
+            # The same job posted on several jobs boards with slightly different titles is one row
+            JOB_STORE.export_csv(file=RESULT_FILE, fieldnames=FIELDS_TO_EXPORT, merge_near_duplicates=True)
+        if args.parquet:
+            with RUN_REPORT.stage('write_jobs_parquet'):
+                JOB_STORE.export_parquet(file=RESULT_PARQUET_FILE, fieldnames=FIELDS_TO_EXPORT,
+                                         merge_near_duplicates=True)
+
+        if sync_sheet:
+            with RUN_REPORT.stage('sync_csv_to_google_sheet'):
+                sync_csv_to_google_sheet = timed_import('write_to_sheet').sync_csv_to_google_sheet
+                sync_csv_to_google_sheet(RESULT_FILE)
+
+        RUN_REPORT.write(RUN_REPORT_FILE)
+
+    if args.daemon:
+        # One warm process: the imports, the reactor and the in-memory caches are reused by every crawl
+        intervals = {**DAEMON_INTERVALS, **dict(args.interval)}
+        process = CrawlerProcess(settings=settings)
+        schedules = []
+
+        def after_run(spidercls) -> None:
+            # The sheet waits for the first crawl of every jobs board, so none of them is missing from it
+            export_jobs(sync_sheet=sync_sheet and all(schedule.completed for schedule in schedules))
+            # Each report holds the timings since the previous one, not since the daemon started
+            RUN_REPORT.reset()
+
+        schedules.extend(daemon.SpiderSchedule(process, spidercls, interval=intervals[name] * 60, after_run=after_run)
+                         for name, spidercls in zip([name for name in SPIDERS if name in args.spiders], spider_classes))
+        daemon.run_daemon(process, schedules)
+        JOB_STORE.close()
+        sys.exit()
 
-    # Sort the resulting csv file
-    process_csv(file=RESULT_FILE, fieldnames=FIELDS_TO_EXPORT,
-                sort_by='posted_date', reverse=True)
+    if args.workers > 1:
+        # Each spider in its own process, the items are filtered and deduplicated here
+        with RUN_REPORT.stage('crawl'):
+            run_workers(spider_classes, settings, workers=args.workers)
+    else:
+        process = CrawlerProcess(settings=settings)
+        for spidercls in spider_classes:
+            process.crawl(spidercls)
+        with RUN_REPORT.stage('crawl'):
+            process.start()
 
-    # Write csv file to google sheet
-    write_csv_to_google_sheet(RESULT_FILE)
+    export_jobs()
+    JOB_STORE.close()
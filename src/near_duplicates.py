@@ -0,0 +1,328 @@
+import hashlib
+import struct
+from collections import deque
+from datetime import date
+from typing import Any, Dict, FrozenSet, Hashable, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from dedup import LEADING_THE_PATTERN, hyperlink_parts, normalize_text, school_name
+from extractors import strip_html
+
+Signature = Tuple[int, ...]
+
+# Words left out of the titles and school names: the jobs boards add or drop them
+# ('Tenure-Track Assistant Professor in Organic Chemistry' and 'Assistant Professor - Organic Chemistry')
+STOP_WORDS = frozenset('a an and at for in of or on the to position faculty tenure track tt open rank'.split())
+# Words of most school names, left out of the LSH bands (not of the comparison of the candidates)
+GENERIC_SCHOOL_WORDS = frozenset('university college institute'.split())
+
+# The descriptions are compared with their word 3-grams, only the beginning
+# (the end is often the same boilerplate on every ad of a jobs board)
+DESCRIPTION_SHINGLE_SIZE = 3
+DESCRIPTION_MAX_WORDS = 120
+
+# Separator of the jobs board names in the merged 'ads_source' cell
+SOURCES_SEPARATOR = ' + '
+
+# The same job is posted on the other jobs boards within days: by default, the rows posted more than
+# 'NEAR_DUPLICATE_WINDOW_DAYS' apart are not compared (see ``merge_recent_near_duplicates``)
+NEAR_DUPLICATE_WINDOW_DAYS = 14
+
+
+def title_words(ads_title: str) -> FrozenSet[str]:
+    """Normalized words of a title, without the stop words"""
+    return frozenset(normalize_text(ads_title).split()) - STOP_WORDS
+
+
+def school_words(school: str) -> FrozenSet[str]:
+    """Normalized words of the school name of a 'school' field (without the embedded hyperlink), without the stop words"""
+    return frozenset(LEADING_THE_PATTERN.sub('', normalize_text(school_name(school))).split()) - STOP_WORDS
+
+
+def description_shingles(description: str) -> Set[str]:
+    """Word 3-grams of the first 'DESCRIPTION_MAX_WORDS' words of the normalized description (empty if none)"""
+    words = normalize_text(strip_html(description)).split()[:DESCRIPTION_MAX_WORDS]
+    return {' '.join(words[i:i + DESCRIPTION_SHINGLE_SIZE])
+            for i in range(len(words) - DESCRIPTION_SHINGLE_SIZE + 1)}
+
+
+def jaccard(words: FrozenSet[str], other: FrozenSet[str]) -> float:
+    """Jaccard similarity of two sets, 0 if any of them is empty"""
+    if not words or not other:
+        return 0.0
+    return len(words & other) / len(words | other)
+
+
+class MinHasher:
+    """MinHash signatures of shingle sets: the share of equal values of two signatures estimates
+    the Jaccard similarity of the two sets
+
+    Each shingle is hashed once with SHAKE-128 into 'num_perm' 32-bit values (one per hash function);
+    the signature is the minimum of each of them over the shingles.
+
+    Parameters
+    ----------
+    num_perm : int, optional
+        Number of hash functions (length of the signatures), by default 64
+    seed : bytes, optional
+        Salt of the hash functions; signatures are only comparable with the same seed, by default b''
+    """
+    def __init__(self, num_perm: int = 64, seed: bytes = b''):
+        self.num_perm = num_perm
+        self.seed = seed
+        self.unpack = struct.Struct(f'<{num_perm}I').unpack
+
+    def signature(self, shingles: Iterable[str]) -> Signature:
+        """Signature of a set of shingles, () for an empty set"""
+        hashes = [self.unpack(hashlib.shake_128(self.seed + shingle.encode()).digest(4 * self.num_perm))
+                  for shingle in shingles]
+        if not hashes:
+            return ()
+        return tuple(map(min, zip(*hashes)))
+
+
+def similarity(signature: Signature, other: Signature) -> float:
+    """Estimated Jaccard similarity of the shingle sets of two signatures (0 if any of them is empty)"""
+    if not signature or not other:
+        return 0.0
+    return sum(value == other_value for value, other_value in zip(signature, other)) / len(signature)
+
+
+class IndexedJob(NamedTuple):
+    title_words: FrozenSet[str]
+    school_words: FrozenSet[str]
+    description_signature: Signature
+    # Jobs boards of the job and of its merged near duplicates
+    sources: Set[str]
+
+
+class NearDuplicateIndex:
+    """Locality-sensitive hashing (LSH) index of jobs, finding the same job posted on another jobs board
+    with a slightly different title, without comparing it to every job of the index
+
+    The MinHash signature of the (school word, title word) pairs of each job is cut into 'bands' bands:
+    two jobs are candidates when all the values of at least one band are equal, which is likely above
+    a Jaccard similarity of about (1 / bands) ** (1 / rows per band) (0.5 with 64 hash functions in 16 bands)
+    and unlikely below. A candidate from another jobs board is a near duplicate when the ``jaccard`` similarity
+    of the school words is at least 'school_threshold' and:
+
+    - if both jobs have a description, the ``jaccard`` similarity of the title words is at least 'title_threshold'
+      and the estimated similarity of the descriptions at least 'description_threshold'
+      (e.g. not the 'Organic' and 'Inorganic' positions of the same school);
+    - otherwise (e.g. the Chronicle ads have none), the title words are the same: nothing else tells
+      'Assistant Professor of Chemistry' from 'Assistant Professor of Chemistry Education'.
+
+    Adding a job costs one lookup per band and a comparison with its few candidates, whatever the number
+    of indexed jobs.
+
+    Parameters
+    ----------
+    num_perm : int, optional
+        Length of the signatures, by default 64
+    bands : int, optional
+        Number of LSH bands, dividing 'num_perm', by default 16
+    title_threshold : float, optional
+        Minimum Jaccard similarity of the title words, when both jobs have a description, by default 0.8
+    school_threshold : float, optional
+        Minimum Jaccard similarity of the school words, by default 0.75
+        ('University of Arizona' is not 'Arizona State University')
+    description_threshold : float, optional
+        Minimum similarity of the descriptions, when both jobs have one, by default 0.5
+    """
+    def __init__(self, num_perm: int = 64, bands: int = 16, title_threshold: float = 0.8,
+                 school_threshold: float = 0.75, description_threshold: float = 0.5):
+        if num_perm % bands:
+            raise ValueError(f'{bands=} must divide {num_perm=}')
+        self.minhasher = MinHasher(num_perm=num_perm)
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.title_threshold = title_threshold
+        self.school_threshold = school_threshold
+        self.description_threshold = description_threshold
+        # (band number, values of the band) -> keys of the jobs
+        self.buckets: Dict[Tuple[int, Signature], List[Hashable]] = {}
+        self.jobs: Dict[Hashable, IndexedJob] = {}
+        # Key of each indexed job -> its bands, to remove it
+        self.job_bands: Dict[Hashable, List[Tuple[int, Signature]]] = {}
+
+    def __len__(self) -> int:
+        return len(self.jobs)
+
+    def add(self, key: Hashable, source: str, ads_title: str, school: str, description: str = '') -> Optional[Hashable]:
+        """Index a job, unless it is a near duplicate of an indexed job from another jobs board
+
+        Returns
+        -------
+        Optional[Hashable]
+            The key of the indexed job this one is a near duplicate of (this one is then not indexed,
+            its jobs board is added to the ones of the indexed job), None if the job was indexed
+        """
+        job = self.job(source, ads_title, school, description)
+        bands = self.bands_of(job)
+
+        duplicate_of = self._find(source, job, bands)
+        if duplicate_of is not None:
+            self.jobs[duplicate_of].sources.add(source)
+            return duplicate_of
+
+        self.jobs[key] = job
+        self.job_bands[key] = bands
+        for band in bands:
+            self.buckets.setdefault(band, []).append(key)
+        return None
+
+    def remove(self, key: Hashable) -> None:
+        """Forget an indexed job: the next jobs are no longer compared to it"""
+        del self.jobs[key]
+        for band in self.job_bands.pop(key):
+            bucket = self.buckets[band]
+            bucket.remove(key)
+            if not bucket:
+                del self.buckets[band]
+
+    def job(self, source: str, ads_title: str, school: str, description: str = '') -> IndexedJob:
+        return IndexedJob(title_words(ads_title), school_words(school),
+                          self.minhasher.signature(description_shingles(description)), {source})
+
+    def is_duplicate(self, source: str, job: IndexedJob, other: IndexedJob) -> bool:
+        """Whether 'job' from the jobs board 'source' is a near duplicate of 'other'"""
+        # Two ads of the same jobs board are two different jobs
+        if source in other.sources:
+            return False
+        if jaccard(job.school_words, other.school_words) < self.school_threshold:
+            return False
+        if not job.description_signature or not other.description_signature:
+            return bool(job.title_words) and job.title_words == other.title_words
+        return (jaccard(job.title_words, other.title_words) >= self.title_threshold
+                and similarity(job.description_signature, other.description_signature) >= self.description_threshold)
+
+    def bands_of(self, job: IndexedJob) -> List[Tuple[int, Signature]]:
+        # One shingle per (school word, title word) pair: their Jaccard similarity is about the product of the ones
+        # of the schools and of the titles, so the same title at another school (or another title at the same school)
+        # is seldom a candidate, while the title + school words alone would make every 'Assistant Professor of
+        # Chemistry' of any 'University' a candidate
+        school_words = job.school_words - GENERIC_SCHOOL_WORDS or job.school_words or {''}
+        shingles = [f'{school_word}|{title_word}' for school_word in school_words for title_word in job.title_words or ['']]
+        signature = self.minhasher.signature(shingles)
+        return [(band, signature[band * self.rows:(band + 1) * self.rows]) for band in range(self.bands)]
+
+    def _find(self, source: str, job: IndexedJob, bands: List[Tuple[int, Signature]]) -> Optional[Hashable]:
+        # Candidates in the order they were indexed: the first one (e.g. the latest posted) wins
+        candidates = {key: None for band in bands for key in self.buckets.get(band, ())}
+        return next((key for key in candidates if self.is_duplicate(source, job, self.jobs[key])), None)
+
+
+def merge_ads_sources(ads_source: str, other: str) -> str:
+    """'ads_source' cell listing the jobs boards of both cells, e.g. '=hyperlink("url","HigherEdJobs + C&ENJobs")'
+
+    A sheet cell holds one link: the link of the first cell is kept.
+    """
+    url, names = hyperlink_parts(ads_source)
+    _, other_names = hyperlink_parts(other)
+    names = names.split(SOURCES_SEPARATOR) if names else []
+    names.extend(name for name in other_names.split(SOURCES_SEPARATOR) if name and name not in names)
+    label = SOURCES_SEPARATOR.join(names)
+    return f'=hyperlink("{url}","{label}")' if url else label
+
+
+def iter_near_duplicates(rows: Iterable[Dict[str, Any]], index: Optional[NearDuplicateIndex] = None
+                         ) -> Iterator[Tuple[int, int, Dict[str, Any]]]:
+    """Position of each row that is a near duplicate of an earlier row, position of the first row of its job
+    and the row itself
+
+    Each row needs 'source' (the spider), 'ads_title', 'school' and optionally 'description'; the rows are
+    read once, one at a time (the index keeps the words and the signatures of the jobs, not the rows).
+    """
+    index = index if index is not None else NearDuplicateIndex()
+    for position, row in enumerate(rows):
+        duplicate_of = index.add(position, row['source'], row['ads_title'] or '', row['school'] or '',
+                                 row.get('description') or '')
+        if duplicate_of is not None:
+            yield position, duplicate_of, row
+
+
+def merge_row(first_row: Dict[str, Any], row: Dict[str, Any], fields: Sequence[str] = ()) -> None:
+    """Merge 'row' into the first row of its job: its 'ads_source' is added, its 'fields' fill the empty ones"""
+    first_row['ads_source'] = merge_ads_sources(first_row.get('ads_source') or '', row.get('ads_source') or '')
+    for field in fields:
+        if not first_row.get(field) and row.get(field):
+            first_row[field] = row[field]
+
+
+def merge_near_duplicates(rows: Iterable[Dict[str, Any]], index: Optional[NearDuplicateIndex] = None,
+                          fields: Sequence[str] = ()) -> List[Dict[str, Any]]:
+    """Merge the rows of the same job posted on several jobs boards into the first one
+
+    Each row needs 'source' (the spider), 'ads_title', 'school', 'ads_source' and optionally 'description'.
+    The first row of a job lists the 'ads_source' of all of its rows; its empty 'fields' are filled
+    with the values of the merged rows. The other rows are dropped, the order of the kept rows is unchanged.
+    All the rows are kept in memory, see ``merge_recent_near_duplicates`` for the rows sorted by date.
+
+    Parameters
+    ----------
+    rows : Iterable[Dict[str, Any]]
+        The rows, e.g. from latest to oldest posted
+    index : Optional[NearDuplicateIndex], optional
+        Index of the jobs, by default a new one
+    fields : Sequence[str], optional
+        Fields of the first row to fill from the merged rows when empty, by default none
+
+    Returns
+    -------
+    List[Dict[str, Any]]
+        The rows without the near duplicates
+    """
+    rows = list(rows)
+    duplicates = set()
+    for position, first_position, row in iter_near_duplicates(rows, index=index):
+        merge_row(rows[first_position], row, fields=fields)
+        duplicates.add(position)
+    return [row for position, row in enumerate(rows) if position not in duplicates]
+
+
+def merge_recent_near_duplicates(rows: Iterable[Dict[str, Any]], window_days: int = NEAR_DUPLICATE_WINDOW_DAYS,
+                                 index: Optional[NearDuplicateIndex] = None,
+                                 fields: Sequence[str] = ()) -> Iterator[Dict[str, Any]]:
+    """Same as ``merge_near_duplicates`` for rows from latest to oldest posted, in one streaming pass
+
+    A row is only compared to the kept rows posted at most 'window_days' days after it: each kept row is yielded
+    (and removed from the index) as soon as a row posted more than 'window_days' days before it is read, so the
+    memory used depends on the number of jobs posted within 'window_days', not on the number of rows.
+    The rows without date (last, after the dated ones) are compared to all the rows still kept.
+
+    Parameters
+    ----------
+    rows : Iterable[Dict[str, Any]]
+        The rows sorted by 'posted_on' (ISO date 'YYYY-mm-dd', or None), latest first, e.g. ``JobStore.export_rows``
+    window_days : int, optional
+        Maximum number of days between the posted dates of two rows of the same job, by default 14
+    index : Optional[NearDuplicateIndex], optional
+        Index of the jobs, by default a new one
+    fields : Sequence[str], optional
+        Fields of the first row to fill from the merged rows when empty, by default none
+
+    Yields
+    ------
+    Dict[str, Any]
+        The rows without the near duplicates, in the same order
+    """
+    index = index if index is not None else NearDuplicateIndex()
+    # Kept rows not yielded yet, in order: (position, posted date)
+    pending: deque = deque()
+    kept: Dict[int, Dict[str, Any]] = {}
+    for position, row in enumerate(rows):
+        posted = date.fromisoformat(row['posted_on']) if row.get('posted_on') else None
+        while pending and posted is not None and pending[0][1] is not None and (pending[0][1] - posted).days > window_days:
+            first_position, _ = pending.popleft()
+            index.remove(first_position)
+            yield kept.pop(first_position)
+
+        duplicate_of = index.add(position, row['source'], row['ads_title'] or '', row['school'] or '',
+                                 row.get('description') or '')
+        if duplicate_of is None:
+            pending.append((position, posted))
+            kept[position] = row
+        else:
+            merge_row(kept[duplicate_of], row, fields=fields)
+
+    for position, _ in pending:
+        yield kept[position]
@@ -0,0 +1,167 @@
+import logging
+import multiprocessing
+import queue
+from types import SimpleNamespace
+from typing import Any, Dict, List, Sequence, Type
+
+from itemadapter import ItemAdapter
+from scrapy import Spider, signals
+from scrapy.crawler import CrawlerProcess
+from scrapy.exceptions import DropItem
+
+from instrumentation import RUN_REPORT
+from job_store import COMPLETED_CLOSE_REASONS, JOB_STORE, JobStore
+from pipelines import (JOB_TITLE_IGNORE_KEYWORDS, CrossSourceDeDuplicatesPipeline, DeDuplicatesPipeline,
+                       RemoveIgnoredKeywordsPipeline)
+
+logger = logging.getLogger(__name__)
+
+# Messages sent by the workers: (ITEM, spider name, item as dict), (CLOSED, spider name, close reason)
+# and (DONE, None, timings of the worker)
+ITEM = 'item'
+CLOSED = 'closed'
+DONE = 'done'
+
+# Set in each worker process, used by 'WorkerQueuePipeline'
+WORKER_QUEUE = None
+
+
+class WorkerQueuePipeline:
+    """ Stream the items of a worker process, then the close reason of the spider, to the parent process
+    (see ``run_workers``)
+    """
+    @classmethod
+    def from_crawler(cls, crawler):
+        pipeline = cls()
+        crawler.signals.connect(pipeline.spider_closed, signal=signals.spider_closed)
+        return pipeline
+
+    def spider_closed(self, spider, reason):
+        WORKER_QUEUE.put((CLOSED, spider.name, reason))
+
+    def process_item(self, item, spider):
+        WORKER_QUEUE.put((ITEM, spider.name, ItemAdapter(item).asdict()))
+        return item
+
+
+def crawl_worker(spider_classes: Sequence[Type[Spider]], settings: Dict[str, Any], worker_queue) -> None:
+    """Crawl some of the spiders in this process; the items are filtered, deduplicated and sorted by the parent"""
+    global WORKER_QUEUE
+    WORKER_QUEUE = worker_queue
+    try:
+        process = CrawlerProcess(settings={**settings, 'ITEM_PIPELINES': {'orchestrator.WorkerQueuePipeline': 8}})
+        for spidercls in spider_classes:
+            process.crawl(spidercls)
+        process.start()
+    finally:
+        worker_queue.put((DONE, None, RUN_REPORT.sections))
+
+
+class SpiderOrderedItems:
+    """ Filter, deduplicate and upsert the items sent by the workers into ``JOB_STORE``, spider by spider
+    in the order of 'spider_names'
+
+    The items of a spider are kept until the spider and all the spiders before it are closed, so the rows
+    (and the jobs board kept for a job posted on several of them) do not depend on the timing of the workers.
+    """
+    def __init__(self, spider_names: Sequence[str], keywords: Sequence[str] = JOB_TITLE_IGNORE_KEYWORDS,
+                 store: JobStore = JOB_STORE):
+        self.store = store
+        self.remove_ignored_keywords = RemoveIgnoredKeywordsPipeline(keywords=keywords)
+        self.cross_source_deduplicates = CrossSourceDeDuplicatesPipeline()
+        # Spider name -> its items not upserted yet, in the order of 'spider_names'
+        self.items: Dict[str, List[Dict[str, Any]]] = {name: [] for name in spider_names}
+        # Spider name -> its close reason
+        self.close_reasons: Dict[str, str] = {}
+
+    def add(self, kind: str, spider_name: str, payload: Any) -> None:
+        """Handle an ITEM or CLOSED message of a worker"""
+        if kind == CLOSED:
+            self.close_reasons[spider_name] = payload
+            while self.items and next(iter(self.items)) in self.close_reasons:
+                self._upsert_next_spider()
+        else:
+            self.items[spider_name].append(payload)
+
+    def close(self) -> None:
+        """Upsert the items of the spiders left, e.g. of a killed worker"""
+        while self.items:
+            self._upsert_next_spider()
+        self.store.commit()
+
+    def _upsert_next_spider(self) -> None:
+        spider_name = next(iter(self.items))
+        # The pipelines only need the name of the spider, e.g. the jobs board that exported a job first
+        spider = SimpleNamespace(name=spider_name)
+        # The ids of the ads are only unique inside one jobs board
+        pipelines: List[Any] = [self.remove_ignored_keywords, DeDuplicatesPipeline(), self.cross_source_deduplicates]
+        for item in self.items.pop(spider_name):
+            try:
+                for pipeline in pipelines:
+                    item = pipeline.process_item(item, spider)
+            except DropItem as e:
+                logger.info(f'Dropped item of {spider_name}: {e}')
+                continue
+            self.store.upsert(item, source=spider_name)
+
+        # As 'pipelines.JobStorePipeline' in one process
+        reason = self.close_reasons.get(spider_name)
+        if reason in COMPLETED_CLOSE_REASONS:
+            self.store.finish_run(spider_name)
+        else:
+            logger.warning(f'Run of {spider_name} not completed ({reason})')
+
+
+def run_workers(spider_classes: Sequence[Type[Spider]], settings: Dict[str, Any], workers: int) -> None:
+    """Crawl the spiders in 'workers' processes (each spider in one process) and upsert the items into ``JOB_STORE``
+
+    The items of all the workers go through the same filters as ``list_jobs.py`` in one process
+    (ignored keywords, per jobs board then cross-source deduplication), in the parent process, spider by spider
+    in the order of 'spider_classes' (see ``SpiderOrderedItems``): the csv file exported from ``JOB_STORE`` is the
+    one of a single process crawling the spiders one after the other, whatever the timing of the workers.
+    The workers do not share ``dedup.SEEN_ADS``, so they download the details pages of the cross-board
+    duplicates the single process crawl skips.
+
+    Parameters
+    ----------
+    spider_classes : Sequence[Type[Spider]]
+        The spiders to crawl, distributed over the workers in a round-robin way
+    settings : Dict[str, Any]
+        The crawler process settings ('ITEM_PIPELINES' is replaced in the workers)
+    workers : int
+        Number of worker processes, at most one per spider
+    """
+    # 'spawn': a fresh interpreter (and Twisted reactor) in each worker
+    context = multiprocessing.get_context('spawn')
+    worker_queue = context.Queue()
+    workers = max(1, min(workers, len(spider_classes)))
+    processes = [context.Process(target=crawl_worker,
+                                 args=(spider_classes[i::workers], settings, worker_queue),
+                                 name=f'crawl-worker-{i}')
+                 for i in range(workers)]
+    for process in processes:
+        process.start()
+
+    items = SpiderOrderedItems([spidercls.name for spidercls in spider_classes],
+                               keywords=settings.get('JOB_TITLE_IGNORE_KEYWORDS', JOB_TITLE_IGNORE_KEYWORDS))
+    running = len(processes)
+    while running:
+        try:
+            kind, spider_name, payload = worker_queue.get(timeout=5)
+        except queue.Empty:
+            # A worker killed before sending 'DONE'
+            if not any(process.is_alive() for process in processes):
+                break
+            continue
+
+        if kind == DONE:
+            running -= 1
+            RUN_REPORT.merge(payload)
+            continue
+        items.add(kind, spider_name, payload)
+    items.close()
+
+    for process in processes:
+        process.join()
+        if process.exitcode:
+            logger.error(f'{process.name} exited with code {process.exitcode}')
@@ -0,0 +1,127 @@
+import logging
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from scrapy.http import HtmlResponse, TextResponse
+from scrapy.utils.defer import maybe_deferred_to_future
+from twisted.internet.defer import Deferred
+from twisted.python.failure import Failure
+
+logger = logging.getLogger(__name__)
+
+# A details page parser: a module-level function (pickled by name) of a response returning plain, picklable data
+PageParser = Callable[[TextResponse], Dict[str, Any]]
+
+
+def parse_body(parser: PageParser, url: str, body: bytes, encoding: str) -> Dict[str, Any]:
+    """Run 'parser' on the response rebuilt from its url, body and encoding (in a worker process)"""
+    return parser(HtmlResponse(url=url, body=body, encoding=encoding))
+
+
+def deferred_from_future(future: Future) -> Deferred:
+    """Deferred fired in the reactor thread with the result of a ``concurrent.futures.Future``"""
+    # Imported once the crawler installed its reactor (see 'daemon.run_daemon')
+    from twisted.internet import reactor
+
+    deferred = Deferred()
+
+    def fire(done: Future) -> None:
+        if done.exception() is not None:
+            deferred.errback(Failure(done.exception()))
+        else:
+            deferred.callback(done.result())
+
+    future.add_done_callback(lambda done: reactor.callFromThread(fire, done))
+    return deferred
+
+
+class ParsePool:
+    """Pool of worker processes parsing the details pages off the reactor thread
+
+    The spider callbacks await ``parse``: the reactor keeps downloading the other pages meanwhile,
+    so the network I/O and the parsing of the pages overlap. The workers are started (with 'spawn',
+    forking a process running the reactor threads is unsafe) at the first page and reused for the next ones.
+
+    Parameters
+    ----------
+    workers : int
+        Number of worker processes
+    """
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.stops_with_reactor = False
+
+    def start(self) -> ProcessPoolExecutor:
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                mp_context=multiprocessing.get_context('spawn'))
+        return self.executor
+
+    def shutdown(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+    def stop_with_reactor(self) -> None:
+        """Shut the workers down before the reactor stops (once per pool)"""
+        if self.stops_with_reactor:
+            return
+        # Imported once the crawler installed its reactor (see 'daemon.run_daemon')
+        from twisted.internet import reactor
+
+        reactor.addSystemEventTrigger('before', 'shutdown', self.shutdown)
+        self.stops_with_reactor = True
+
+    async def parse(self, parser: PageParser, response: TextResponse) -> Dict[str, Any]:
+        """The result of 'parser' on the response, computed by a worker process"""
+        executor = self.start()
+        future = executor.submit(parse_body, parser, response.url, response.body, response.encoding)
+        try:
+            return await maybe_deferred_to_future(deferred_from_future(future))
+        except BrokenProcessPool:
+            # A worker died (e.g. killed out of memory): parse the page here, and start new workers for the next ones
+            logger.warning(f'Parse pool broken, parsing {response.url} in the reactor thread')
+            # The other pages parsed by the broken pool fail too, after new workers may have been started
+            if self.executor is executor:
+                self.executor = None
+            executor.shutdown(wait=False)
+            return parser(response)
+
+
+# Pool shared by all the crawlers of one 'CrawlerProcess'
+SHARED_PARSE_POOL: Optional[ParsePool] = None
+
+
+class ParsePoolExtension:
+    """Attach a ``ParsePool`` of 'PARSE_POOL_WORKERS' processes to each spider as ``spider.parse_pool``
+
+    The spiders with a ``parse_pool`` parse their details pages in the pool (their 'parse_ads' callbacks become
+    asynchronous); the workers are kept for the next crawls of the process (e.g. with 'list_jobs.py --daemon')
+    and stopped with the reactor. Enable it with:
+        'EXTENSIONS': {'parse_pool.ParsePoolExtension': 500},
+        'PARSE_POOL_WORKERS': 2,
+    """
+    def __init__(self, pool: ParsePool):
+        self.pool = pool
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        workers = crawler.settings.getint('PARSE_POOL_WORKERS')
+        if workers <= 0:
+            raise NotConfigured
+
+        global SHARED_PARSE_POOL
+        if SHARED_PARSE_POOL is None:
+            SHARED_PARSE_POOL = ParsePool(workers)
+        ext = cls(pool=SHARED_PARSE_POOL)
+        crawler.signals.connect(ext.spider_opened, signal=signals.spider_opened)
+        return ext
+
+    def spider_opened(self, spider):
+        self.pool.stop_with_reactor()
+        spider.parse_pool = self.pool
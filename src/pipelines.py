@@ -0,0 +1,115 @@
+import re
+from typing import Sequence
+
+# useful for handling different item types with a single interface
+from itemadapter import ItemAdapter
+from scrapy import signals
+from scrapy.exceptions import DropItem
+
+from dedup import SEEN_ADS, dedup_key
+from instrumentation import timed_pipeline
+from job_store import COMPLETED_CLOSE_REASONS, JOB_STORE
+
+# Default of the 'JOB_TITLE_IGNORE_KEYWORDS' setting; each keyword is a regex, matched case-insensitively
+JOB_TITLE_IGNORE_KEYWORDS = ['post-doc', 'postdoc', 'post doc', 'scientist']
+
+FIELDS_TO_EXPORT = ['ads_title', 'posted_date', 'priority_date', 'category',
+                    'school', 'department', 'specialization',
+                    'rank', 'city', 'state', 'canada',
+                    'current_status', 'comments1', 'comments2',
+                    'ads_source', 'ads_job_code'
+                    ]
+
+
+@timed_pipeline
+class RemoveIgnoredKeywordsPipeline:
+    """ Remove jobs ads with 'ads_title' containing one of the words in the 'JOB_TITLE_IGNORE_KEYWORDS' setting
+
+    All the keywords are compiled into one case-insensitive alternation, so each title is scanned only once.
+    """
+    def __init__(self, keywords: Sequence[str] = JOB_TITLE_IGNORE_KEYWORDS):
+        self.ignored_keywords_pattern = re.compile('|'.join(f'(?:{keyword})' for keyword in keywords),
+                                                   re.IGNORECASE)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(keywords=crawler.settings.getlist('JOB_TITLE_IGNORE_KEYWORDS', JOB_TITLE_IGNORE_KEYWORDS))
+
+    def process_item(self, item, spider):
+        adapter = ItemAdapter(item)
+        match = self.ignored_keywords_pattern.search(adapter['ads_title'])
+        if match:
+            # Scrapy already logs the dropped item, only the title is needed in the message
+            raise DropItem(f"'{match[0]}' item found: {adapter['ads_title']!r}")
+        return item
+
+
+@timed_pipeline
+class DeDuplicatesPipeline:
+    """ Remove duplication based on the ID of each ads for the specific jobs board """
+
+    def __init__(self):
+        self.ids_seen = set()
+
+    def process_item(self, item, spider):
+        adapter = ItemAdapter(item)
+        ads_job_code = adapter.get('ads_job_code')
+        if ads_job_code:
+            if ads_job_code in self.ids_seen:
+                raise DropItem(f"Duplicate item found: {ads_job_code!r}")
+            self.ids_seen.add(ads_job_code)
+        return item
+
+
+@timed_pipeline
+class CrossSourceDeDuplicatesPipeline:
+    """ Remove the same job posted on several jobs boards, based on the normalized 'ads_title' and school name
+
+    The index of seen jobs is shared by all the spiders of the process.
+    It is also attached to the spider as ``spider.seen_ads`` so the spider can skip
+    the requests of a job already exported by another spider.
+    """
+    def __init__(self):
+        self.seen_ads = SEEN_ADS
+
+    def open_spider(self, spider):
+        spider.seen_ads = self.seen_ads
+
+    def process_item(self, item, spider):
+        adapter = ItemAdapter(item)
+        key = dedup_key(adapter.get('ads_title'), adapter.get('school'))
+        source = spider.name
+        if self.seen_ads.is_duplicate(key, source):
+            raise DropItem(f"Duplicate item found on another jobs board: {adapter.get('ads_title')!r}")
+        self.seen_ads.add(key, source=source)
+        return item
+
+
+@timed_pipeline
+class JobStorePipeline:
+    """ Upsert the items into ``JOB_STORE`` (history of all the jobs); the csv files are exported by the caller after the crawl
+
+    The run of the spider is only marked completed in ``JOB_STORE`` when the spider closes for one of
+    'COMPLETED_CLOSE_REASONS': until then, the jobs of its previous completed run are exported.
+    """
+    def __init__(self):
+        self.store = JOB_STORE
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        pipeline = cls()
+        crawler.signals.connect(pipeline.spider_closed, signal=signals.spider_closed)
+        return pipeline
+
+    def close_spider(self, spider):
+        self.store.commit()
+
+    def spider_closed(self, spider, reason):
+        if reason in COMPLETED_CLOSE_REASONS:
+            self.store.finish_run(spider.name)
+        else:
+            spider.logger.warning(f'Run not completed ({reason}), the jobs of the previous run are still exported')
+
+    def process_item(self, item, spider):
+        self.store.upsert(item, source=spider.name)
+        return item
@@ -0,0 +1,95 @@
+import re
+from datetime import datetime, timezone
+from typing import Optional
+
+from parsel import Selector
+
+# Only jobs posted in this many days are exported (same as 'is_posted_in_the_past_five_days' in the spiders)
+POSTING_WINDOW_DAYS = 5
+
+# Madgex job boards (C&EN, Chronicle) show the age of each ads in the listing footer, e.g. '3 days ago'
+LISTING_AGE_PATTERN = re.compile(r'\b(?:(\d+)|an?)\s+(minute|hour|day|week|month|year)s?\s+ago\b|\b(today|yesterday)\b',
+                                 re.IGNORECASE)
+DAYS_PER_UNIT = {'minute': 0, 'hour': 0, 'day': 1, 'week': 7, 'month': 30, 'year': 365}
+# C&E News only shows the green 'New' badge for jobs posted in the past 2 days
+NEW_BADGE_MAX_AGE_DAYS = 2
+
+# Set by 'freeze_now' (e.g. to the time of a recording being replayed), None for the real current time
+_frozen_now: Optional[datetime] = None
+
+
+def freeze_now(moment: Optional[datetime]) -> None:
+    """Make 'current_time' return 'moment' (None to go back to the real current time)"""
+    global _frozen_now
+    _frozen_now = moment
+
+
+def current_time(tz=timezone.utc) -> datetime:
+    """The current time used to check the posting window, in the 'tz' timezone"""
+    return (_frozen_now or datetime.now(tz=timezone.utc)).astimezone(tz)
+
+
+def listing_age_in_days(text: str) -> Optional[int]:
+    """Convert the relative posted date of a listing (e.g. '3 days ago', 'about 1 hour ago', 'yesterday') into days
+
+    Parameters
+    ----------
+    text : str
+        The text of the listing that may contain the relative posted date
+
+    Returns
+    -------
+    Optional[int]
+        Age of the ads in days, None if no posted date can be found in the text
+    """
+    match = LISTING_AGE_PATTERN.search(text)
+    if not match:
+        return None
+
+    number, unit, word = match.groups()
+    if word:
+        return 0 if word.lower() == 'today' else 1
+    return int(number or 1) * DAYS_PER_UNIT[unit.lower()]
+
+
+def listing_age(job: Selector) -> Optional[int]:
+    """Age in days of a Madgex listing ('.lister__details' selector) from its footer, None if it does not tell"""
+    footer_text = ' '.join(job.xpath('.//following-sibling::*[contains(@class, "lister__footer")]//text()').getall())
+    return listing_age_in_days(footer_text)
+
+
+def has_new_badge(job: Selector) -> bool:
+    """Whether a Madgex listing ('.lister__details' selector) shows the green 'New' badge"""
+    return bool(job.xpath('./ancestor::*[contains(@class, "lister__item")][1]//*[contains(@class, "badge--green")]'))
+
+
+def estimated_listing_age(job: Selector) -> Optional[int]:
+    """Age in days of a Madgex listing from its footer, or 'NEW_BADGE_MAX_AGE_DAYS' if it only shows the 'New' badge,
+    None if it tells neither
+    """
+    age = listing_age(job)
+    if age is None and has_new_badge(job):
+        return NEW_BADGE_MAX_AGE_DAYS
+    return age
+
+
+def listing_freshness(job: Selector, window_days: int = POSTING_WINDOW_DAYS) -> Optional[bool]:
+    """Tell whether a Madgex listing ('.lister__details' selector) is inside the posting window
+
+    The posted date in the listing footer is used first, then the green 'New' badge
+    (C&E News only shows it for jobs posted in the past 2 days).
+
+    Returns
+    -------
+    Optional[bool]
+        True if the ads is inside the window, False if it is older,
+        None if the listing does not tell (the details page has to be checked)
+    """
+    age = listing_age(job)
+    if age is not None:
+        return age <= window_days
+
+    if has_new_badge(job):
+        return True
+
+    return None
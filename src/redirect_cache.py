@@ -0,0 +1,114 @@
+import json
+from datetime import datetime, timedelta, timezone
+from pathlib import Path, PurePath
+from typing import Dict, Optional
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured, StopDownload
+
+CURRENT_FILEPATH = Path(__file__).resolve().parent
+DATA_FOLDER = CURRENT_FILEPATH.parent / 'data'
+REDIRECT_CACHE_FILE = DATA_FOLDER / 'redirect_cache.json'
+
+# The application url of a job rarely changes while the ads is online
+REDIRECT_CACHE_TTL_DAYS = 14
+
+# request.meta key of the requests only sent to learn where they are redirected:
+# the download stops as soon as the headers of the final response arrive, the body is never downloaded
+HEADERS_ONLY_META = 'headers_only'
+
+
+class RedirectCache:
+    """Persistent 'apply url -> final application url' pairs, shared by all the spiders
+
+    Each entry expires 'ttl_days' after it was resolved. The time is read on each use:
+    the cache lives as long as the process (e.g. 'list_jobs.py --daemon'), not one run.
+    """
+    def __init__(self, file: PurePath, ttl_days: int = REDIRECT_CACHE_TTL_DAYS):
+        self.file = Path(file)
+        self.ttl_days = ttl_days
+        self.entries: Dict[str, Dict[str, str]] = {}
+
+    def load(self) -> 'RedirectCache':
+        if self.file.exists():
+            with open(self.file, 'r') as f_in:
+                self.entries = json.load(f_in)
+        return self
+
+    def save(self) -> None:
+        """Write the cache back to disk, without the expired entries
+
+        The urls saved meanwhile by another process (e.g. another worker of 'list_jobs.py --workers') are kept,
+        the latest resolved url wins.
+        """
+        entries = RedirectCache(self.file).load().entries
+        oldest_resolved = self.oldest_resolved()
+        for apply_url, entry in self.entries.items():
+            if apply_url not in entries or entries[apply_url]['resolved_at'] <= entry['resolved_at']:
+                entries[apply_url] = entry
+        entries = {apply_url: entry for apply_url, entry in entries.items()
+                   if entry['resolved_at'] >= oldest_resolved}
+
+        self.file.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.file, 'w') as f_out:
+            json.dump(entries, f_out, indent=1, sort_keys=True)
+
+    def get(self, apply_url: str) -> Optional[str]:
+        """The final url 'apply_url' redirected to (None if unknown or expired)"""
+        entry = self.entries.get(apply_url)
+        if entry is None or entry['resolved_at'] < self.oldest_resolved():
+            return None
+        return entry['url']
+
+    def set(self, apply_url: str, url: str) -> None:
+        self.entries[apply_url] = {'url': url, 'resolved_at': datetime.now(tz=timezone.utc).isoformat()}
+
+    def oldest_resolved(self) -> str:
+        """Resolution time (ISO format) of the oldest entry not expired yet"""
+        return (datetime.now(tz=timezone.utc) - timedelta(days=self.ttl_days)).isoformat()
+
+
+# Cache file -> cache shared by all the crawlers of one 'CrawlerProcess'
+SHARED_REDIRECT_CACHES: Dict[Path, RedirectCache] = {}
+
+
+class RedirectCacheExtension:
+    """Attach the ``RedirectCache`` to each spider as ``spider.redirect_cache`` and save it when the spiders close
+
+    It also stops the download of the requests with ``meta={'headers_only': True}`` once their headers
+    are received (the redirects are still followed by the redirect middleware, using the 'Location' header).
+    A GET aborted after the headers is used instead of a HEAD request since many career sites answer HEAD with 405.
+    Enable it in the settings with:
+        'EXTENSIONS': {'redirect_cache.RedirectCacheExtension': 500},
+        'REDIRECT_CACHE_ENABLED': True,
+    """
+    def __init__(self, cache: RedirectCache):
+        self.cache = cache
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('REDIRECT_CACHE_ENABLED'):
+            raise NotConfigured
+
+        # One cache per file for all the crawlers of the process, so no spider overwrites the urls of the others
+        file = Path(crawler.settings.get('REDIRECT_CACHE_FILE', REDIRECT_CACHE_FILE))
+        cache = SHARED_REDIRECT_CACHES.get(file)
+        if cache is None:
+            cache = SHARED_REDIRECT_CACHES[file] = RedirectCache(
+                file, ttl_days=crawler.settings.getint('REDIRECT_CACHE_TTL_DAYS', REDIRECT_CACHE_TTL_DAYS)).load()
+        ext = cls(cache=cache)
+        crawler.signals.connect(ext.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(ext.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(ext.headers_received, signal=signals.headers_received)
+        return ext
+
+    def spider_opened(self, spider):
+        spider.redirect_cache = self.cache
+
+    def spider_closed(self, spider, reason):
+        self.cache.save()
+
+    def headers_received(self, headers, body_length, request, spider):
+        if request.meta.get(HEADERS_ONLY_META):
+            # fail=False: the (bodyless) response still goes to the callback
+            raise StopDownload(fail=False)
@@ -1,14 +1,29 @@
 from __future__ import print_function
-import pickle
-import os.path
-from pathlib import Path
-from googleapiclient.discovery import build
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
+import csv
+# import pickle
+# import os.path
+import shutil
+from pathlib import Path, PurePath
+from bisect import bisect_left
+from collections import deque
+from typing import Deque, Dict, Hashable, List, Set, Tuple
+# Only used by the OAuth flow (commented out in 'write_csv_to_google_sheet'), slow to import
+# from googleapiclient.discovery import build
+# from google_auth_oauthlib.flow import InstalledAppFlow
+# from google.auth.transport.requests import Request
 import gspread
+from gspread.utils import rowcol_to_a1
+
+from dedup import hyperlink_parts
 
 
 CURRENT_FILEPATH = Path(__file__).resolve().parent
+DATA_FOLDER = CURRENT_FILEPATH.parent / 'data'
+
+# Copy of the csv file last pushed to the google sheet, used to only send the changed rows
+SHEET_SNAPSHOT = DATA_FOLDER / 'sheet_snapshot.csv'
+# Columns identifying a job row across two pushes (the ads_source url, not its jobs board names that may be merged)
+ROW_KEY_COLUMNS = ('ads_source', 'ads_job_code')
 
 # !DO NOT commit these following files
 TOKEN = CURRENT_FILEPATH / '../token.pickle'
@@ -22,7 +37,7 @@ SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
 SAMPLE_SPREADSHEET_ID = '1b5VO-whcFQ-JosSKgQFov89jF8UoqyWXxCgnKtuU9gk'
 SAMPLE_RANGE_NAME = ''
 
-def write_csv_to_google_sheet(file):
+def write_csv_to_google_sheet(file, client=None):
     """Shows basic usage of the Sheets API.
     Prints values from a sample spreadsheet.
     """
@@ -58,7 +73,7 @@ def write_csv_to_google_sheet(file):
     # Check how to get `credentials`:
     # https://github.com/burnash/gspread
 
-    gc = gspread.service_account(filename=CREDENTIALS)
+    gc = client or gspread.service_account(filename=CREDENTIALS)
 
     # Read CSV file contents
     with open(file, 'rb') as f_in:
@@ -87,5 +102,237 @@ def write_csv_to_google_sheet(file):
     })
 
 
+def read_csv_rows(file: PurePath) -> List[List[str]]:
+    """Read all the rows (header included) of a csv file, an empty list if the file does not exist"""
+    if not Path(file).exists():
+        return []
+    with open(file, 'r', newline='') as f_in:
+        return list(csv.reader(f_in))
+
+
+def write_csv_rows(file: PurePath, rows: List[List[str]]) -> None:
+    """Write all the rows (header included) of a csv file"""
+    with open(file, 'w', newline='') as f_out:
+        csv.writer(f_out).writerows(rows)
+
+
+def diff_rows(old_rows: List[List[str]], new_rows: List[List[str]]) -> List[Tuple[int, List[List[str]]]]:
+    """Compare 2 versions of the sheet row by row
+
+    Rows only in 'old_rows' (the sheet got shorter) are replaced by empty rows.
+
+    Parameters
+    ----------
+    old_rows : List[List[str]]
+        The rows currently in the google sheet
+    new_rows : List[List[str]]
+        The rows that should be in the google sheet
+
+    Returns
+    -------
+    List[Tuple[int, List[List[str]]]]
+        Blocks of consecutive changed rows, as (1-based index of the first row, new values of the rows)
+    """
+    width = max((len(row) for row in old_rows + new_rows), default=0)
+    blocks = []
+    for index in range(max(len(old_rows), len(new_rows))):
+        old_row = old_rows[index] if index < len(old_rows) else None
+        new_row = new_rows[index] if index < len(new_rows) else []
+        if old_row == new_row:
+            continue
+
+        values = new_row + [''] * (width - len(new_row))
+        if blocks and blocks[-1][0] + len(blocks[-1][1]) == index + 1:
+            blocks[-1][1].append(values)
+        else:
+            blocks.append((index + 1, [values]))
+    return blocks
+
+
+def row_keys(rows: List[List[str]]) -> List[Hashable]:
+    """Key of each row after the header: its 'ROW_KEY_COLUMNS' values (hyperlinks reduced to their url),
+    the whole row if the header has none of them
+    """
+    header = rows[0] if rows else []
+    columns = [header.index(column) for column in ROW_KEY_COLUMNS if column in header]
+
+    def cell_key(row: List[str], column: int) -> str:
+        cell = row[column] if column < len(row) else ''
+        url, label = hyperlink_parts(cell)
+        return url or label
+
+    if not columns:
+        return [tuple(row) for row in rows[1:]]
+    return [tuple(cell_key(row, column) for column in columns) for row in rows[1:]]
+
+
+def longest_increasing(values: List[int]) -> List[int]:
+    """Positions in 'values' of one of their longest strictly increasing subsequences"""
+    # Last value / position of the best subsequence of each length, and the position before each one in its subsequence
+    tails: List[int] = []
+    tail_positions: List[int] = []
+    previous = [-1] * len(values)
+    for position, value in enumerate(values):
+        length = bisect_left(tails, value)
+        if length == len(tails):
+            tails.append(value)
+            tail_positions.append(position)
+        else:
+            tails[length] = value
+            tail_positions[length] = position
+        previous[position] = tail_positions[length - 1] if length else -1
+
+    positions = []
+    position = tail_positions[-1] if tail_positions else -1
+    while position != -1:
+        positions.append(position)
+        position = previous[position]
+    return positions[::-1]
+
+
+def plan_row_changes(old_rows: List[List[str]], new_rows: List[List[str]]
+                     ) -> Tuple[List[Tuple[int, int]], List[Tuple[int, int]], List[List[str]]]:
+    """Rows to delete from and insert into the sheet so the rows of the same job stay in place
+
+    The csv is written from latest to oldest: a new ad at the top would shift every row below it,
+    and a positional diff would resend all of them. Instead the rows of the same job (same key) in the same order
+    in both versions stay in place, the other old rows are deleted (removed or moved jobs), empty rows are inserted
+    where the other new rows go, and only then the rows are compared one by one.
+
+    Parameters
+    ----------
+    old_rows : List[List[str]]
+        The rows currently in the google sheet, header included
+    new_rows : List[List[str]]
+        The rows that should be in the google sheet, header included
+
+    Returns
+    -------
+    Tuple[List[Tuple[int, int]], List[Tuple[int, int]], List[List[str]]]
+        The deleted blocks of rows, from the bottom, and the inserted blocks of empty rows, from the top,
+        as (1-based index of the first row, number of rows) to apply in this order; then the rows of the sheet
+        once they are applied (the inserted rows empty), to compare with 'new_rows' with ``diff_rows``
+    """
+    if not old_rows or not new_rows:
+        return [], [], old_rows
+
+    old_keys, new_keys = row_keys(old_rows), row_keys(new_rows)
+    # Old rows of each key, in order: the n-th new row of a key is the n-th old row of the key
+    old_indexes: Dict[Hashable, Deque[int]] = {}
+    for index, key in enumerate(old_keys):
+        old_indexes.setdefault(key, deque()).append(index)
+    matches = [(index, old_indexes[key].popleft()) for index, key in enumerate(new_keys) if old_indexes.get(key)]
+    # The most rows kept in the same order; the other matched rows moved (e.g. their posted date changed)
+    in_order = [matches[position] for position in longest_increasing([old_index for _, old_index in matches])]
+    kept_new: Set[int] = {new_index for new_index, _ in in_order}
+    kept_old: Set[int] = {old_index for _, old_index in in_order}
+
+    deleted: List[Tuple[int, int]] = []
+    for index in range(len(old_keys)):
+        if index in kept_old:
+            continue
+        # Sheet row of the old row 'index', after the header
+        row = index + 2
+        if deleted and deleted[-1][0] + deleted[-1][1] == row:
+            deleted[-1] = (deleted[-1][0], deleted[-1][1] + 1)
+        else:
+            deleted.append((row, 1))
+    deleted.reverse()
+
+    rows = [old_rows[0]] + [row for index, row in enumerate(old_rows[1:]) if index in kept_old]
+    inserted: List[Tuple[int, int]] = []
+    for index in range(len(new_keys)):
+        if index in kept_new:
+            continue
+        row = index + 2
+        if row > len(rows):
+            # Past the last row: written without inserting rows (see 'sync_csv_to_google_sheet')
+            break
+        rows.insert(row - 1, [])
+        if inserted and inserted[-1][0] + inserted[-1][1] == row:
+            inserted[-1] = (inserted[-1][0], inserted[-1][1] + 1)
+        else:
+            inserted.append((row, 1))
+    return deleted, inserted, rows
+
+
+def sync_csv_to_google_sheet(file: PurePath, snapshot_file: PurePath = SHEET_SNAPSHOT, client=None) -> int:
+    """Update the google sheet with the rows that changed since the last push
+
+    Without a snapshot of the last push, the whole csv file is imported with ``write_csv_to_google_sheet``.
+    Otherwise the rows of the removed jobs are deleted and empty rows are inserted for the new ones
+    (see ``plan_row_changes``) in one batch update, then the new and changed rows are sent in one batched
+    values update; the Sheets API is not called at all if nothing changed.
+    The snapshot is written after each successful update, so it is still the content of the sheet
+    when the next one fails (e.g. the inserted rows still empty) and the next push sends what is missing.
+
+    Parameters
+    ----------
+    file : PurePath
+        csv file to push
+    snapshot_file : PurePath, optional
+        Copy of the csv file last pushed, by default SHEET_SNAPSHOT
+    client : optional
+        A gspread client (or a fake one with the same interface), by default a service account client
+
+    Returns
+    -------
+    int
+        The number of rows sent to the google sheet
+    """
+    new_rows = read_csv_rows(file)
+
+    if not Path(snapshot_file).exists():
+        write_csv_to_google_sheet(file, client=client)
+        shutil.copyfile(file, snapshot_file)
+        return len(new_rows)
+
+    deleted, inserted, rows = plan_row_changes(read_csv_rows(snapshot_file), new_rows)
+    blocks = diff_rows(rows, new_rows)
+    if not (deleted or inserted or blocks):
+        return 0
+
+    gc = client or gspread.service_account(filename=CREDENTIALS)
+    spreadsheet = gc.open_by_key(SAMPLE_SPREADSHEET_ID)
+    worksheet = spreadsheet.get_worksheet(0)
+
+    row_count = worksheet.row_count
+    if deleted or inserted:
+        spreadsheet.batch_update({
+            'requests': [
+                {'deleteDimension': {'range': {'sheetId': worksheet.id, 'dimension': 'ROWS',
+                                               'startIndex': start - 1, 'endIndex': start - 1 + count}}}
+                for start, count in deleted
+            ] + [
+                {'insertDimension': {'range': {'sheetId': worksheet.id, 'dimension': 'ROWS',
+                                               'startIndex': start - 1, 'endIndex': start - 1 + count},
+                                     'inheritFromBefore': False}}
+                for start, count in inserted
+            ]
+        })
+        row_count += sum(count for _, count in inserted) - sum(count for _, count in deleted)
+        write_csv_rows(snapshot_file, rows)
+
+    if blocks:
+        last_row = max(start + len(values) - 1 for start, values in blocks)
+        if last_row > row_count:
+            worksheet.add_rows(last_row - row_count)
+
+        # 'USER_ENTERED' so the '=hyperlink(...)' formulas are parsed, as 'import_csv' does
+        spreadsheet.values_batch_update({
+            'valueInputOption': 'USER_ENTERED',
+            'data': [
+                {
+                    'range': f"'{worksheet.title}'!A{start}:{rowcol_to_a1(start + len(values) - 1, len(values[0]))}",
+                    'values': values,
+                }
+                for start, values in blocks
+            ]
+        })
+    shutil.copyfile(file, snapshot_file)
+
+    return sum(len(values) for _, values in blocks)
+
+
 if __name__ == '__main__':
     write_csv_to_google_sheet(CURRENT_FILEPATH / 'jobs.csv')
\ No newline at end of file
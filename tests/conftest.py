@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The modules of 'src' import each other by name, as when running 'python src/list_jobs.py'
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
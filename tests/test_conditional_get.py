@@ -0,0 +1,129 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+from scrapy import Request
+from scrapy.http import HtmlResponse
+
+import posting_window
+from conditional_get import (CONDITIONAL_GET_META, VALIDATORS_META, ConditionalGetSpiderMiddleware,
+                             ConditionalGetStore, is_in_window)
+from crawl_state import CrawlState
+from items import JobItem
+
+NOW = datetime(2024, 3, 10, 9, 30, tzinfo=timezone.utc)
+
+
+@pytest.fixture(autouse=True)
+def frozen_now():
+    posting_window.freeze_now(NOW)
+    yield
+    posting_window.freeze_now(None)
+
+
+def item(job_code, posted_at):
+    return {'ads_job_code': job_code, 'posted_date': posted_at.strftime('%m/%d/%Y'),
+            'posted_at': posted_at.isoformat()}
+
+
+@pytest.mark.parametrize('posted_at, in_window', [
+    (NOW - timedelta(days=30), True),
+    (NOW - timedelta(days=30, hours=23), True),
+    # 31 full days ago, but only 30 days after the midnight of its 'posted_date': the spiders drop it
+    (NOW - timedelta(days=31, hours=1), False),
+    (NOW - timedelta(days=32), False),
+])
+def test_is_in_window_uses_the_posting_time(posted_at, in_window):
+    assert is_in_window(item('1', posted_at), window_days=30) is in_window
+
+
+def test_is_in_window_falls_back_to_the_posted_date():
+    assert is_in_window({'posted_date': (NOW - timedelta(days=30)).strftime('%m/%d/%Y')}, window_days=30)
+    assert not is_in_window({'posted_date': (NOW - timedelta(days=32)).strftime('%m/%d/%Y')}, window_days=30)
+    assert is_in_window({}, window_days=30)
+
+
+def middleware_with(tmp_path, entries):
+    middleware = ConditionalGetSpiderMiddleware(crawler=None)
+    middleware.store = ConditionalGetStore(tmp_path / 'spider.json')
+    middleware.store.entries = entries
+    return middleware
+
+
+def test_reused_items_refresh_the_crawl_state(tmp_path):
+    crawl_state = CrawlState(tmp_path / 'state.json', max_age_days=7)
+    crawl_state.record('known', NOW - timedelta(days=3))
+    crawl_state.entries['known']['last_seen'] = (NOW - timedelta(days=6)).isoformat()
+    crawl_state.now = NOW
+    items = [item('known', NOW - timedelta(days=3)), item('forgotten', NOW - timedelta(days=2)),
+             item('old', NOW - timedelta(days=40))]
+    middleware = middleware_with(tmp_path, {'https://board/feed': {'body_hash': 'x', 'items': items}})
+    spider = SimpleNamespace(window_days=30, crawl_state=crawl_state)
+
+    reused = middleware._reuse_items('https://board/feed', spider)
+
+    assert [job['ads_job_code'] for job in reused] == ['known', 'forgotten']
+    assert crawl_state.entries['known']['last_seen'] == NOW.isoformat()
+    assert crawl_state.entries['forgotten']['item']['ads_job_code'] == 'forgotten'
+    assert 'old' not in crawl_state.entries
+
+
+def test_start_urls_not_requested_are_pruned(tmp_path):
+    entries = {'https://board/feed?updated-min=2024-03-09': {'body_hash': 'x', 'items': []},
+               'https://board/feed?updated-min=2024-03-10': {'body_hash': 'y', 'items': []}}
+    middleware = middleware_with(tmp_path, entries)
+    middleware._reuse_items('https://board/feed?updated-min=2024-03-10', SimpleNamespace())
+
+    middleware.spider_closed(spider=None, reason='finished')
+
+    assert list(ConditionalGetStore(tmp_path / 'spider.json').load().entries) == [
+        'https://board/feed?updated-min=2024-03-10']
+
+
+def changed_response(url='https://board/feed'):
+    request = Request(url, meta={CONDITIONAL_GET_META: url,
+                                 VALIDATORS_META: {'etag': '"v2"', 'last_modified': None, 'body_hash': 'z'}})
+    return HtmlResponse(url, body=b'<html></html>', encoding='utf-8', request=request)
+
+
+async def outputs_of(produced):
+    """Two items and a request, 'produced' telling how many the callback gave so far"""
+    for output in (JobItem(ads_job_code='1'), Request('https://board/job/2'), JobItem(ads_job_code='3')):
+        produced.append(output)
+        yield output
+
+
+def test_async_outputs_are_yielded_as_they_come(tmp_path):
+    middleware = middleware_with(tmp_path, {})
+    response = changed_response()
+    produced = []
+    outputs = middleware.process_spider_output_async(response, outputs_of(produced), SimpleNamespace())
+
+    async def consume():
+        first = await outputs.__anext__()
+        assert len(produced) == 1 and first['ads_job_code'] == '1'
+        # Recorded after the last output only
+        assert 'body_hash' not in middleware.pending['https://board/feed']
+        return [first] + [output async for output in outputs]
+
+    consumed = asyncio.run(consume())
+
+    assert consumed[1].meta[CONDITIONAL_GET_META] == 'https://board/feed'
+    assert middleware.pending['https://board/feed'] == {
+        'etag': '"v2"', 'last_modified': None, 'body_hash': 'z',
+        'items': [{'ads_job_code': '1'}, {'ads_job_code': '3'}]}
+
+
+def test_start_url_of_a_failed_callback_is_not_stored(tmp_path):
+    middleware = middleware_with(tmp_path, {})
+
+    def failing_callback():
+        yield JobItem(ads_job_code='1')
+        raise ValueError('layout changed')
+
+    with pytest.raises(ValueError):
+        list(middleware.process_spider_output(changed_response(), failing_callback(), SimpleNamespace()))
+    middleware.spider_closed(spider=None, reason='finished')
+
+    assert ConditionalGetStore(tmp_path / 'spider.json').load().entries == {}
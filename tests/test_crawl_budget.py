@@ -0,0 +1,37 @@
+import pytest
+from parsel import Selector
+from scrapy import Request
+
+from crawl_budget import LISTING_AGE_META, request_priority
+from posting_window import estimated_listing_age
+
+LISTING = '''<ul><li class="lister__item">{badge}
+  <div class="lister__details"><h3>Assistant Professor of Chemistry</h3></div>
+  <ul class="lister__footer"><li>{footer}</li></ul>
+</li></ul>'''
+
+
+def details(badge='', footer=''):
+    return Selector(text=LISTING.format(badge=badge, footer=footer)).css('.lister__details')[0]
+
+
+def parse_ads(response):
+    pass
+
+
+@pytest.mark.parametrize('job, age', [
+    (details(footer='3 days ago'), 3),
+    (details(badge='<span class="badge badge--green">New</span>', footer='3 days ago'), 3),
+    # Only the 'New' badge: posted in the past 2 days
+    (details(badge='<span class="badge badge--green">New</span>'), 2),
+    (details(), None),
+])
+def test_estimated_listing_age(job, age):
+    assert estimated_listing_age(job) == age
+
+
+def test_badge_only_ads_are_inside_the_window():
+    request = Request('https://board/job/1', callback=parse_ads,
+                      meta={LISTING_AGE_META: estimated_listing_age(details(badge='<span class="badge--green">New</span>'))})
+    assert request_priority(request, window_days=5) >= 0
+    assert request_priority(Request('https://board/job/2', callback=parse_ads), window_days=5) < 0
@@ -0,0 +1,22 @@
+from types import SimpleNamespace
+
+from daemon import SpiderSchedule
+
+
+class FakeStats:
+    def __init__(self, finish_reason):
+        self.finish_reason = finish_reason
+
+    def get_value(self, key):
+        return {'finish_reason': self.finish_reason}.get(key)
+
+
+def test_only_completed_runs_call_after_run():
+    exported = []
+    schedule = SpiderSchedule(process=None, spidercls=SimpleNamespace(name='cenews'), interval=60,
+                              after_run=exported.append)
+    for reason in ('shutdown', 'finished', 'deadline', None):
+        schedule._finished(None, SimpleNamespace(stats=FakeStats(reason)), start=0.0)
+
+    assert schedule.completed == 2
+    assert len(exported) == 2
@@ -0,0 +1,75 @@
+import random
+import re
+from urllib.parse import urlsplit, urlunsplit
+
+import pytest
+
+from dedup import SeenAds, dedup_key
+
+
+def legacy_key(row):
+    """Key of the rows kept apart by the 'remove_duplicate' of the baseline, run on jobs.csv after the crawl:
+    (exact title, application url without scheme, 'source' query and trailing '/', school name)
+    """
+    url, school_name = re.findall(r'\"(.*?)\"', row['school'])
+    scheme, netloc, path, query, fragment = urlsplit(url)
+    query = '&'.join(param for param in query.split('&') if param.partition('=')[0] != 'source')
+    url = re.sub(r'https?://', '', urlunsplit((scheme, netloc, path, query, fragment)).rstrip('/'))
+    return row['ads_title'], url, school_name
+
+
+def row(ads_title, url, school):
+    return {'ads_title': ads_title, 'school': f'=hyperlink("{url}","{school}")'}
+
+
+WORKDAY = 'https://utah.wd1.myworkdayjobs.com/en-US/External/job/R300364'
+
+
+@pytest.mark.parametrize('first, second', [
+    # Merged by both: the same application url posted by two jobs boards
+    (row('Assistant Professor of Chemistry', WORKDAY, 'University of Utah'),
+     row('Assistant Professor of Chemistry', WORKDAY + '?source=HigherEdJobs', 'University of Utah')),
+    (row('Assistant Professor of Chemistry', 'http://apply.interfolio.com/1234/', 'University of Utah'),
+     row('Assistant Professor of Chemistry', 'https://apply.interfolio.com/1234', 'University of Utah')),
+    # Only merged by 'dedup_key': the jobs boards write the title and the school name differently
+    (row('Assistant Professor - Organic Chemistry', WORKDAY, 'The University of Utah'),
+     row('Assistant Professor, Organic Chemistry', WORKDAY, 'University of Utah')),
+    # Only merged by 'dedup_key': the application url is not part of the key
+    (row('Assistant Professor of Chemistry', WORKDAY, 'University of Utah'),
+     row('Assistant Professor of Chemistry', 'https://apply.interfolio.com/1234', 'University of Utah')),
+])
+def test_same_job(first, second):
+    assert dedup_key(first['ads_title'], first['school']) == dedup_key(second['ads_title'], second['school'])
+
+
+@pytest.mark.parametrize('first, second', [
+    (row('Assistant Professor of Chemistry', WORKDAY, 'University of Utah'),
+     row('Associate Professor of Chemistry', WORKDAY, 'University of Utah')),
+    (row('Assistant Professor of Chemistry', WORKDAY, 'University of Utah'),
+     row('Assistant Professor of Chemistry', WORKDAY, 'Utah State University')),
+])
+def test_different_jobs(first, second):
+    assert dedup_key(first['ads_title'], first['school']) != dedup_key(second['ads_title'], second['school'])
+
+
+def test_every_job_merged_by_the_legacy_dedup_has_one_key():
+    rng = random.Random(0)
+    titles = ['Assistant Professor of Chemistry', 'Lecturer in Chemistry', 'Assistant Professor - Organic Chemistry']
+    schools = ['University of Utah', 'The University of Utah', 'Rice University']
+    urls = [WORKDAY, WORKDAY + '?source=HigherEdJobs', 'http://apply.interfolio.com/1234/',
+            'https://apply.interfolio.com/1234', 'https://rice.peopleadmin.com/postings/9']
+    rows = [row(rng.choice(titles), rng.choice(urls), rng.choice(schools)) for _ in range(500)]
+    keys = {}
+    for job in rows:
+        keys.setdefault(legacy_key(job), set()).add(dedup_key(job['ads_title'], job['school']))
+    assert all(len(job_keys) == 1 for job_keys in keys.values())
+
+
+def test_seen_ads_owner():
+    seen_ads = SeenAds()
+    key = dedup_key('Assistant Professor of Chemistry', 'University of Utah')
+    seen_ads.add(key, source='cenews')
+    assert seen_ads.is_duplicate(key, 'higheredjobs')
+    assert not seen_ads.is_duplicate(key, 'cenews')
+    seen_ads.forget('cenews')
+    assert not seen_ads.is_duplicate(key, 'higheredjobs')
@@ -0,0 +1,108 @@
+import re
+
+import pytest
+
+from extractors import (extract_rank, extract_specialization, extract_tenure, extract_title_rank,
+                        extract_title_specialization, strip_html)
+
+# Descriptions of the four jobs boards, with the cases the patterns are sensitive to:
+# 'Full ' (not 'Fully'), 'biochemical' (not a field), 'Inorganic' (not 'organic'), repeats, html and case
+DESCRIPTIONS = [
+    '',
+    'The Department of Chemistry at the University of Utah invites applications for a tenure-track '
+    'faculty position at the Assistant Professor level in Analytical Chemistry. Exceptional candidates '
+    'may be considered at the Associate Professor level. Applicants should hold a Ph.D. in Chemistry.',
+    'Open Rank Faculty Position in Biochemistry. The successful candidate will be appointed as an '
+    'Assistant, Associate or Full Professor with tenure commensurate with experience in biophysics '
+    'or bioorganic chemistry. Assistant Professor candidates must show promise in research.',
+    'Lecturer of Chemistry (Non-Tenure Track). Teach general and organic chemistry laboratories. '
+    'Organic chemistry or polymer science background preferred.',
+    '<p>The Department of Chemistry invites applications for a <b>tenure-stream</b> position at the rank '
+    'of Assistant Professor in Inorganic or Physical Chemistry (biochemical applications welcome).</p>',
+    'Fully funded Assistant Professorship, TENURED after review; ORGANIC, organic and Organic synthesis. '
+    'Assistant\nProfessor or Full\tProfessor (Associate) in BIOCHEMICAL engineering or Biology.',
+    'Associateship in physics, physical chemistry and polymers; the biochemical and bio-analytical labs.',
+]
+
+# Ad titles of the listings
+TITLES = [
+    '',
+    'Assistant Professor of Organic Chemistry',
+    'Assistant/Associate Professor - Analytical or Inorganic Chemistry',
+    'ASSOC. PROF. BIOCHEMISTRY (Biochemical Engineering)',
+    'Open Rank Professor in Physical Chemistry',
+    'Open-Rank Tenure-Track Faculty, Polymer and Bioorganic Chemistry',
+    'Lecturer, General Chemistry',
+    'Assistant Professor, Assistant Director of the Organic Labs, organic chemistry',
+]
+
+
+def legacy_rank(description):
+    """The description rank of the spiders before the extractors module, duplicates dropped in order"""
+    rank = re.findall(r'Assistant\b|Associate\b|Full\s', description)
+    words = [word.strip().lower().replace('assistant', 'asst').replace('associate', 'assoc') for word in rank]
+    return '/'.join(dict.fromkeys(words))
+
+
+def legacy_specialization(description):
+    """The ChemPostingCanada specialization before the extractors module, duplicates dropped in order"""
+    words = [word.lower() for word in re.findall(
+        r'org\w*|anal\w*|inorg\w*|bio(?!chemical\b)\w+|physic\w*|polymer\w*', description, re.IGNORECASE)]
+    return ', '.join(dict.fromkeys(words))
+
+
+def legacy_tenure(description):
+    tenure_type = re.search(r'\S*tenure\S*', description, re.IGNORECASE)
+    return tenure_type[0] if tenure_type else None
+
+
+def legacy_title_rank(title, pattern=r'assist|assoc'):
+    rank = re.findall(pattern, title, re.IGNORECASE)
+    return '/'.join(word.lower().replace('assist', 'asst') for word in rank)
+
+
+def legacy_title_specialization(title):
+    specialization = re.findall(r'org\w*|anal\w*|inorg\w*|bio\w*|physic\w*|polymer\w*', title, re.IGNORECASE)
+    return ', '.join(specialization)
+
+
+@pytest.mark.parametrize('description', DESCRIPTIONS)
+def test_description_extractors_match_the_inline_regexes(description):
+    text = strip_html(description)
+    assert extract_rank(text) == legacy_rank(text)
+    assert extract_specialization(text) == legacy_specialization(text)
+    assert extract_tenure(text) == legacy_tenure(text)
+
+
+@pytest.mark.parametrize('title', TITLES)
+def test_title_extractors_match_the_inline_regexes(title):
+    assert extract_title_rank(title) == legacy_title_rank(title)
+    assert extract_title_rank(title, open_rank=True) == legacy_title_rank(title, r'assist|assoc|open\W+rank')
+    assert extract_title_specialization(title) == legacy_title_specialization(title)
+
+
+@pytest.mark.parametrize('text, rank, specialization, tenure', [
+    (DESCRIPTIONS[1], 'asst/assoc', 'analytical', 'tenure-track'),
+    (DESCRIPTIONS[2], 'asst/assoc/full', 'biochemistry, biophysics, bioorganic', 'tenure'),
+    (DESCRIPTIONS[3], '', 'organic, polymer', '(Non-Tenure'),
+    (strip_html(DESCRIPTIONS[4]), 'asst', 'inorganic, physical', 'tenure-stream'),
+    (DESCRIPTIONS[5], 'asst/full/assoc', 'organic, biology', 'TENURED'),
+    (None, '', '', None),
+])
+def test_description_extractors(text, rank, specialization, tenure):
+    assert extract_rank(text) == rank
+    assert extract_specialization(text) == specialization
+    assert extract_tenure(text) == tenure
+
+
+@pytest.mark.parametrize('title, rank, open_rank, specialization', [
+    (TITLES[2], 'asst/assoc', 'asst/assoc', 'Analytical, Inorganic'),
+    (TITLES[3], 'assoc', 'assoc', 'BIOCHEMISTRY, Biochemical'),
+    (TITLES[5], '', 'open-rank', 'Polymer, Bioorganic'),
+    (TITLES[7], 'asst/asst', 'asst/asst', 'Organic, organic'),
+    (None, '', '', ''),
+])
+def test_title_extractors(title, rank, open_rank, specialization):
+    assert extract_title_rank(title) == rank
+    assert extract_title_rank(title, open_rank=True) == open_rank
+    assert extract_title_specialization(title) == specialization
@@ -0,0 +1,76 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+import scrapy
+from scrapy.http import TextResponse
+
+import posting_window
+from higheredjobs_spider import JobsHigheredjobsSpider
+from json_extract import iter_json_array
+
+NOW = datetime(2024, 3, 10, 9, 30, tzinfo=timezone.utc)
+
+
+@pytest.fixture(autouse=True)
+def frozen_now():
+    posting_window.freeze_now(NOW)
+    yield
+    posting_window.freeze_now(None)
+
+
+def api_response(job_codes, days_ago=1):
+    jobs = [{'JobCode': code, 'JobTitle': 'Assistant Professor of Chemistry', 'InstName': 'University of Utah',
+             'Department': '', 'InstCity': 'Salt Lake City', 'InstStateCode': 'UT', 'Priority': False,
+             'DatePosted': (NOW - timedelta(days=days_ago)).isoformat()} for code in job_codes]
+    body = json.dumps({'data': {'ARYSEARCHJOBS': jobs, 'TOTALJOBS': len(jobs)}})
+    return TextResponse(url=JobsHigheredjobsSpider.api_url, body=body, encoding='utf-8')
+
+
+def api_requests(outputs):
+    return [output for output in outputs if isinstance(output, scrapy.FormRequest)]
+
+
+@pytest.fixture
+def spider():
+    spider = JobsHigheredjobsSpider()
+    spider.api_page_size = 3
+    spider.start_requests()
+    return spider
+
+
+def test_full_pages_of_fresh_ads_request_the_next_page(spider):
+    [next_page] = api_requests(spider.parse(api_response([1, 2, 3]), start_row=1))
+    assert next_page.cb_kwargs == {'start_row': 4}
+    assert api_requests(spider.parse(api_response([4, 5]), start_row=4)) == []
+
+
+def test_the_same_page_again_stops_the_paging(spider):
+    # e.g. the API ignores 'StartRow'
+    assert len(api_requests(spider.parse(api_response([1, 2, 3]), start_row=1))) == 1
+    assert api_requests(spider.parse(api_response([1, 2, 3]), start_row=4)) == []
+
+
+def test_the_paging_stops_at_ads_older_than_the_window(spider):
+    assert api_requests(spider.parse(api_response([1, 2, 3], days_ago=40), start_row=1)) == []
+
+
+def test_the_paging_stops_at_the_pages_limit(spider):
+    spider.max_api_pages = 2
+    assert len(api_requests(spider.parse(api_response([1, 2, 3]), start_row=1))) == 1
+    assert api_requests(spider.parse(api_response([4, 5, 6]), start_row=4)) == []
+
+
+def test_iter_json_array_decodes_the_values_one_by_one():
+    text = '{"data": {"ARYSEARCHJOBS" : [ {"JobCode": 1}, {"JobCode": [2, 3]} ,{"JobCode": 4}], "TOTALJOBS": 3}}'
+    assert list(iter_json_array(text, 'ARYSEARCHJOBS')) == [{'JobCode': 1}, {'JobCode': [2, 3]}, {'JobCode': 4}]
+    assert list(iter_json_array('{"ARYSEARCHJOBS": []}', 'ARYSEARCHJOBS')) == []
+    assert list(iter_json_array('{"data": {}}', 'ARYSEARCHJOBS')) == []
+
+
+def test_iter_json_array_does_not_decode_the_values_not_consumed():
+    # The value after the first one is invalid json: only decoding it would fail
+    jobs = iter_json_array('{"ARYSEARCHJOBS": [{"JobCode": 1}, {not json}]}', 'ARYSEARCHJOBS')
+    assert next(jobs) == {'JobCode': 1}
+    with pytest.raises(ValueError):
+        next(jobs)
@@ -0,0 +1,9 @@
+from instrumentation import RunReport
+
+
+def test_run_report_reset():
+    report = RunReport()
+    report.add('stages', 'crawl.cenews', 2.0)
+    report.reset()
+    report.add('stages', 'crawl.cenews', 1.0)
+    assert report.asdict()['stages']['crawl.cenews']['count'] == 1
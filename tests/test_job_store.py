@@ -0,0 +1,83 @@
+import random
+
+from job_store import NEAR_DUPLICATE_COLUMNS, JobStore, export_query
+from near_duplicates import merge_near_duplicates
+from pipelines import FIELDS_TO_EXPORT
+
+SOURCES = {'higheredjobs': 'HigherEdJobs', 'cenews': 'C&ENJobs', 'chroniclehighered': 'Chronicle'}
+TITLES = ['Assistant Professor of Organic Chemistry', 'Tenure-Track Assistant Professor in Organic Chemistry',
+          'Assistant Professor - Physical Chemistry', 'Lecturer in Chemistry', 'Associate Professor of Biochemistry']
+SCHOOLS = ['University of Utah', 'The University of Utah', 'Utah State University', 'Rice University']
+
+
+def store_with_jobs(tmp_path, seed):
+    rng = random.Random(seed)
+    store = JobStore(tmp_path / f'jobs-{seed}.sqlite3')
+    for number in range(60):
+        source = rng.choice(list(SOURCES))
+        school = rng.choice(SCHOOLS)
+        store.upsert({
+            'ads_title': rng.choice(TITLES),
+            'posted_date': f'03/{rng.randint(1, 9):02d}/2024',
+            'school': f'=hyperlink("https://apply.example.edu/{number}","{school}")',
+            'city': rng.choice(['', 'Salt Lake City']),
+            'ads_source': f'=hyperlink("https://{source}.example.com/{number}","{SOURCES[source]}")',
+            'ads_job_code': number,
+        }, source=source)
+    for source in SOURCES:
+        store.finish_run(source)
+    return store
+
+
+def test_merged_export_is_the_merge_of_all_the_rows(tmp_path):
+    for seed in range(10):
+        store = store_with_jobs(tmp_path, seed)
+        # All the jobs are seen in this run, in the order of the export
+        columns = [*NEAR_DUPLICATE_COLUMNS, *FIELDS_TO_EXPORT]
+        rows = [dict(zip(columns, values)) for values in store.connection.execute(export_query(columns, '1'))]
+        expected = [[row[field] for field in FIELDS_TO_EXPORT]
+                    for row in merge_near_duplicates(rows, fields=FIELDS_TO_EXPORT)]
+
+        exported = list(store.export_rows(FIELDS_TO_EXPORT, merge_near_duplicates=True))
+
+        assert exported == expected
+        assert len(exported) < len(rows)
+        store.close()
+
+
+def job(number, source='cenews'):
+    return {'ads_title': f'Assistant Professor {number}', 'posted_date': '03/01/2024',
+            'school': 'University of Utah', 'ads_source': source, 'ads_job_code': number}
+
+
+def exported_codes(store):
+    return sorted(int(row[1]) for row in store.export_rows(['ads_source', 'ads_job_code']))
+
+
+def test_only_completed_runs_are_exported(tmp_path):
+    store = JobStore(tmp_path / 'jobs.sqlite3')
+    store.runs['cenews'] = '2024-03-01T00:00:00+00:00'
+    for number in (1, 2, 3):
+        store.upsert(job(number), source='cenews')
+    # Not completed yet (e.g. the first crawl of the daemon is running)
+    assert exported_codes(store) == []
+    store.finish_run('cenews')
+    assert exported_codes(store) == [1, 2, 3]
+
+    # Next run, still crawling: the jobs not seen again yet are kept, the new ones are already there
+    store.runs['cenews'] = '2024-03-01T01:00:00+00:00'
+    store.upsert(job(3), source='cenews')
+    store.upsert(job(4), source='cenews')
+    assert exported_codes(store) == [1, 2, 3, 4]
+
+    # The run failed: a new process crawling the spider still exports the previous completed run
+    store.close()
+    other_process = JobStore(tmp_path / 'jobs.sqlite3')
+    other_process.runs['cenews'] = '2024-03-01T02:00:00+00:00'
+    assert exported_codes(other_process) == [1, 2, 3, 4]
+
+    # Completed: the jobs it did not see are gone
+    other_process.upsert(job(4), source='cenews')
+    other_process.finish_run('cenews')
+    assert exported_codes(other_process) == [4]
+    other_process.close()
@@ -0,0 +1,108 @@
+from datetime import date, timedelta
+
+import pytest
+
+from near_duplicates import NearDuplicateIndex, merge_near_duplicates, merge_recent_near_duplicates
+
+DESCRIPTION = ('The Department of Chemistry at the University of Toronto invites applications for a tenure-stream '
+               'appointment at the rank of Assistant Professor. The successful candidate will establish an '
+               'independent research program, teach undergraduate and graduate courses and supervise students. '
+               'Applicants must hold a PhD in chemistry or a related field by the start date.')
+OTHER_DESCRIPTION = ('Join our faculty to lead research in separation science and mass spectrometry, '
+                     'with a new instrumentation facility, start-up funds and collaborations with industry partners; '
+                     'teaching includes quantitative analysis and instrumental methods at all levels.')
+
+
+def row(source, ads_title, description='', school='University of Toronto'):
+    return {'source': source, 'ads_title': ads_title, 'description': description,
+            'school': f'=hyperlink("https://apply.example.edu/{source}","{school}")',
+            'ads_source': f'=hyperlink("https://{source}.example.com/1","{source}")'}
+
+
+def sources(rows):
+    return [merged['ads_source'].split('","')[1].rstrip('")') for merged in merge_near_duplicates(rows)]
+
+
+@pytest.mark.parametrize('rows', [
+    # The title of the Chronicle (no description) is a subset of the others
+    [row('chronicle', 'Assistant Professor of Chemistry'),
+     row('cenews', 'Assistant Professor of Chemistry Education', DESCRIPTION),
+     row('higheredjobs', 'Assistant Professor of Analytical Chemistry', DESCRIPTION)],
+    [row('higheredjobs', 'Assistant Professor of Analytical Chemistry', DESCRIPTION),
+     row('chronicle', 'Assistant Professor of Chemistry')],
+    [row('cenews', 'Assistant Professor of Chemistry Education'),
+     row('chronicle', 'Assistant Professor of Chemistry')],
+    # Both have a description, the titles differ by one field word out of five
+    [row('cenews', 'Assistant Professor of Chemistry Education', DESCRIPTION),
+     row('higheredjobs', 'Assistant Professor of Analytical Chemistry', DESCRIPTION)],
+    # Same titles, different descriptions
+    [row('cenews', 'Assistant Professor of Analytical Chemistry', DESCRIPTION),
+     row('higheredjobs', 'Assistant Professor of Analytical Chemistry', OTHER_DESCRIPTION)],
+    # Same title at another school
+    [row('chronicle', 'Assistant Professor of Chemistry'),
+     row('cenews', 'Assistant Professor of Chemistry', DESCRIPTION, school='Toronto Metropolitan University')],
+])
+def test_different_jobs_are_not_merged(rows):
+    assert len(merge_near_duplicates(rows)) == len(rows)
+
+
+@pytest.mark.parametrize('rows, merged_sources', [
+    # Only the stop words and the punctuation differ
+    ([row('chronicle', 'Tenure-Track Assistant Professor in Analytical Chemistry'),
+      row('higheredjobs', 'Assistant Professor - Analytical Chemistry', DESCRIPTION, school='The University of Toronto')],
+     ['chronicle + higheredjobs']),
+    ([row('higheredjobs', 'Assistant Professor, Analytical Chemistry', DESCRIPTION),
+      row('cenews', 'Assistant Professor (Analytical Chemistry)', DESCRIPTION[20:]),
+      row('chronicle', 'Assistant Professor of Analytical Chemistry')],
+     ['higheredjobs + cenews + chronicle']),
+    # One more title word out of six, with the same description
+    ([row('cenews', 'Assistant Professor of Analytical Chemistry', DESCRIPTION),
+      row('higheredjobs', 'Assistant Professor of Analytical Chemistry and Spectroscopy', DESCRIPTION)],
+     ['cenews + higheredjobs']),
+    # Two ads of the same jobs board are two jobs
+    ([row('chronicle', 'Assistant Professor of Chemistry'), row('chronicle', 'Assistant Professor of Chemistry')],
+     ['chronicle', 'chronicle']),
+])
+def test_same_jobs_are_merged(rows, merged_sources):
+    assert sources(rows) == merged_sources
+
+
+def dated_rows(days):
+    """Three jobs a day, each posted on a second jobs board two days later"""
+    rows = []
+    for day in range(days):
+        for number, board in enumerate(['cenews', 'higheredjobs', 'chronicle']):
+            for source, delay in ((board, 0), ('higheredjobs' if board != 'higheredjobs' else 'cenews', 2)):
+                posted = date(2024, 1, 1) + timedelta(days=day + delay)
+                rows.append({**row(source, f'Assistant Professor of Chemistry d{day} n{number}'),
+                             'posted_on': posted.isoformat()})
+    return sorted(rows, key=lambda job: job['posted_on'], reverse=True)
+
+
+class SizeTrackingIndex(NearDuplicateIndex):
+    max_size = 0
+
+    def add(self, key, *args):
+        duplicate_of = super().add(key, *args)
+        self.max_size = max(self.max_size, len(self))
+        return duplicate_of
+
+
+def test_recent_near_duplicates_are_merged_in_one_pass():
+    rows = dated_rows(60)
+    index = SizeTrackingIndex()
+
+    merged = list(merge_recent_near_duplicates([dict(job) for job in rows], window_days=7, index=index))
+
+    assert merged == merge_near_duplicates([dict(job) for job in rows])
+    assert all(' + ' in job['ads_source'] for job in merged)
+    assert len(merged) == len(rows) // 2
+    # Only the jobs of the last 7 days (3 a day) are indexed at any time
+    assert index.max_size <= 3 * 9
+
+
+def test_near_duplicates_posted_further_apart_than_the_window_are_kept():
+    rows = [{**row('cenews', 'Assistant Professor of Chemistry'), 'posted_on': '2024-03-20'},
+            {**row('higheredjobs', 'Assistant Professor of Chemistry'), 'posted_on': '2024-03-01'}]
+    assert len(list(merge_recent_near_duplicates(rows, window_days=14))) == 2
+    assert len(list(merge_recent_near_duplicates(rows, window_days=30))) == 1
@@ -0,0 +1,85 @@
+import random
+from types import SimpleNamespace
+
+from scrapy.exceptions import DropItem
+
+from dedup import SeenAds
+from job_store import JobStore
+from orchestrator import CLOSED, ITEM, SpiderOrderedItems
+from pipelines import (FIELDS_TO_EXPORT, CrossSourceDeDuplicatesPipeline, DeDuplicatesPipeline, JobStorePipeline,
+                       RemoveIgnoredKeywordsPipeline)
+
+SPIDER_NAMES = ['jobs_higheredjobs', 'jobs_cenews', 'jobs_chroniclehighered']
+TITLES = ['Assistant Professor of Organic Chemistry', 'Lecturer in Chemistry', 'Postdoc in Chemistry',
+          'Assistant Professor - Physical Chemistry', 'Associate Professor of Biochemistry']
+SCHOOLS = ['University of Utah', 'The University of Utah', 'Rice University']
+
+
+def spider_items(seed):
+    """The items of each spider, with ignored titles, duplicated ids and the same jobs on several boards"""
+    rng = random.Random(seed)
+    return {name: [{'ads_title': rng.choice(TITLES), 'school': rng.choice(SCHOOLS),
+                    'posted_date': f'03/{rng.randint(1, 9):02d}/2024', 'ads_source': name,
+                    'ads_job_code': f'{name}-{rng.randint(1, 15)}'} for _ in range(20)]
+            for name in SPIDER_NAMES}
+
+
+def single_process_rows(store, items):
+    """The pipelines of 'list_jobs.py' in one process, crawling the spiders one after the other"""
+    cross_source_deduplicates = CrossSourceDeDuplicatesPipeline()
+    cross_source_deduplicates.seen_ads = SeenAds()
+    job_store = JobStorePipeline()
+    job_store.store = store
+    pipelines = [RemoveIgnoredKeywordsPipeline(), DeDuplicatesPipeline(), cross_source_deduplicates, job_store]
+    for name in SPIDER_NAMES:
+        spider = SimpleNamespace(name=name)
+        for item in items[name]:
+            try:
+                for pipeline in pipelines:
+                    item = pipeline.process_item(dict(item), spider)
+            except DropItem:
+                pass
+        job_store.spider_closed(spider, 'finished')
+    store.commit()
+    return list(store.export_rows(FIELDS_TO_EXPORT, merge_near_duplicates=True))
+
+
+def workers_rows(store, items, seed):
+    """The messages of two workers (the first and third spiders, the second one) reaching the parent in any order"""
+    rng = random.Random(seed)
+    workers = [[(ITEM, name, dict(item)) for name in names for item in items[name]] + [(CLOSED, names[-1], 'finished')]
+               for names in (SPIDER_NAMES[0::2], SPIDER_NAMES[1::2])]
+    # The first spider of the first worker closes before its second one starts
+    workers[0].insert(len(items[SPIDER_NAMES[0]]), (CLOSED, SPIDER_NAMES[0], 'finished'))
+    ordered_items = SpiderOrderedItems(SPIDER_NAMES, store=store)
+    ordered_items.cross_source_deduplicates.seen_ads = SeenAds()
+    while any(workers):
+        ordered_items.add(*rng.choice([worker for worker in workers if worker]).pop(0))
+    ordered_items.close()
+    return list(store.export_rows(FIELDS_TO_EXPORT, merge_near_duplicates=True))
+
+
+def test_workers_export_the_rows_of_the_single_process_crawl(tmp_path):
+    for seed in range(10):
+        items = spider_items(seed)
+        expected = single_process_rows(JobStore(tmp_path / f'single-{seed}.sqlite3'), items)
+        assert expected
+        for order in range(5):
+            store = JobStore(tmp_path / f'workers-{seed}-{order}.sqlite3')
+            assert workers_rows(store, items, seed=order) == expected
+            store.close()
+
+
+def test_spiders_of_a_killed_worker_are_not_completed(tmp_path):
+    store = JobStore(tmp_path / 'jobs.sqlite3')
+    ordered_items = SpiderOrderedItems(SPIDER_NAMES[:2], store=store)
+    ordered_items.cross_source_deduplicates.seen_ads = SeenAds()
+    ordered_items.add(ITEM, SPIDER_NAMES[1], {'ads_title': TITLES[0], 'school': SCHOOLS[0], 'ads_job_code': '1'})
+    ordered_items.add(CLOSED, SPIDER_NAMES[1], 'finished')
+    # Waiting for the first spider
+    assert store.connection.execute('SELECT count(*) FROM jobs').fetchone()[0] == 0
+
+    ordered_items.close()
+    assert store.connection.execute('SELECT count(*) FROM jobs').fetchone()[0] == 1
+    assert list(store.connection.execute('SELECT source FROM completed_runs')) == [(SPIDER_NAMES[1],)]
+    store.close()
@@ -0,0 +1,75 @@
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from types import SimpleNamespace
+
+from scrapy.http import HtmlResponse
+import twisted.internet
+from twisted.internet import defer
+
+import parse_pool
+from parse_pool import ParsePool, ParsePoolExtension
+
+
+def title(response):
+    return {'title': response.css('h1::text').get()}
+
+
+class BrokenExecutor:
+    shut_down = False
+
+    def submit(self, *args):
+        future = Future()
+        future.set_exception(BrokenProcessPool('a worker died'))
+        return future
+
+    def shutdown(self, wait=True):
+        self.shut_down = True
+
+
+def run(coroutine):
+    """The result of a coroutine awaiting already fired deferreds only"""
+    try:
+        coroutine.send(None)
+    except StopIteration as stop:
+        return stop.value
+    raise AssertionError('the coroutine is waiting')
+
+
+def test_broken_pool_is_shut_down_and_the_page_parsed_here(monkeypatch):
+    monkeypatch.setattr(parse_pool, 'deferred_from_future', lambda future: defer.fail(future.exception()))
+    monkeypatch.setattr(parse_pool, 'maybe_deferred_to_future', lambda deferred: deferred)
+    pool = ParsePool(workers=1)
+    broken = pool.executor = BrokenExecutor()
+    response = HtmlResponse('https://board/job/1', body=b'<h1>Assistant Professor</h1>', encoding='utf-8')
+
+    assert run(pool.parse(title, response)) == {'title': 'Assistant Professor'}
+    assert broken.shut_down
+    assert pool.executor is None
+
+
+class FakeReactor:
+    def __init__(self):
+        self.triggers = []
+
+    def addSystemEventTrigger(self, phase, event, callable):
+        self.triggers.append((phase, event, callable))
+
+
+def test_workers_are_stopped_with_the_reactor(monkeypatch):
+    reactor = FakeReactor()
+    monkeypatch.setattr(twisted.internet, 'reactor', reactor, raising=False)
+    pool = ParsePool(workers=1)
+    pool.executor = executor = BrokenExecutor()
+    extension = ParsePoolExtension(pool)
+
+    # e.g. the crawls of the daemon, one after the other
+    for _ in range(2):
+        spider = SimpleNamespace()
+        extension.spider_opened(spider)
+        assert spider.parse_pool is pool
+    assert not executor.shut_down
+
+    [(phase, event, shutdown)] = reactor.triggers
+    assert (phase, event) == ('before', 'shutdown')
+    shutdown()
+    assert executor.shut_down and pool.executor is None
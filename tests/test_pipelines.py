@@ -0,0 +1,46 @@
+from types import SimpleNamespace
+
+import pytest
+from scrapy.exceptions import DropItem
+
+from crawl_state import CrawlState
+from dedup import SeenAds, dedup_key
+from pipelines import CrossSourceDeDuplicatesPipeline
+
+
+def ad(ads_job_code, school='=hyperlink("https://apply.example.edu/1","The University of Utah")'):
+    return {'ads_title': 'Assistant Professor - Organic Chemistry', 'school': school, 'ads_job_code': ads_job_code}
+
+
+@pytest.fixture
+def pipeline():
+    pipeline = CrossSourceDeDuplicatesPipeline()
+    pipeline.seen_ads = SeenAds()
+    return pipeline
+
+
+def test_same_board_ads_with_the_same_title_and_school_are_kept(pipeline):
+    cenews = SimpleNamespace(name='cenews')
+    assert pipeline.process_item(ad(1), cenews)
+    assert pipeline.process_item(ad(2), cenews)
+
+
+def test_same_job_on_another_board_is_dropped(pipeline):
+    pipeline.process_item(ad(1), SimpleNamespace(name='cenews'))
+    with pytest.raises(DropItem):
+        pipeline.process_item(ad(7, school='University of Utah'), SimpleNamespace(name='higheredjobs'))
+    # The board that exported it first keeps its other ads of the same job
+    assert pipeline.process_item(ad(3), SimpleNamespace(name='cenews'))
+
+
+def test_known_duplicate_ads_are_requested_again_when_their_board_owns_the_job(tmp_path):
+    seen_ads = SeenAds()
+    key = dedup_key(ad(1)['ads_title'], ad(1)['school'])
+    entry = {'posted_date': '2024-03-01T00:00:00+00:00', 'item': None, 'duplicate_of': list(key)}
+    crawl_state = CrawlState(tmp_path / 'cenews.json')
+
+    seen_ads.add(key, source='higheredjobs')
+    assert crawl_state.is_known(entry, seen_ads, 'cenews')
+    seen_ads.forget('higheredjobs')
+    seen_ads.add(key, source='cenews')
+    assert not crawl_state.is_known(entry, seen_ads, 'cenews')
@@ -0,0 +1,32 @@
+from datetime import datetime, timedelta, timezone
+
+import redirect_cache
+from redirect_cache import RedirectCache
+
+START = datetime(2024, 3, 1, tzinfo=timezone.utc)
+
+
+class FakeDatetime(datetime):
+    now_value = START
+
+    @classmethod
+    def now(cls, tz=None):
+        return cls.now_value.astimezone(tz)
+
+
+def test_long_lived_cache_expires_its_entries(tmp_path, monkeypatch):
+    monkeypatch.setattr(redirect_cache, 'datetime', FakeDatetime)
+    cache = RedirectCache(tmp_path / 'redirect_cache.json', ttl_days=14)
+    cache.set('https://board/apply/1', 'https://careers.example.edu/1')
+
+    # The same instance, days later (e.g. in 'list_jobs.py --daemon')
+    FakeDatetime.now_value = START + timedelta(days=10)
+    cache.set('https://board/apply/2', 'https://careers.example.edu/2')
+    assert cache.get('https://board/apply/1') == 'https://careers.example.edu/1'
+
+    FakeDatetime.now_value = START + timedelta(days=15)
+    assert cache.get('https://board/apply/1') is None
+    assert cache.get('https://board/apply/2') == 'https://careers.example.edu/2'
+    cache.save()
+    assert list(RedirectCache(tmp_path / 'redirect_cache.json').load().entries) == ['https://board/apply/2']
+
@@ -0,0 +1,196 @@
+import csv
+import io
+import random
+
+import pytest
+from gspread.utils import a1_to_rowcol
+
+from write_to_sheet import SAMPLE_SPREADSHEET_ID, plan_row_changes, sync_csv_to_google_sheet
+
+HEADER = ['ads_title', 'posted_date', 'school', 'ads_source', 'ads_job_code']
+
+
+class FakeWorksheet:
+    id = 0
+    title = 'Sheet1'
+
+    def __init__(self, spreadsheet):
+        self.spreadsheet = spreadsheet
+
+    @property
+    def row_count(self):
+        return len(self.spreadsheet.grid)
+
+    def add_rows(self, rows):
+        self.spreadsheet.calls.append(('add_rows', rows))
+        self.spreadsheet.grid.extend([] for _ in range(rows))
+
+
+class FakeSpreadsheet:
+    """The first worksheet of a google sheet as a list of rows, applying the requests of ``sync_csv_to_google_sheet``"""
+    def __init__(self):
+        self.grid = []
+        self.calls = []
+        # Name of the method failing once, e.g. a quota error of the Sheets API
+        self.failing = None
+
+    def get_worksheet(self, index):
+        return FakeWorksheet(self)
+
+    def fail(self, name):
+        if self.failing == name:
+            self.failing = None
+            raise ConnectionError(f'{name} failed')
+
+    def batch_update(self, body):
+        self.fail('batch_update')
+        self.calls.append(('batch_update', body))
+        for request in body['requests']:
+            if 'deleteDimension' in request:
+                grid_range = request['deleteDimension']['range']
+                del self.grid[grid_range['startIndex']:grid_range['endIndex']]
+            elif 'insertDimension' in request:
+                grid_range = request['insertDimension']['range']
+                self.grid[grid_range['startIndex']:grid_range['startIndex']] = [
+                    [] for _ in range(grid_range['endIndex'] - grid_range['startIndex'])]
+
+    def values_batch_update(self, body):
+        self.fail('values_batch_update')
+        self.calls.append(('values_batch_update', body))
+        for data in body['data']:
+            first_cell = data['range'].split('!')[1].split(':')[0]
+            row, _ = a1_to_rowcol(first_cell)
+            for offset, values in enumerate(data['values']):
+                self.grid[row - 1 + offset] = list(values)
+
+    def rows(self):
+        """The non-empty cells of the grid, the trailing empty rows dropped"""
+        rows = [[cell for cell in row] for row in self.grid]
+        while rows and not any(rows[-1]):
+            rows.pop()
+        width = len(HEADER)
+        return [row[:width] for row in rows]
+
+
+class FakeClient:
+    def __init__(self):
+        self.spreadsheet = FakeSpreadsheet()
+
+    def import_csv(self, spreadsheet_id, content):
+        assert spreadsheet_id == SAMPLE_SPREADSHEET_ID
+        self.spreadsheet.calls.append(('import_csv', None))
+        self.spreadsheet.grid = list(csv.reader(io.StringIO(content.decode())))
+
+    def open_by_key(self, spreadsheet_id):
+        assert spreadsheet_id == SAMPLE_SPREADSHEET_ID
+        return self.spreadsheet
+
+
+def job(number):
+    return [f'Assistant Professor {number}', f'05/{number % 28 + 1:02d}/2024',
+            f'=hyperlink("https://apply.example.edu/{number}","University {number}")',
+            f'=hyperlink("https://jobs.example.org/{number}","HigherEdJobs")', str(number)]
+
+
+def write_csv(path, rows):
+    with open(path, 'w', newline='') as f_out:
+        csv.writer(f_out).writerows([HEADER] + rows)
+
+
+@pytest.fixture
+def sheet(tmp_path):
+    """Sync the csv rows to a fake google sheet, return the client and a function pushing the next rows"""
+    client = FakeClient()
+    file, snapshot = tmp_path / 'jobs.csv', tmp_path / 'sheet_snapshot.csv'
+
+    def push(rows):
+        client.spreadsheet.calls.clear()
+        write_csv(file, rows)
+        return sync_csv_to_google_sheet(file, snapshot_file=snapshot, client=client)
+
+    return client, push
+
+
+def test_first_push_imports_the_whole_file(sheet):
+    client, push = sheet
+    rows = [job(number) for number in range(10)]
+    assert push(rows) == 11
+    # Then the autoresize of the columns
+    assert [name for name, _ in client.spreadsheet.calls] == ['import_csv', 'batch_update']
+    assert client.spreadsheet.rows() == [HEADER] + rows
+
+
+def test_unchanged_rows_send_nothing(sheet):
+    client, push = sheet
+    rows = [job(number) for number in range(10)]
+    push(rows)
+    assert push(rows) == 0
+    assert client.spreadsheet.calls == []
+
+
+def test_new_ad_at_the_top_inserts_one_row(sheet):
+    client, push = sheet
+    rows = [job(number) for number in range(1, 101)]
+    push(rows)
+
+    rows = [job(0)] + rows
+    assert push(rows) == 1
+    assert client.spreadsheet.rows() == [HEADER] + rows
+    (_, structure), (_, values) = client.spreadsheet.calls
+    assert structure['requests'] == [{'insertDimension': {
+        'range': {'sheetId': 0, 'dimension': 'ROWS', 'startIndex': 1, 'endIndex': 2}, 'inheritFromBefore': False}}]
+    assert len(values['data']) == 1
+
+
+def test_removed_changed_and_new_ads(sheet):
+    client, push = sheet
+    rows = [job(number) for number in range(1, 21)]
+    push(rows)
+
+    changed = job(8)
+    # The same job from one more jobs board: same url, so the same row
+    changed[3] = '=hyperlink("https://jobs.example.org/8","HigherEdJobs + C&ENJobs")'
+    rows = ([job(0)] + [job(number) for number in range(1, 5)] + [job(100)]
+            + [job(number) for number in range(7, 21) if number != 8] + [changed, job(200)])
+    # The 3 new ads and the moved row, changed or not
+    assert push(rows) == 4
+    assert client.spreadsheet.rows() == [HEADER] + rows
+
+
+@pytest.mark.parametrize('failing', ['batch_update', 'values_batch_update'])
+def test_failed_update_is_sent_again_by_the_next_push(sheet, failing):
+    client, push = sheet
+    rows = [job(number) for number in range(1, 21)]
+    push(rows)
+
+    rows = [job(0)] + rows[:5] + rows[6:] + [job(100)]
+    client.spreadsheet.failing = failing
+    with pytest.raises(ConnectionError):
+        push(rows)
+    push(rows)
+    assert client.spreadsheet.rows() == [HEADER] + rows
+
+
+def test_plan_row_changes_deletes_from_the_bottom_and_inserts_from_the_top():
+    old_rows = [HEADER] + [job(number) for number in range(1, 6)]
+    new_rows = [HEADER, job(0), job(1), job(3), job(9), job(5)]
+    deleted, inserted, rows = plan_row_changes(old_rows, new_rows)
+    assert deleted == [(5, 1), (3, 1)]
+    assert inserted == [(2, 1), (5, 1)]
+    assert rows == [HEADER, [], job(1), job(3), [], job(5)]
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_random_changes_give_the_new_rows(sheet, seed):
+    rng = random.Random(seed)
+    client, push = sheet
+    numbers = list(range(rng.randint(0, 30)))
+    push([job(number) for number in numbers])
+    for _ in range(3):
+        numbers = [number for number in numbers if rng.random() > 0.2]
+        numbers[rng.randint(0, len(numbers)):0] = range(1000 * (_ + 1), 1000 * (_ + 1) + rng.randint(0, 5))
+        if len(numbers) > 2 and rng.random() < 0.5:
+            numbers.insert(rng.randrange(len(numbers)), numbers.pop(rng.randrange(len(numbers))))
+        rows = [job(number) for number in numbers]
+        push(rows)
+        assert client.spreadsheet.rows() == [HEADER] + rows